@@ -0,0 +1,403 @@
+"""
+過去データの一括取得（バックフィル）
+期間を日付の区間（ウィンドウ）に分けてクエリを並行実行し、テーブルごとに1つの結果ファイルにまとめる
+
+    - Dune API へのリクエストは全スレッドで共有するトークンバケット（TokenBucket）で rate 件/秒に抑え、
+      同時に実行中のクエリは max_in_flight 件までにする
+    - 失敗・タイムアウトしたウィンドウは指数バックオフ（ジッター付き）で retries 回まで再実行する
+    - 完了したウィンドウの結果は work_dir に保存し、再実行時は取得済みのウィンドウを飛ばす
+    - 全ウィンドウが揃ったテーブルだけ、新しい日付順に結合して output_dir の Result_*.json に保存する
+      （run_all_queries と同じ形式なので generate_migration_sql.py でそのまま読み込める）
+
+ウィンドウの分け方は QUERY_CONFIGS の date_filter で決める:
+    day:   p_date の1日だけを返すクエリ。1日ずつウィンドウにする
+    since: p_date 以降の全ての日を返すクエリ。終了日のパラメータ（end_param）があれば window_days 日ずつ、
+           無ければ期間全体を1つのウィンドウにする
+どちらの場合も、結果の行は日付カラムで [start, end) に絞り込む。
+
+使い方:
+    python backfill.py --start 2025-01-01 --end 2025-10-01 --max-in-flight 3 --rate 2
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from dune_query_executor import (
+    DUNE_API_BASE_URL, QUERY_CONFIGS, DuneAPIClient, TokenBucket, format_connection_stats, remove_columnar,
+)
+from instrumentation import create_tracer
+from table_specs import TABLE_SPECS
+
+
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_MAX_IN_FLIGHT = 3
+DEFAULT_RATE = 2.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 5.0
+DEFAULT_WORK_DIR = "backfill"
+
+
+def date_windows(start: date, end: date, window_days: int) -> List[Tuple[date, date]]:
+    """
+    [start, end) を window_days 日ずつの区間に分ける（最後の区間は短くなる場合がある）
+
+    Returns:
+        (開始日, 終了日) のリスト。終了日は含まない
+    """
+    if window_days < 1:
+        raise ValueError(f"window_days は1以上を指定してください: {window_days}")
+    windows = []
+    current = start
+    while current < end:
+        window_end = min(current + timedelta(days=window_days), end)
+        windows.append((current, window_end))
+        current = window_end
+    return windows
+
+
+class BackfillWindow:
+    """1クエリ・1区間分の取得状況"""
+
+    def __init__(self, config: Dict[str, Any], start: date, end: date, params: Dict[str, Any], path: str):
+        """
+        Args:
+            config: QUERY_CONFIGS の要素
+            start: 区間の開始日
+            end: 区間の終了日（含まない）
+            params: クエリパラメータ
+            path: 取得した行の保存先
+        """
+        self.config = config
+        self.start = start
+        self.end = end
+        self.params = params
+        self.path = path
+        # pending / success / resumed / failed
+        self.status = "pending"
+        self.attempts = 0
+        self.execution_ids: List[str] = []
+        self.row_count: Optional[int] = None
+        self.error_message: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.config['query_name']} [{self.start}, {self.end})"
+
+    @property
+    def completed(self) -> bool:
+        return self.status in ("success", "resumed")
+
+
+def plan_windows(config: Dict[str, Any], start: date, end: date, window_days: int,
+                 work_dir: str) -> List[BackfillWindow]:
+    """
+    1クエリ分のウィンドウを作成（date_filter と end_param に従って分ける）
+
+    Args:
+        config: QUERY_CONFIGS の要素
+        start: 期間の開始日
+        end: 期間の終了日（含まない）
+        window_days: since のクエリに end_param がある場合の1ウィンドウの日数
+        work_dir: ウィンドウごとの結果の保存先
+
+    Returns:
+        ウィンドウのリスト（新しい日付順）
+    """
+    date_filter = config.get("date_filter", "since")
+    end_param = config.get("end_param")
+    if date_filter == "day":
+        ranges = date_windows(start, end, 1)
+    elif end_param:
+        ranges = date_windows(start, end, window_days)
+    else:
+        ranges = date_windows(start, end, (end - start).days)
+
+    query_dir = os.path.join(work_dir, str(config["query_id"]))
+    windows = []
+    for window_start, window_end in reversed(ranges):
+        params = {"p_date": window_start.isoformat()}
+        if date_filter != "day" and end_param:
+            params[end_param] = window_end.isoformat()
+        path = os.path.join(query_dir, f"{window_start.isoformat()}_{window_end.isoformat()}.json")
+        windows.append(BackfillWindow(config, window_start, window_end, params, path))
+    return windows
+
+
+def clip_rows(rows: List[Dict[str, Any]], column: Optional[str], start: date,
+              end: date) -> List[Dict[str, Any]]:
+    """日付カラムの値（先頭の YYYY-MM-DD）が [start, end) の行だけを残す"""
+    if column is None:
+        return rows
+    start_text, end_text = start.isoformat(), end.isoformat()
+    return [row for row in rows if row.get(column) is not None and start_text <= row[column][:10] < end_text]
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """一時ファイルに書いてから置き換える（中断しても書きかけのファイルを残さない）"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def run_window(client: DuneAPIClient, window: BackfillWindow, retries: int = DEFAULT_RETRIES,
+               timeout: int = 300, backoff: float = DEFAULT_BACKOFF, rng: Optional[random.Random] = None,
+               sleep: Callable[[float], None] = time.sleep) -> BackfillWindow:
+    """
+    1ウィンドウ分のクエリを実行して結果を保存（保存済みの場合は実行しない）
+
+    失敗・タイムアウト・例外（APIリクエストエラー、想定外のレスポンス、結果の書き込み失敗など）の場合は
+    backoff * 2^(試行回数-1) 秒（+0〜50%のジッター）待って retries 回まで再実行する。
+    それでも失敗した場合は例外を送出せず、status を failed にして返す（他のウィンドウの処理は続く）。
+
+    Args:
+        client: Duneクライアント（スレッド間で共有）
+        window: 取得するウィンドウ
+        retries: 再実行の回数
+        timeout: 1回の実行完了を待つタイムアウト秒数
+        backoff: 1回目の再実行までの待機秒数
+        rng: ジッターに使う乱数生成器
+        sleep: 待機に使う関数
+
+    Returns:
+        status などを更新した window
+    """
+    if os.path.exists(window.path):
+        with open(window.path, 'r', encoding='utf-8') as f:
+            window.row_count = len(json.load(f)["rows"])
+        window.status = "resumed"
+        return window
+
+    rng = rng or random.Random()
+    config = window.config
+    column = TABLE_SPECS[config["table_name"]].date_column
+    while True:
+        window.attempts += 1
+        try:
+            execution_id, results, _ = client.run_query(config["query_id"], window.params, timeout=timeout,
+                                                        query_name=config["query_name"])
+            if execution_id:
+                window.execution_ids.append(execution_id)
+            if results is not None:
+                result = results.get('result', {})
+                rows = clip_rows(result.get('rows', []), column, window.start, window.end)
+                _write_json(window.path, {
+                    "execution_id": results.get('execution_id'),
+                    "params": window.params,
+                    "metadata": result.get('metadata', {}),
+                    "rows": rows,
+                })
+                window.row_count = len(rows)
+                window.status = "success"
+                window.error_message = None
+                return window
+            window.error_message = "Query execution timeout or failed"
+        except requests.exceptions.RequestException as e:
+            window.error_message = str(e)
+        except Exception as e:
+            window.error_message = f"{type(e).__name__}: {e}"
+
+        if window.attempts > retries:
+            window.status = "failed"
+            return window
+        wait = backoff * 2 ** (window.attempts - 1) * (1 + rng.uniform(0, 0.5))
+        print(f"  ↻ {window.label}: {window.error_message}（{wait:.1f}秒後に再実行 "
+              f"{window.attempts}/{retries}）")
+        sleep(wait)
+
+
+def stitch_windows(config: Dict[str, Any], windows: List[BackfillWindow], output_dir: str) -> str:
+    """
+    1クエリ分のウィンドウの結果を新しい日付順に結合し、run_all_queries と同じ形式で保存
+
+    ウィンドウが重なっていた場合に備え、テーブルの主キー（conflict_columns）が同じ行は最初の1行だけ残す。
+
+    Returns:
+        保存したファイルのパス
+    """
+    key_columns = TABLE_SPECS[config["table_name"]].conflict_columns
+    rows: List[Dict[str, Any]] = []
+    seen = set()
+    metadata: Dict[str, Any] = {}
+    execution_ids = []
+    for window in sorted(windows, key=lambda w: w.start, reverse=True):
+        with open(window.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        metadata = metadata or data.get("metadata", {})
+        execution_ids.append(data.get("execution_id"))
+        for row in data["rows"]:
+            key = tuple(row.get(column) for column in key_columns)
+            if key not in seen:
+                seen.add(key)
+                rows.append(row)
+
+    start = min(window.start for window in windows)
+    end = max(window.end for window in windows)
+    metadata = dict(metadata, row_count=len(rows), total_row_count=len(rows))
+    merged = {
+        "query_id": config["query_id"],
+        "state": "QUERY_STATE_COMPLETED",
+        "is_execution_finished": True,
+        "backfill": {"start": start.isoformat(), "end": end.isoformat(), "windows": len(windows),
+                     "execution_ids": execution_ids},
+        "result": {"rows": rows, "metadata": metadata},
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    result_file = os.path.join(output_dir, config["result_file"])
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, indent=2, ensure_ascii=False)
+    remove_columnar(result_file)
+    return result_file
+
+
+def run_backfill(client: DuneAPIClient, configs: List[Dict[str, Any]], start: date, end: date,
+                 output_dir: str, work_dir: str = DEFAULT_WORK_DIR, window_days: int = DEFAULT_WINDOW_DAYS,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, retries: int = DEFAULT_RETRIES,
+                 timeout: int = 300, backoff: float = DEFAULT_BACKOFF, seed: Optional[int] = None) -> bool:
+    """
+    全クエリのウィンドウを並行実行し、全ウィンドウが揃ったテーブルの結果を保存
+
+    Args:
+        client: Duneクライアント（rate_limiter を指定しておくとリクエスト数を抑えられる）
+        configs: 対象のクエリ（QUERY_CONFIGS の要素）
+        start: 期間の開始日
+        end: 期間の終了日（含まない）
+        output_dir: 結合した結果の保存先
+        work_dir: ウィンドウごとの結果の保存先
+        window_days: 1ウィンドウの日数
+        max_in_flight: 同時に実行するクエリ数の上限
+        retries: ウィンドウごとの再実行の回数
+        timeout: 1回の実行完了を待つタイムアウト秒数
+        backoff: 1回目の再実行までの待機秒数
+        seed: ジッターの乱数のシード
+
+    Returns:
+        全ウィンドウが取得できた場合True
+    """
+    windows_by_query = {config["query_id"]: plan_windows(config, start, end, window_days, work_dir)
+                        for config in configs}
+    # クエリごとに交互に並べ、1つのクエリのウィンドウが実行枠を占有しないようにする
+    queue: List[BackfillWindow] = []
+    for i in range(max(len(windows) for windows in windows_by_query.values())):
+        queue.extend(windows[i] for windows in windows_by_query.values() if i < len(windows))
+    print(f"期間: [{start}, {end})  ウィンドウ数: {len(queue)}  最大同時実行数: {max_in_flight}")
+
+    started = time.time()
+    rng = random.Random(seed)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = [executor.submit(run_window, client, window, retries, timeout, backoff,
+                                   random.Random(rng.random())) for window in queue]
+        for done, future in enumerate(as_completed(futures), 1):
+            window = future.result()
+            if window.completed:
+                detail = "取得済み" if window.status == "resumed" else f"試行 {window.attempts}回"
+                print(f"✓ [{done}/{len(queue)}] {window.label}: {window.row_count}行（{detail}）")
+            else:
+                print(f"✗ [{done}/{len(queue)}] {window.label}: {window.error_message}")
+
+    all_completed = True
+    for config in configs:
+        windows = windows_by_query[config["query_id"]]
+        failed = [window for window in windows if not window.completed]
+        if failed:
+            all_completed = False
+            print(f"✗ {config['query_name']}: {len(failed)}/{len(windows)} ウィンドウが失敗したため保存しません")
+            continue
+        result_file = stitch_windows(config, windows, output_dir)
+        row_count = sum(window.row_count for window in windows)
+        print(f"✓ {config['query_name']}: {len(windows)}ウィンドウ {row_count}行を {result_file} に保存しました")
+
+    attempts = sum(window.attempts for window in queue)
+    completed = sum(1 for window in queue if window.completed)
+    print("\n" + "=" * 60)
+    print(f"ウィンドウ: {len(queue)}  成功: {completed}  失敗: {len(queue) - completed}  "
+          f"クエリ実行: {attempts}回（再実行 {attempts - sum(1 for w in queue if w.attempts)}回）")
+    print(f"所要時間: {time.time() - started:.1f}秒")
+    if client.rate_limiter is not None:
+        print(f"レート制限: {client.rate_limiter.acquired}リクエスト, "
+              f"待機 {client.rate_limiter.waited_seconds:.1f}秒")
+    print(format_connection_stats(client))
+    print("=" * 60)
+    return all_completed
+
+
+def parse_date(value: str) -> date:
+    """YYYY-MM-DD の引数を date に変換"""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日付は YYYY-MM-DD で指定してください: {value}")
+
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Duneクエリの過去データの一括取得")
+    parser.add_argument("--start", type=parse_date, required=True, help="期間の開始日（YYYY-MM-DD）")
+    parser.add_argument("--end", type=parse_date,
+                        help="期間の終了日（YYYY-MM-DD、この日は含まない。省略時は今日）")
+    parser.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS,
+                        help=f"1ウィンドウの日数（end_param のあるクエリのみ、デフォルト: {DEFAULT_WINDOW_DAYS}）")
+    parser.add_argument("--queries", nargs="+", choices=[config["table_name"] for config in QUERY_CONFIGS],
+                        help="対象のテーブル（省略時は QUERY_CONFIGS の全クエリ）")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help=f"同時に実行するクエリ数の上限（デフォルト: {DEFAULT_MAX_IN_FLIGHT}）")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"Dune API への1秒あたりのリクエスト数の上限（デフォルト: {DEFAULT_RATE}）")
+    parser.add_argument("--burst", type=float, help="短時間にまとめて送れるリクエスト数（省略時は --rate と同じ）")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"ウィンドウごとの再実行の回数（デフォルト: {DEFAULT_RETRIES}）")
+    parser.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF,
+                        help=f"1回目の再実行までの待機秒数（デフォルト: {DEFAULT_BACKOFF}）")
+    parser.add_argument("--timeout", type=int, default=300, help="1回の実行完了を待つタイムアウト秒数")
+    parser.add_argument("--output-dir", default="Results", help="結合した結果の保存先ディレクトリ")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR,
+                        help="ウィンドウごとの結果の保存先（再実行時は取得済みのウィンドウを飛ばす）")
+    parser.add_argument("--base-url", default=DUNE_API_BASE_URL, help="Dune API のURL（代替サーバーの確認用）")
+    parser.add_argument("--trace", help="処理時間の計測結果をJSON Lines形式で追記するファイル")
+    return parser.parse_args()
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+    end = args.end or datetime.now(timezone.utc).date()
+    if args.start >= end:
+        print(f"✗ エラー: 開始日 {args.start} が終了日 {end} 以降です")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Dune Analytics Backfill")
+    print("=" * 60)
+
+    load_dotenv()
+    api_key = os.getenv('DUNE_API_KEY')
+    if not api_key:
+        print("✗ エラー: DUNE_API_KEYが.envファイルに設定されていません")
+        sys.exit(1)
+
+    configs = [config for config in QUERY_CONFIGS if not args.queries or config["table_name"] in args.queries]
+    rate_limiter = TokenBucket(args.rate, args.burst)
+    client = DuneAPIClient(api_key, base_url=args.base_url, pool_size=max(args.max_in_flight, 1),
+                           tracer=create_tracer(args.trace), rate_limiter=rate_limiter)
+    try:
+        succeeded = run_backfill(client, configs, args.start, end, args.output_dir, args.work_dir,
+                                 args.window_days, args.max_in_flight, args.retries, args.timeout, args.backoff)
+    finally:
+        client.close()
+    if not succeeded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1145 @@
+"""
+ref/ パイプラインのベンチマークスクリプト
+合成データを使って処理時間とピークメモリを計測する
+
+使い方:
+    python benchmark.py streaming --rows 100000
+    python benchmark.py copy --rows 100000 [--psql postgresql://user@localhost/db]
+    python benchmark.py partitions --psql postgresql://user@localhost/db --rows 1000000 --partition-by month
+    python benchmark.py encoder --rows 100000
+    python benchmark.py parallel --rows 200000 --jobs 1 2 4
+    python benchmark.py columnar --results-dir Results
+    python benchmark.py csv --rows 10000 100000
+    python benchmark.py rows --rows 100000
+    python benchmark.py analytics --vaults 100 --years 5
+    python benchmark.py replay --vaults 100 --years 5 --events-per-day 4
+    python benchmark.py suite --rows 10000 100000 1000000 --output bench.json [--baseline previous.json]
+
+結果の正しさ（従来方式・行ごとのループとの一致など）は tests/ で確認する（python -m pytest -q tests）。
+
+suite は各処理（JSON解析・SQL/COPY生成・ファイル書き込み・Dune APIの実行→ポーリング→結果取得）を
+別プロセスで実行し、処理時間と最大RSSを計測する。--baseline を指定すると前回の結果と比較し、
+tolerance を超えて遅くなった処理があれば終了コード1で終了する。
+"""
+
+import argparse
+import contextlib
+import glob
+import gzip
+import io
+import json
+import os
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from generate_migration_sql import SQLGenerator, BATCH_SIZE
+from partitioning import PARTITION_INTERVALS
+from table_specs import TABLE_SPECS, TableSpec
+
+
+def generate_earn_rows(row_count: int, vault_count: int = 100, seed: int = 0) -> List[Dict[str, Any]]:
+    """Result_Earn.json と同じ形式の合成行を生成"""
+    rng = random.Random(seed)
+    vaults = [
+        (f"0x{rng.getrandbits(160):040x}", f"V{i}USDC", f"0x{rng.getrandbits(160):040x}", "USDC.e")
+        for i in range(vault_count)
+    ]
+    start = datetime(2025, 10, 15)
+    rows = []
+    for i in range(row_count):
+        vault_address, vault_symbol, vault_asset, vault_asset_symbol = vaults[i % vault_count]
+        day = start - timedelta(days=i // vault_count)
+        rows.append({
+            "conversion_rate": 1 + rng.random() / 100,
+            "day": day.strftime("%Y-%m-%d 00:00:00.000 UTC"),
+            "delta_assets": rng.uniform(-1e5, 1e5),
+            "delta_shares": rng.uniform(-1e5, 1e5),
+            "total_shares": rng.uniform(0, 1e8),
+            "tvl_usd": rng.uniform(0, 1e8),
+            "vault_address": vault_address,
+            "vault_asset": vault_asset,
+            "vault_asset_symbol": vault_asset_symbol,
+            "vault_symbol": vault_symbol,
+        })
+    return rows
+
+
+def generate_spec_rows(spec: TableSpec, row_count: int, key_count: int = 100,
+                       seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    テーブル定義の型に従って合成行を生成
+
+    主キーのうち日付以外のカラムは key_count 種類の値を巡回し、日付は key_count 行ごとに1日ずつ遡る。
+    """
+    rng = random.Random(seed)
+    keys = [f"0x{rng.getrandbits(160):040x}" for _ in range(key_count)]
+    start = datetime(2025, 10, 15)
+    rows = []
+    for i in range(row_count):
+        day = (start - timedelta(days=i // key_count)).strftime("%Y-%m-%d 00:00:00.000 UTC")
+        key = keys[i % key_count]
+        row: Dict[str, Any] = {}
+        for column, column_type in spec.columns:
+            if column_type in ("timestamp", "date"):
+                row[column] = day
+            elif column_type == "text":
+                row[column] = key if column in spec.conflict_columns else f"SYM{i % key_count}"
+            elif column_type == "integer":
+                row[column] = rng.randrange(0, 1000000)
+            else:
+                row[column] = rng.uniform(0, 1e8)
+        rows.append(row)
+    return rows
+
+
+def write_result_file(path: str, rows: List[Dict[str, Any]]):
+    """Dune実行結果と同じ構造のJSONファイルを書き出す"""
+    data = {
+        "execution_id": "BENCHMARK",
+        "query_id": 0,
+        "state": "QUERY_STATE_COMPLETED",
+        "result": {
+            "rows": rows,
+            "metadata": {"row_count": len(rows), "total_row_count": len(rows)},
+        },
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def legacy_escape_sql_string(value: Any) -> str:
+    """
+    テーブル定義導入前の SQLGenerator.escape_sql_string（比較の基準として変更せずに残す）
+
+    NaN / Infinity は引用符なしの nan / inf になる（現在の escape_sql_value は 'NaN' などの文字列リテラル）。
+    """
+    if value is None:
+        return "NULL"
+    elif isinstance(value, (int, float)):
+        return str(value)
+    else:
+        # 文字列のエスケープ（シングルクォートを二重に）
+        escaped = str(value).replace("'", "''")
+        return f"'{escaped}'"
+
+
+def legacy_generate_earn_sql(json_file: str) -> str:
+    """json.load で全件を読み込み、全SQLを文字列として組み立てる従来方式"""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    sql_lines = [
+        "-- Morpho Earn History データ移行",
+        f"-- Generated at: {datetime.now().isoformat()}",
+        f"-- Source: {json_file}",
+        ""
+    ]
+    rows = data['result']['rows']
+    sql_lines.append(f"-- Total rows: {len(rows)}")
+    sql_lines.append("")
+    e = legacy_escape_sql_string
+    for i in range(0, len(rows), BATCH_SIZE):
+        batch = rows[i:i + BATCH_SIZE]
+        sql_lines.append(f"-- Batch {i // BATCH_SIZE + 1}")
+        sql_lines.append("INSERT INTO morpho_earn_history")
+        sql_lines.append("    (day, vault_address, vault_symbol, vault_asset, vault_asset_symbol,")
+        sql_lines.append("     conversion_rate, delta_assets, delta_shares, total_shares, tvl_usd)")
+        sql_lines.append("VALUES")
+        sql_lines.append(",\n".join(
+            f"    ({e(row['day'])}, {e(row['vault_address'])}, {e(row['vault_symbol'])}, "
+            f"{e(row['vault_asset'])}, {e(row['vault_asset_symbol'])}, {e(row['conversion_rate'])}, "
+            f"{e(row['delta_assets'])}, {e(row['delta_shares'])}, {e(row['total_shares'])}, "
+            f"{e(row.get('tvl_usd'))})"
+            for row in batch
+        ))
+        sql_lines.append("ON CONFLICT (day, vault_address)")
+        sql_lines.append("DO UPDATE SET")
+        sql_lines.append("    conversion_rate = EXCLUDED.conversion_rate,")
+        sql_lines.append("    delta_assets = EXCLUDED.delta_assets,")
+        sql_lines.append("    delta_shares = EXCLUDED.delta_shares,")
+        sql_lines.append("    total_shares = EXCLUDED.total_shares,")
+        sql_lines.append("    tvl_usd = EXCLUDED.tvl_usd,")
+        sql_lines.append("    updated_at = CURRENT_TIMESTAMP;")
+        sql_lines.append("")
+    return "\n".join(sql_lines)
+
+
+def legacy_encode_earn_row(row: Dict[str, Any]) -> str:
+    """テーブル定義導入前の、行ごとに escape_sql_string を呼ぶ f-string 方式"""
+    return f"    ({legacy_escape_sql_string(row['day'])}, " \
+           f"{legacy_escape_sql_string(row['vault_address'])}, " \
+           f"{legacy_escape_sql_string(row['vault_symbol'])}, " \
+           f"{legacy_escape_sql_string(row['vault_asset'])}, " \
+           f"{legacy_escape_sql_string(row['vault_asset_symbol'])}, " \
+           f"{legacy_escape_sql_string(row['conversion_rate'])}, " \
+           f"{legacy_escape_sql_string(row['delta_assets'])}, " \
+           f"{legacy_escape_sql_string(row['delta_shares'])}, " \
+           f"{legacy_escape_sql_string(row['total_shares'])}, " \
+           f"{legacy_escape_sql_string(row.get('tvl_usd'))})"
+
+
+def measure(func: Callable[[], Any]) -> Dict[str, float]:
+    """関数を実行し、処理時間とPythonヒープのピーク使用量を返す"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 4), "peak_mib": round(peak / (1024 * 1024), 2)}
+
+
+def bench_streaming(args) -> Dict[str, Any]:
+    """json.load方式とストリーミング方式のSQL生成を比較"""
+    generator = SQLGenerator()
+    report: Dict[str, Any] = {"benchmark": "streaming", "cases": []}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for row_count in args.rows:
+            json_file = os.path.join(work_dir, f"Result_Earn_{row_count}.json")
+            write_result_file(json_file, generate_earn_rows(row_count))
+            legacy_out = os.path.join(work_dir, "legacy.sql")
+            stream_out = os.path.join(work_dir, "stream.sql")
+
+            def run_legacy():
+                sql = legacy_generate_earn_sql(json_file)
+                with open(legacy_out, 'w', encoding='utf-8') as f:
+                    f.write(sql)
+
+            def run_streaming():
+                with open(stream_out, 'w', encoding='utf-8') as f:
+                    generator.write_table_sql(f, "morpho_earn_history", json_file)
+
+            report["cases"].append({
+                "rows": row_count,
+                "input_mib": round(os.path.getsize(json_file) / (1024 * 1024), 2),
+                "legacy": measure(run_legacy),
+                "streaming": measure(run_streaming),
+            })
+
+    return report
+
+
+def bench_encoder(args) -> Dict[str, Any]:
+    """
+    1行あたりのエンコード時間を、従来方式・テーブル定義の行エンコーダー（encode_row）・
+    列単位のバッチエンコーダー（encode_values、BATCH_SIZE 行ずつ）で比較
+    """
+    spec = TABLE_SPECS["morpho_earn_history"]
+    encode_row = spec.encode_row
+    report: Dict[str, Any] = {"benchmark": "encoder", "cases": []}
+
+    def encode_batches(rows: List[Dict[str, Any]]) -> List[str]:
+        return [spec.encode_values(rows[i:i + BATCH_SIZE]) for i in range(0, len(rows), BATCH_SIZE)]
+
+    for row_count in args.rows:
+        rows = generate_earn_rows(row_count)
+        timings = {}
+        for name, encode in (("legacy", lambda: [legacy_encode_earn_row(row) for row in rows]),
+                             ("spec", lambda: [encode_row(row) for row in rows]),
+                             ("batch", lambda: encode_batches(rows))):
+            started = time.perf_counter()
+            encode()
+            elapsed = time.perf_counter() - started
+            timings[name] = {"seconds": round(elapsed, 4),
+                             "ns_per_row": round(elapsed / row_count * 1e9, 1)}
+        report["cases"].append({
+            "rows": row_count,
+            **timings,
+            "speedup": round(timings["legacy"]["seconds"] / timings["spec"]["seconds"], 2),
+            "batch_speedup": round(timings["legacy"]["seconds"] / timings["batch"]["seconds"], 2),
+        })
+
+    return report
+
+
+def bench_parallel(args) -> Dict[str, Any]:
+    """generate_all の逐次生成とプロセス並列生成の所要時間を比較"""
+    report: Dict[str, Any] = {"benchmark": "parallel", "rows_per_table": args.rows, "cases": []}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results_dir = os.path.join(work_dir, "Results")
+        os.makedirs(results_dir)
+        for spec in TABLE_SPECS.values():
+            # 1日1行のWLD価格は主キーが日付のみのため、キーを1種類にする
+            key_count = 1 if len(spec.conflict_columns) == 1 else 100
+            write_result_file(os.path.join(results_dir, spec.result_file),
+                              generate_spec_rows(spec, args.rows, key_count))
+
+        generator = SQLGenerator(results_dir)
+        baseline = None
+        for jobs in args.jobs:
+            output_dir = os.path.join(work_dir, f"migration_sql_{jobs}")
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                generator.generate_all(jobs=jobs, output_dir=output_dir)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            report["cases"].append({"jobs": jobs, "seconds": round(elapsed, 4),
+                                    "speedup": round(baseline / elapsed, 2)})
+
+    return report
+
+
+def bench_columnar(args) -> Dict[str, Any]:
+    """Results の結果JSONと列指向キャッシュ（.npz）のサイズと読み込み時間を比較"""
+    from columnar_cache import convert_result_file, load_columnar
+
+    report: Dict[str, Any] = {"benchmark": "columnar", "cases": []}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for json_file in sorted(glob.glob(os.path.join(args.results_dir, "Result*.json"))):
+            npz_file = convert_result_file(
+                json_file, os.path.join(work_dir, os.path.basename(json_file)[:-len(".json")] + ".npz"))
+            numeric = [name for name, kind in load_columnar(npz_file).kinds.items()
+                       if kind in ("float64", "int64")]
+
+            # 読み込み後に全数値列を1回ずつ集計するまでの時間
+            def run_json():
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    rows = json.load(f)["result"]["rows"]
+                for name in numeric:
+                    sum(row[name] or 0 for row in rows)
+
+            def run_columnar():
+                result = load_columnar(npz_file)
+                for name in numeric:
+                    result.column(name).sum()
+
+            timings = {}
+            for name, func in (("json", run_json), ("columnar", run_columnar)):
+                elapsed = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    func()
+                    elapsed.append(time.perf_counter() - started)
+                timings[name] = {"seconds": round(min(elapsed), 5)}
+
+            json_bytes = os.path.getsize(json_file)
+            npz_bytes = os.path.getsize(npz_file)
+            report["cases"].append({
+                "file": os.path.basename(json_file),
+                "json_bytes": json_bytes,
+                "columnar_bytes": npz_bytes,
+                "size_ratio": round(json_bytes / npz_bytes, 2),
+                **timings,
+                "speedup": round(timings["json"]["seconds"] / timings["columnar"]["seconds"], 2),
+            })
+
+    return report
+
+
+def bench_csv(args) -> Dict[str, Any]:
+    """
+    Dune API の結果取得をJSON形式とCSV形式で比較（代替サーバーを使用）
+
+    bytes / gzip_bytes: 全行を1回取得する際のレスポンス本文のバイト数（gzip圧縮した場合の目安）
+    parse_seconds: 受信済みの本文を型付きの行に変換する時間
+    download: 取得から全行の読み込みまで（JSONはページをまとめた結果、CSVはストリーミング）
+    to_sql: 取得からINSERT文の生成まで（JSONは結果ファイルに保存してから生成、CSVは取得しながら生成）
+    """
+    from dune_query_executor import DuneAPIClient
+    from fake_dune_server import FakeDuneServer
+    from result_stream import CSVRowReader
+
+    table = "morpho_earn_history"
+    column_types = dict(TABLE_SPECS[table].columns)
+    generator = SQLGenerator()
+    report: Dict[str, Any] = {"benchmark": "csv", "cases": []}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for row_count in args.rows:
+            rows = generate_earn_rows(row_count)
+            with FakeDuneServer({1: rows}, execution_seconds=0) as server, \
+                    DuneAPIClient("benchmark", base_url=server.base_url) as client, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                execution_id = client.execute_query(1)
+                client.wait_for_execution(execution_id)
+
+                payloads = {}
+                for name, path in (("json", ""), ("csv", "/csv")):
+                    url = f"{server.base_url}/execution/{execution_id}/results{path}"
+                    payloads[name] = client.session.get(url, params={"limit": row_count}).content
+
+                def parse_json():
+                    return json.loads(payloads["json"])["result"]["rows"]
+
+                def parse_csv():
+                    return list(CSVRowReader([io.StringIO(payloads["csv"].decode("utf-8"))], column_types))
+
+                json_file = os.path.join(work_dir, "Result_Earn.json")
+                outputs = {name: os.path.join(work_dir, f"{name}.sql") for name in ("json", "csv")}
+
+                def download_json():
+                    return len(client.download_execution_results(execution_id)["result"]["rows"])
+
+                def download_csv():
+                    return sum(1 for _ in client.stream_execution_results_csv(execution_id, table))
+
+                def to_sql_json():
+                    with open(json_file, 'w', encoding='utf-8') as f:
+                        json.dump(client.download_execution_results(execution_id), f, ensure_ascii=False)
+                    with open(outputs["json"], 'w', encoding='utf-8') as f:
+                        generator.write_table_sql(f, table, json_file)
+
+                def to_sql_csv():
+                    with open(outputs["csv"], 'w', encoding='utf-8') as f:
+                        generator.write_table_sql(f, table, client.stream_execution_results_csv(execution_id, table))
+
+                case: Dict[str, Any] = {"rows": row_count}
+                for name, parse, download, to_sql in (("json", parse_json, download_json, to_sql_json),
+                                                      ("csv", parse_csv, download_csv, to_sql_csv)):
+                    started = time.perf_counter()
+                    parse()
+                    parse_seconds = time.perf_counter() - started
+                    case[name] = {
+                        "bytes": len(payloads[name]),
+                        "gzip_bytes": len(gzip.compress(payloads[name], 6)),
+                        "parse_seconds": round(parse_seconds, 4),
+                        "download": measure(download),
+                        "to_sql": measure(to_sql),
+                    }
+
+            case["bytes_ratio"] = round(case["json"]["bytes"] / case["csv"]["bytes"], 2)
+            case["gzip_bytes_ratio"] = round(case["json"]["gzip_bytes"] / case["csv"]["gzip_bytes"], 2)
+            case["parse_speedup"] = round(case["json"]["parse_seconds"] / case["csv"]["parse_seconds"], 2)
+            report["cases"].append(case)
+
+    return report
+
+
+def bench_backfill(args) -> Dict[str, Any]:
+    """
+    日付ウィンドウごとのバックフィルを同時実行数を変えて比較（代替サーバーを使用）
+
+    1日ずつのクエリ（date_filter が day）を days 日分取得する。代替サーバーは1回の実行に
+    execution_seconds 秒かかり、failure_rate の割合の実行が失敗する（再実行される）。
+    seconds: 全ウィンドウの取得から結合までの時間
+    rate_limited_seconds: トークンバケットの待機時間の合計
+    """
+    from backfill import run_backfill
+    from dune_query_executor import DuneAPIClient, TokenBucket
+    from fake_dune_server import FakeDuneServer
+
+    table = "morpho_borrow_history"
+    config = {"query_id": 1, "query_name": "Backfill Benchmark", "table_name": table,
+              "result_file": "Result_Backfill.json", "date_filter": "day"}
+    rows = generate_spec_rows(TABLE_SPECS[table], args.days * 10, key_count=10)
+    end = datetime(2025, 10, 16).date()
+    start = end - timedelta(days=args.days)
+    report: Dict[str, Any] = {"benchmark": "backfill", "days": args.days,
+                              "execution_seconds": args.execution_seconds, "rate": args.rate,
+                              "failure_rate": args.failure_rate, "cases": []}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for max_in_flight in args.max_in_flight:
+            run_dir = os.path.join(work_dir, str(max_in_flight))
+            with FakeDuneServer({1: rows}, execution_seconds=args.execution_seconds,
+                                date_column_by_query={1: "day"}, date_filter_by_query={1: "day"},
+                                failure_rate=args.failure_rate) as server, \
+                    DuneAPIClient("benchmark", base_url=server.base_url, pool_size=max_in_flight,
+                                  rate_limiter=TokenBucket(args.rate)) as client, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                succeeded = run_backfill(client, [config], start, end, run_dir, os.path.join(run_dir, "work"),
+                                         max_in_flight=max_in_flight, backoff=0.1, seed=0)
+                seconds = time.perf_counter() - started
+                executions = server.request_counts["execute"]
+            report["cases"].append({
+                "max_in_flight": max_in_flight,
+                "succeeded": succeeded,
+                "seconds": round(seconds, 3),
+                "executions": executions,
+                "requests": client.rate_limiter.acquired,
+                "rate_limited_seconds": round(client.rate_limiter.waited_seconds, 3),
+            })
+
+    serial = report["cases"][0]["seconds"]
+    for case in report["cases"]:
+        case["speedup"] = round(serial / case["seconds"], 2)
+    return report
+
+
+def synthetic_quality_arrays(row_count: int, vaults: int, issues: int, seed: int = 0):
+    """
+    Earn履歴と同じ形の配列（vaults × days 行、値は対数正規の乱歩）に、主キーの重複・負の total_shares・
+    欠けた日・tvl_usd の一時的な急増をそれぞれ issues 件ずつ入れた TableArrays を作成
+
+    Returns:
+        (TableArrays, チェックごとの期待される検出件数)
+    """
+    import numpy as np
+    from data_quality import TableArrays
+
+    spec = TABLE_SPECS["morpho_earn_history"]
+    rng = np.random.default_rng(seed)
+    days = row_count // vaults
+    codes = np.repeat(np.arange(vaults), days)
+    day_ordinals = np.tile(np.arange(20000, 20000 + days), vaults)
+    numbers = {column: np.exp(np.cumsum(rng.normal(0, 0.01, len(codes))))
+               for column in ("conversion_rate", "total_shares", "tvl_usd")}
+
+    # 問題を入れる行（Vaultごとに40日おきに、種類ごとに日をずらす）
+    slots = [(j % vaults) * days + 100 + 40 * (j // vaults) for j in range(issues)]
+    if slots and max(slots) % days + 40 >= days:
+        raise ValueError("issues が多すぎます（vaults × days に収まりません）")
+    slots = np.array(slots, dtype=np.int64)
+    numbers["total_shares"][slots + 10] *= -1
+    numbers["tvl_usd"][slots + 20] *= 100
+    keep = np.ones(len(codes), dtype=bool)
+    keep[slots] = False
+    rows = np.concatenate([np.flatnonzero(keep), slots + 30])
+    rows = rows[rng.permutation(len(rows))]
+    arrays = TableArrays(spec, "synthetic", {"vault_address": codes[rows]},
+                         {"vault_address": np.array([f"0x{i:040x}" for i in range(vaults)])},
+                         day_ordinals[rows], {column: values[rows] for column, values in numbers.items()})
+    # 急増した日は、急増と翌日の戻りの2件を検出する
+    expected = {"duplicate_keys": issues, "null_keys": 0, "negative_values": issues,
+                "date_gaps": issues, "change_outliers": 2 * issues}
+    return arrays, expected
+
+
+def bench_quality(args) -> Dict[str, Any]:
+    """
+    データ品質チェック（data_quality.check_table）の処理時間
+
+    synthetic_quality_arrays の配列（問題を issues 件ずつ入れたもの）を検査する。
+    """
+    from data_quality import check_table
+
+    arrays, _ = synthetic_quality_arrays(args.rows, args.vaults, args.issues)
+    report = check_table(arrays)
+    counts = {check["name"]: check["count"] for check in report["checks"]}
+
+    timing = measure(lambda: check_table(arrays))
+    return {"benchmark": "quality", "rows": arrays.row_count, "vaults": args.vaults, "issues": args.issues,
+            "detected": counts, "check": timing,
+            "rows_per_second": round(arrays.row_count / timing["seconds"])}
+
+
+def bench_rows(args) -> Dict[str, Any]:
+    """
+    結果ファイルの全行をメモリに保持した場合の使用量を、dict の行と行オブジェクト（row_model）で比較
+
+    retained_mib: 読み込み後も保持しているPythonヒープ（tracemalloc の現在値）
+    bytes_per_row / mib_per_100k_rows: 1行あたり・10万行あたりの使用量
+    load_seconds / sql_seconds: 読み込み時間と、読み込み済みの行からのINSERT文の生成時間
+    """
+    from result_stream import ResultRowReader
+    from row_model import TableRowSet, load_row_set
+
+    report: Dict[str, Any] = {"benchmark": "rows", "cases": []}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for table in args.tables:
+            spec = TABLE_SPECS[table]
+            for row_count in args.rows:
+                json_file = os.path.join(work_dir, spec.result_file)
+                write_result_file(json_file, generate_earn_rows(row_count) if table == "morpho_earn_history"
+                                  else generate_spec_rows(spec, row_count))
+
+                case: Dict[str, Any] = {"table": table, "rows": row_count}
+                # dict の行も TableRowSet に入れて同じ方法でSQLを生成する
+                for name, load in (("dict", lambda: TableRowSet(table, list(ResultRowReader(json_file)))),
+                                   ("row_object", lambda: load_row_set(table, json_file))):
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    rows = load()
+                    load_seconds = time.perf_counter() - started
+                    retained, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                    buffer = io.StringIO()
+                    started = time.perf_counter()
+                    SQLGenerator().write_table_sql(buffer, table, rows)
+                    sql_seconds = time.perf_counter() - started
+                    del rows, buffer
+                    case[name] = {
+                        "retained_mib": round(retained / (1024 * 1024), 2),
+                        "bytes_per_row": round(retained / row_count, 1),
+                        "mib_per_100k_rows": round(retained / row_count * 100000 / (1024 * 1024), 2),
+                        "load_seconds": round(load_seconds, 4),
+                        "sql_seconds": round(sql_seconds, 4),
+                    }
+                case["memory_ratio"] = round(case["dict"]["retained_mib"] / case["row_object"]["retained_mib"], 2)
+                report["cases"].append(case)
+
+    return report
+
+
+def naive_earn_metrics(rows: List[Dict[str, Any]], windows=(1, 7, 30)) -> Dict[str, List[float]]:
+    """
+    earn_analytics.EarnHistory.metrics と同じ指標を行ごとのループで計算（比較用）
+
+    結果は EarnHistory と同じ (Vault, 日付) 順に並べて返す。
+    """
+    vault_order: Dict[str, int] = {}
+    by_vault: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        vault_order.setdefault(row["vault_address"], len(vault_order))
+        by_vault.setdefault(row["vault_address"], []).append(row)
+
+    metrics: Dict[str, List[float]] = {"tvl_change": []}
+    for window in windows:
+        for name in ("apy", "net_flow", "rolling_tvl"):
+            metrics[f"{name}_{window}d"] = []
+
+    nan = float("nan")
+    for vault in sorted(by_vault, key=vault_order.get):
+        series = sorted(by_vault[vault], key=lambda row: row["day"])
+        ordinals = [datetime.strptime(row["day"][:10], "%Y-%m-%d").toordinal() for row in series]
+        for i, row in enumerate(series):
+            previous = series[i - 1] if i > 0 else None
+            metrics["tvl_change"].append(row["tvl_usd"] - previous["tvl_usd"] if previous else nan)
+            for window in windows:
+                # window 日以上前の最新の行
+                j = i - 1
+                while j >= 0 and ordinals[j] > ordinals[i] - window:
+                    j -= 1
+                if j >= 0:
+                    ratio = row["conversion_rate"] / series[j]["conversion_rate"]
+                    apy = ratio ** (365 / (ordinals[i] - ordinals[j])) - 1
+                else:
+                    apy = nan
+                metrics[f"apy_{window}d"].append(apy)
+
+                # 当日を含む直近 window 日間
+                flow = 0.0
+                tvl_total = 0.0
+                k = i
+                while k >= 0 and ordinals[k] > ordinals[i] - window:
+                    flow += series[k]["delta_assets"]
+                    tvl_total += series[k]["tvl_usd"]
+                    k -= 1
+                metrics[f"net_flow_{window}d"].append(flow)
+                metrics[f"rolling_tvl_{window}d"].append(tvl_total / (i - k))
+    return metrics
+
+
+def bench_analytics(args) -> Dict[str, Any]:
+    """Earn指標（APY・純流入・TVL移動平均）のベクトル化計算と行ごとのループを比較"""
+    from earn_analytics import EarnHistory
+
+    row_count = args.vaults * args.years * 365
+    rows = generate_earn_rows(row_count, vault_count=args.vaults)
+    report: Dict[str, Any] = {"benchmark": "analytics", "vaults": args.vaults,
+                              "years": args.years, "rows": row_count}
+
+    started = time.perf_counter()
+    naive_earn_metrics(rows)
+    naive_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    history = EarnHistory.from_rows(rows)
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    history.metrics()
+    vectorized_seconds = time.perf_counter() - started
+
+    report["naive"] = {"seconds": round(naive_seconds, 4)}
+    report["vectorized"] = {"load_seconds": round(load_seconds, 4), "seconds": round(vectorized_seconds, 4)}
+    report["speedup"] = round(naive_seconds / vectorized_seconds, 1)
+    report["speedup_including_load"] = round(naive_seconds / (load_seconds + vectorized_seconds), 1)
+    return report
+
+
+# earn_replay の合成イベントで使う資産の桁数
+FIXTURE_ASSET_DECIMALS = {"USDC.e": 6, "WBTC": 8, "WETH": 18, "WLD": 18}
+
+
+def generate_replay_events(vault_count: int, days: int, events_per_day: int,
+                           seed: int = 0) -> Dict[str, List[Dict[str, Any]]]:
+    """earn_replay 用の合成イベント（Vaultごとに毎日 events_per_day 件の入金・出金）"""
+    rng = random.Random(seed)
+    symbols = list(FIXTURE_ASSET_DECIMALS)
+    assets = {symbol: f"0x{rng.getrandbits(160):040x}" for symbol in symbols}
+    vaults = []
+    for i in range(vault_count):
+        symbol = symbols[i % len(symbols)]
+        vaults.append({
+            "vault_address": f"0x{rng.getrandbits(160):040x}",
+            "vault_asset": assets[symbol],
+            "vault_symbol": f"V{i}{symbol}",
+            "vault_asset_symbol": symbol,
+            "vault_asset_decimals": FIXTURE_ASSET_DECIMALS[symbol],
+        })
+
+    start = datetime(2025, 10, 15) - timedelta(days=days)
+    deposits: List[Dict[str, Any]] = []
+    withdraws: List[Dict[str, Any]] = []
+    prices = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        for symbol, asset in assets.items():
+            prices.append({"day": day.strftime("%Y-%m-%d 00:00:00.000 UTC"),
+                           "contract_address": asset, "price": rng.uniform(0.5, 5000)})
+        for vault in vaults:
+            rate = 1 + d / 10000
+            for e in range(events_per_day):
+                shares = rng.randrange(10 ** 15, 10 ** 21)
+                event = {
+                    "evt_block_time": day.strftime(f"%Y-%m-%d {e % 24:02d}:00:00.000 UTC"),
+                    "contract_address": vault["vault_address"],
+                    "assets": str(int(shares * rate) // 10 ** (18 - vault["vault_asset_decimals"])),
+                    "shares": str(shares),
+                }
+                # 4件に1件は出金（入金の方が多いため残高は正のまま）
+                (withdraws if e % 4 == 3 else deposits).append(event)
+    return {"vaults": vaults, "deposits": deposits, "withdraws": withdraws, "prices": prices}
+
+
+def naive_earn_replay(fixture: Dict[str, List[Dict[str, Any]]]) -> Dict[tuple, Dict[str, Any]]:
+    """Query_Earn のCTEを行ごとのループでそのまま計算（earn_replay との比較用）"""
+    vaults = {vault["vault_address"]: vault for vault in fixture["vaults"]}
+    prices = {(price["contract_address"], price["day"][:10]): price["price"] for price in fixture["prices"]}
+
+    daily: Dict[tuple, List[float]] = {}
+    for events, sign in ((fixture["deposits"], 1), (fixture["withdraws"], -1)):
+        for event in events:
+            vault = vaults[event["contract_address"]]
+            sums = daily.setdefault((event["contract_address"], event["evt_block_time"][:10]), [0.0, 0.0])
+            sums[0] += sign * float(int(event["assets"])) / 10.0 ** vault["vault_asset_decimals"]
+            sums[1] += sign * float(int(event["shares"])) / 1e18
+
+    result: Dict[tuple, Dict[str, Any]] = {}
+    total_shares: Dict[str, float] = {}
+    for (address, day), (delta_assets, delta_shares) in sorted(daily.items()):
+        total_shares[address] = total_shares.get(address, 0.0) + delta_shares
+        conversion_rate = delta_assets / delta_shares
+        previous_day = (datetime.strptime(day, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        price = prices.get((vaults[address]["vault_asset"], previous_day))
+        result[(address, day)] = {
+            "delta_assets": delta_assets,
+            "delta_shares": delta_shares,
+            "conversion_rate": conversion_rate,
+            "total_shares": total_shares[address],
+            "tvl_usd": None if price is None else price * total_shares[address] * conversion_rate,
+        }
+    return result
+
+
+def bench_replay(args) -> Dict[str, Any]:
+    """earn_replay の再計算と行ごとのループ（naive_earn_replay）の処理時間を比較"""
+    from earn_replay import EarnReplay
+
+    days = args.years * 365
+    fixture = generate_replay_events(args.vaults, days, args.events_per_day)
+    event_count = len(fixture["deposits"]) + len(fixture["withdraws"])
+
+    started = time.perf_counter()
+    actual = EarnReplay(fixture["vaults"], fixture["prices"]).replay(fixture["deposits"], fixture["withdraws"])
+    replay_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    naive_earn_replay(fixture)
+    naive_seconds = time.perf_counter() - started
+
+    return {
+        "benchmark": "replay",
+        "vaults": args.vaults,
+        "days": days,
+        "events": event_count,
+        "rows": len(actual),
+        "replay_seconds": round(replay_seconds, 3),
+        "naive_seconds": round(naive_seconds, 3),
+        "speedup": round(naive_seconds / replay_seconds, 2),
+    }
+
+
+# suite で計測する処理
+#   parse: 結果JSONを ResultRowReader で全行読み込む
+#   encode: バッチINSERT形式のSQLを生成して捨てる（os.devnull に書き込む）
+#   insert: バッチINSERT形式のSQLファイルを書き出す（insert - encode がファイル書き込みの時間）
+#   copy: COPY形式のSQLファイルを書き出す
+#   fetch: 代替サーバーに対してクエリ実行 → ポーリング → 全ページ取得
+SUITE_STAGES = ("parse", "encode", "insert", "copy", "fetch")
+
+
+def _peak_rss_mib() -> float:
+    """このプロセスの最大RSS（MiB、Linux の ru_maxrss はKiB単位）"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _suite_generate(table: str, row_count: int, json_file: str) -> Dict[str, Any]:
+    """合成の結果ファイルを作成（suite のワーカープロセスで実行）"""
+    spec = TABLE_SPECS[table]
+    key_count = 1 if len(spec.conflict_columns) == 1 else 100
+    write_result_file(json_file, generate_spec_rows(spec, row_count, key_count))
+    return {"input_bytes": os.path.getsize(json_file)}
+
+
+def _serve_fake_dune(json_file: str, execution_seconds: float, ready, stop):
+    """結果ファイルの行を返す代替サーバーを起動し、stop が設定されるまで待つ（別プロセスで実行）"""
+    from fake_dune_server import FakeDuneServer, load_result_rows
+
+    loaded = load_result_rows(json_file)
+    with FakeDuneServer({1: loaded["rows"]}, {1: loaded["columns"]},
+                        execution_seconds=execution_seconds) as server:
+        ready.put(server.base_url)
+        stop.wait()
+
+
+def _suite_stage(stage: str, table: str, json_file: str, work_dir: str,
+                 base_url: Optional[str] = None) -> Dict[str, Any]:
+    """1つの処理を計測（suite のワーカープロセスで実行）"""
+    from result_stream import ResultRowReader
+
+    result: Dict[str, Any] = {}
+    generator = SQLGenerator()
+    started = time.perf_counter()
+    if stage == "parse":
+        result["rows"] = sum(1 for _ in ResultRowReader(json_file))
+    elif stage == "encode":
+        with open(os.devnull, 'w', encoding='utf-8') as f:
+            result["rows"] = generator.write_table_sql(f, table, json_file)
+    elif stage in ("insert", "copy"):
+        sql_file = os.path.join(work_dir, f"{table}_{stage}.sql")
+        write = generator.write_table_sql if stage == "insert" else generator.write_table_copy
+        with open(sql_file, 'w', encoding='utf-8') as f:
+            result["rows"] = write(f, table, json_file)
+        result["output_bytes"] = os.path.getsize(sql_file)
+        os.remove(sql_file)
+    elif stage == "fetch":
+        from dune_query_executor import DuneAPIClient
+
+        with DuneAPIClient("benchmark", base_url=base_url) as client, \
+                contextlib.redirect_stdout(io.StringIO()):
+            execution_id, results, _ = client.run_query(1)
+            result["http_requests"] = client.connection_stats()["requests"]
+        poll_stats = client.poll_stats[execution_id]
+        result["rows"] = len(results["result"]["rows"])
+        result["status_calls"] = poll_stats["status_calls"]
+        result["wait_seconds"] = round(poll_stats["wait_seconds"], 4)
+        result["detect_latency_seconds"] = poll_stats["detect_latency_seconds"]
+        result["download_seconds"] = round(time.perf_counter() - started - poll_stats["wait_seconds"], 4)
+    else:
+        raise ValueError(f"未対応の処理です: {stage}")
+    elapsed = time.perf_counter() - started
+
+    result["seconds"] = round(elapsed, 4)
+    result["rows_per_sec"] = round(result["rows"] / elapsed, 1) if elapsed > 0 else None
+    result["peak_rss_mib"] = _peak_rss_mib()
+    return result
+
+
+def _run_isolated(ctx, func: Callable, *args) -> Any:
+    """関数を新しいプロセスで実行し、結果を返す（プロセスごとの最大RSSを計測するため）"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(func, *args).result()
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any],
+                          tolerance: float) -> List[Dict[str, Any]]:
+    """
+    前回の suite の結果と比較し、tolerance を超えて遅くなった処理を返す
+
+    Args:
+        report: 今回の結果
+        baseline: 前回の結果
+        tolerance: 許容する処理時間の増加率（0.25 = 25%）
+
+    Returns:
+        遅くなった処理（table, rows, stage, baseline_seconds, seconds, ratio）
+    """
+    previous = {(case["table"], case["rows"], case["stage"]): case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in report["cases"]:
+        before = previous.get((case["table"], case["rows"], case["stage"]))
+        if not before or not before.get("seconds") or case.get("seconds") is None:
+            continue
+        ratio = case["seconds"] / before["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append({"table": case["table"], "rows": case["rows"], "stage": case["stage"],
+                                "baseline_seconds": before["seconds"], "seconds": case["seconds"],
+                                "ratio": round(ratio, 2)})
+    return regressions
+
+
+def bench_suite(args) -> Dict[str, Any]:
+    """テーブル・行数ごとに各処理の処理時間と最大RSSを計測"""
+    ctx = multiprocessing.get_context("spawn")
+    report: Dict[str, Any] = {
+        "benchmark": "suite",
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        # 何もしないワーカープロセスの最大RSS（各処理の peak_rss_mib との差が処理によるメモリ）
+        "baseline_rss_mib": _run_isolated(ctx, _peak_rss_mib),
+        "cases": [],
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for row_count in args.rows:
+            for table in args.tables:
+                json_file = os.path.join(work_dir, f"{table}_{row_count}.json")
+                generated = _run_isolated(ctx, _suite_generate, table, row_count, json_file)
+                for stage in args.stages:
+                    case = {"table": table, "rows": row_count, "stage": stage, **generated}
+                    if stage == "fetch":
+                        ready, stop = ctx.Queue(), ctx.Event()
+                        server = ctx.Process(target=_serve_fake_dune,
+                                             args=(json_file, args.execution_seconds, ready, stop))
+                        server.start()
+                        try:
+                            case.update(_run_isolated(ctx, _suite_stage, stage, table, json_file, work_dir,
+                                                      ready.get(timeout=600)))
+                        finally:
+                            stop.set()
+                            server.join()
+                    else:
+                        case.update(_run_isolated(ctx, _suite_stage, stage, table, json_file, work_dir))
+                    report["cases"].append(case)
+                    print(f"  {table} {row_count}行 {stage}: {case['seconds']}秒, "
+                          f"最大RSS {case['peak_rss_mib']}MiB", file=sys.stderr)
+                os.remove(json_file)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report["regressions"] = compare_with_baseline(report, json.load(f), args.tolerance)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+def run_psql(dsn: str, sql_file: str) -> float:
+    """psql でSQLファイルを実行し、所要時間（秒）を返す"""
+    started = time.perf_counter()
+    subprocess.run(["psql", dsn, "-q", "-v", "ON_ERROR_STOP=1", "-f", sql_file],
+                   check=True, stdout=subprocess.DEVNULL)
+    return round(time.perf_counter() - started, 4)
+
+
+def bench_copy(args) -> Dict[str, Any]:
+    """バッチINSERT形式とCOPY形式の生成時間・ファイルサイズ・インポート時間を比較"""
+    generator = SQLGenerator()
+    report: Dict[str, Any] = {"benchmark": "copy", "cases": []}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.psql:
+            schema_file = os.path.join(work_dir, "schema.sql")
+            with open(schema_file, 'w', encoding='utf-8') as f:
+                f.write(generator.generate_schema_sql())
+            run_psql(args.psql, schema_file)
+
+        for row_count in args.rows:
+            json_file = os.path.join(work_dir, f"Result_Earn_{row_count}.json")
+            write_result_file(json_file, generate_earn_rows(row_count))
+            case: Dict[str, Any] = {"rows": row_count}
+
+            for output_format, write in (("insert", generator.write_table_sql),
+                                         ("copy", generator.write_table_copy)):
+                sql_file = os.path.join(work_dir, f"earn_{output_format}.sql")
+
+                def run_generate():
+                    with open(sql_file, 'w', encoding='utf-8') as f:
+                        write(f, "morpho_earn_history", json_file)
+
+                result = measure(run_generate)
+                result["output_mib"] = round(os.path.getsize(sql_file) / (1024 * 1024), 2)
+                if args.psql:
+                    # 毎回空のテーブルに対して計測する
+                    subprocess.run(["psql", args.psql, "-q", "-c", "TRUNCATE morpho_earn_history"],
+                                   check=True, stdout=subprocess.DEVNULL)
+                    result["import_seconds"] = run_psql(args.psql, sql_file)
+                case[output_format] = result
+
+            report["cases"].append(case)
+
+    return report
+
+
+def explain_timings(output: str) -> List[float]:
+    """EXPLAIN (ANALYZE, FORMAT JSON) の出力（複数）から、計画時間 + 実行時間（ミリ秒）を取り出す"""
+    decoder = json.JSONDecoder()
+    timings = []
+    position = 0
+    output = output.strip()
+    while position < len(output):
+        plans, position = decoder.raw_decode(output, position)
+        while position < len(output) and output[position].isspace():
+            position += 1
+        timings.append(plans[0]["Planning Time"] + plans[0]["Execution Time"])
+    return timings
+
+
+def bench_partitions(args) -> Dict[str, Any]:
+    """
+    日付範囲のクエリの応答時間を、通常のテーブル（B-tree）とパーティション化したテーブル（BRIN）で比較
+
+    合成したEarn履歴をスキーマ bench_plain / bench_partitioned にそれぞれロードし、
+    ランダムな期間の集計クエリを EXPLAIN ANALYZE で実行してサーバー側の所要時間を比較する（psqlが必要）。
+    """
+    rows = generate_earn_rows(args.rows, vault_count=args.vaults)
+    days = sorted({row["day"][:10] for row in rows})
+    first_day = datetime.strptime(days[0], "%Y-%m-%d")
+    total_days = len(days)
+    generator = SQLGenerator()
+    rng = random.Random(0)
+    report: Dict[str, Any] = {"benchmark": "partitions", "rows": args.rows, "days": total_days,
+                              "partition_by": args.partition_by, "cases": []}
+
+    # 両方のスキーマで同じ期間を使う
+    windows = {
+        window: [first_day + timedelta(days=rng.randrange(max(total_days - window, 1)))
+                 for _ in range(args.repeat)]
+        for window in args.windows
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        json_file = os.path.join(work_dir, "Result_Earn.json")
+        write_result_file(json_file, rows)
+        copy_file = os.path.join(work_dir, "earn_copy.sql")
+        with open(copy_file, 'w', encoding='utf-8') as f:
+            generator.write_table_copy(f, "morpho_earn_history", json_file)
+        with open(copy_file, encoding='utf-8') as f:
+            copy_sql = f.read()
+
+        timings: Dict[str, Dict[int, List[float]]] = {}
+        layouts = (("plain", None), ("partitioned", args.partition_by))
+        for layout, partition_by in layouts:
+            schema = f"bench_{layout}"
+            load_file = os.path.join(work_dir, f"{schema}.sql")
+            with open(load_file, 'w', encoding='utf-8') as f:
+                f.write(f"DROP SCHEMA IF EXISTS {schema} CASCADE;\nCREATE SCHEMA {schema};\n"
+                        f"SET search_path TO {schema};\n")
+                f.write(generator.generate_schema_sql(partition_by, {"morpho_earn_history": days[0]}))
+                f.write(copy_sql)
+                f.write("\nANALYZE morpho_earn_history;\n")
+            load_seconds = run_psql(args.psql, load_file)
+
+            query_file = os.path.join(work_dir, f"{schema}_queries.sql")
+            with open(query_file, 'w', encoding='utf-8') as f:
+                f.write(f"SET search_path TO {schema};\n")
+                for window, starts in windows.items():
+                    for start in starts:
+                        end = start + timedelta(days=window)
+                        f.write("EXPLAIN (ANALYZE, FORMAT JSON) "
+                                "SELECT vault_address, sum(delta_assets), avg(tvl_usd) FROM morpho_earn_history "
+                                f"WHERE day >= '{start:%Y-%m-%d}' AND day < '{end:%Y-%m-%d}' "
+                                "GROUP BY vault_address;\n")
+            completed = subprocess.run(["psql", args.psql, "-X", "-q", "-At", "-v", "ON_ERROR_STOP=1",
+                                        "-f", query_file], check=True, capture_output=True, text=True)
+            measured = explain_timings(completed.stdout)
+            timings[layout] = {}
+            for i, window in enumerate(windows):
+                timings[layout][window] = sorted(measured[i * args.repeat:(i + 1) * args.repeat])
+            report[f"{layout}_load_seconds"] = load_seconds
+
+        for window in windows:
+            case: Dict[str, Any] = {"window_days": window}
+            for layout, _ in layouts:
+                values = timings[layout][window]
+                case[layout] = {"median_ms": round(values[len(values) // 2], 3),
+                                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3)}
+            case["speedup"] = round(case["plain"]["median_ms"] / case["partitioned"]["median_ms"], 2)
+            report["cases"].append(case)
+
+        if not args.keep:
+            drop = "; ".join(f"DROP SCHEMA IF EXISTS bench_{layout} CASCADE" for layout, _ in layouts)
+            subprocess.run(["psql", args.psql, "-X", "-q", "-c", drop], check=True, stdout=subprocess.DEVNULL)
+
+    return report
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="ref/ パイプラインのベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    streaming = subparsers.add_parser("streaming", help="JSONストリーミング読み込みとSQL生成")
+    streaming.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    streaming.set_defaults(func=bench_streaming)
+
+    copy = subparsers.add_parser("copy", help="バッチINSERT形式とCOPY形式の比較")
+    copy.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    copy.add_argument("--psql", help="インポート時間も計測する場合の接続文字列（psqlが必要）")
+    copy.set_defaults(func=bench_copy)
+
+    partitions = subparsers.add_parser("partitions", help="日付範囲のクエリの応答時間（通常のテーブルとパーティション化）")
+    partitions.add_argument("--psql", required=True, help="PostgreSQLの接続文字列（psqlが必要）")
+    partitions.add_argument("--rows", type=int, default=1000000)
+    partitions.add_argument("--vaults", type=int, default=100)
+    partitions.add_argument("--partition-by", choices=PARTITION_INTERVALS, default="month")
+    partitions.add_argument("--windows", type=int, nargs="+", default=[7, 30, 90], help="クエリの期間（日）")
+    partitions.add_argument("--repeat", type=int, default=20, help="期間ごとのクエリ回数")
+    partitions.add_argument("--keep", action="store_true", help="計測後にスキーマを削除しない")
+    partitions.set_defaults(func=bench_partitions)
+
+    encoder = subparsers.add_parser("encoder", help="1行あたりのエンコード時間")
+    encoder.add_argument("--rows", type=int, nargs="+", default=[100000])
+    encoder.set_defaults(func=bench_encoder)
+
+    parallel = subparsers.add_parser("parallel", help="テーブルごとの並列SQL生成")
+    parallel.add_argument("--rows", type=int, default=100000, help="1テーブルあたりの行数")
+    parallel.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4])
+    parallel.set_defaults(func=bench_parallel)
+
+    columnar = subparsers.add_parser("columnar", help="結果JSONと列指向キャッシュの比較")
+    columnar.add_argument("--results-dir", default="Results", help="Result*.json の格納ディレクトリ")
+    columnar.add_argument("--repeat", type=int, default=5, help="読み込みの繰り返し回数（最短時間を採用）")
+    columnar.set_defaults(func=bench_columnar)
+
+    csv_results = subparsers.add_parser("csv", help="Dune API の結果取得（JSON形式とCSV形式）の比較")
+    csv_results.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    csv_results.set_defaults(func=bench_csv)
+
+    backfill = subparsers.add_parser("backfill", help="日付ウィンドウごとのバックフィルの同時実行数による比較")
+    backfill.add_argument("--days", type=int, default=30, help="取得する日数（1日1ウィンドウ）")
+    backfill.add_argument("--max-in-flight", type=int, nargs="+", default=[1, 4, 8])
+    backfill.add_argument("--execution-seconds", type=float, default=1.0, help="代替サーバーでのクエリ実行時間")
+    backfill.add_argument("--rate", type=float, default=10.0, help="1秒あたりのリクエスト数の上限")
+    backfill.add_argument("--failure-rate", type=float, default=0.1, help="失敗させる実行の割合")
+    backfill.set_defaults(func=bench_backfill)
+
+    rows = subparsers.add_parser("rows", help="全行をメモリに保持した場合の使用量（dict の行と行オブジェクト）")
+    rows.add_argument("--rows", type=int, nargs="+", default=[100000])
+    rows.add_argument("--tables", nargs="+", default=list(TABLE_SPECS), choices=list(TABLE_SPECS))
+    rows.set_defaults(func=bench_rows)
+
+    quality = subparsers.add_parser("quality", help="データ品質チェックの処理時間")
+    quality.add_argument("--rows", type=int, default=1000000)
+    quality.add_argument("--vaults", type=int, default=100)
+    quality.add_argument("--issues", type=int, default=20, help="種類ごとに入れる問題の数")
+    quality.set_defaults(func=bench_quality)
+
+    analytics = subparsers.add_parser("analytics", help="Earn指標のベクトル化計算と行ごとのループの比較")
+    analytics.add_argument("--vaults", type=int, default=100)
+    analytics.add_argument("--years", type=int, default=5)
+    analytics.set_defaults(func=bench_analytics)
+
+    replay = subparsers.add_parser("replay", help="Earn履歴のローカル再計算")
+    replay.add_argument("--vaults", type=int, default=100)
+    replay.add_argument("--years", type=int, default=5)
+    replay.add_argument("--events-per-day", type=int, default=4, help="Vaultごとの1日あたりのイベント数")
+    replay.set_defaults(func=bench_replay)
+
+    suite = subparsers.add_parser("suite", help="各処理の処理時間と最大RSS（回帰検出用）")
+    suite.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000], help="1テーブルあたりの行数")
+    suite.add_argument("--tables", nargs="+", default=list(TABLE_SPECS), choices=list(TABLE_SPECS))
+    suite.add_argument("--stages", nargs="+", default=list(SUITE_STAGES), choices=list(SUITE_STAGES))
+    suite.add_argument("--execution-seconds", type=float, default=1.0, help="代替サーバーでのクエリ実行時間")
+    suite.add_argument("--output", help="結果を保存するJSONファイル")
+    suite.add_argument("--baseline", help="比較する前回の結果（suite --output で保存したJSON）")
+    suite.add_argument("--tolerance", type=float, default=0.25, help="許容する処理時間の増加率")
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    report = args.func(args)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
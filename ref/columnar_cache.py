@@ -0,0 +1,294 @@
+"""
+Dune実行結果の列指向キャッシュ（NumPy .npz）
+Result*.json と同じ内容を、型付きの列（float64 / int64 / datetime64）と
+辞書エンコードした文字列列（トークン・Vault・シンボルなど）として保存する
+
+.npz は無圧縮で書き出すため、load_columnar は各列をファイルから直接メモリマップできる。
+メタデータには元の結果の execution_id を保存し、is_columnar_fresh で結果JSONと同じ実行のものか確認できる
+（結果JSONの代わりに .npz を読む場合は、先に is_columnar_fresh で確認すること）。
+
+使い方:
+    python columnar_cache.py Results/Result_Earn.json   # Results/Result_Earn.npz を作成
+"""
+
+import json
+import os
+import re
+import sys
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from result_stream import ResultRowReader
+
+
+FORMAT_VERSION = 1
+
+# npz内でメタデータ（列の並びと型、実行情報）を保存するメンバー名
+META_KEY = "__meta__"
+
+# Duneの日時文字列（"2025-10-15 00:00:00.000 UTC"）と日付文字列（"2025-10-15"）
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3} UTC\Z")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}\Z")
+
+# 列の種類
+#   int64: 整数のみ（NULLなし）
+#   float64: 数値（NULLは NaN）
+#   timestamp: datetime64[ms]（NULLは NaT）
+#   date: datetime64[D]（NULLは NaT）
+#   category: 文字列を辞書エンコード（codes: int32、categories: 文字列配列、NULLは -1）
+COLUMN_KINDS = ("int64", "float64", "timestamp", "date", "category")
+
+
+def columnar_path(json_file: str) -> str:
+    """結果JSONに対応する列指向キャッシュのパス（拡張子を .npz に置き換える）"""
+    return os.path.splitext(json_file)[0] + ".npz"
+
+
+def _infer_kind(values: List[Any]) -> str:
+    """列の値から保存する型を決める"""
+    present = [value for value in values if value is not None]
+    if present and all(value.__class__ is int for value in present):
+        return "int64" if len(present) == len(values) else "float64"
+    if present and all(value.__class__ in (int, float) for value in present):
+        return "float64"
+    if present and all(value.__class__ is str and _TIMESTAMP_RE.match(value) for value in present):
+        return "timestamp"
+    if present and all(value.__class__ is str and _DATE_RE.match(value) for value in present):
+        return "date"
+    return "category"
+
+
+def _encode_column(name: str, values: List[Any], kind: str) -> Dict[str, np.ndarray]:
+    """1列分の値をnpzに保存する配列にする"""
+    if kind == "int64":
+        return {name: np.array(values, dtype=np.int64)}
+    if kind == "float64":
+        return {name: np.array([np.nan if value is None else value for value in values], dtype=np.float64)}
+    if kind == "timestamp":
+        # "YYYY-MM-DD HH:MM:SS.fff UTC" → "YYYY-MM-DDTHH:MM:SS.fff"
+        return {name: np.array(["NaT" if value is None else value[:10] + "T" + value[11:23] for value in values],
+                               dtype="datetime64[ms]")}
+    if kind == "date":
+        return {name: np.array(["NaT" if value is None else value for value in values], dtype="datetime64[D]")}
+
+    categories: Dict[str, int] = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+        else:
+            codes[i] = categories.setdefault(str(value), len(categories))
+    return {
+        f"{name}.codes": codes,
+        f"{name}.categories": np.array(list(categories), dtype=str),
+    }
+
+
+def write_columnar(results: Dict[str, Any], path: str, rows: Optional[Iterable[Dict[str, Any]]] = None) -> int:
+    """
+    Dune実行結果を列指向キャッシュとして保存
+
+    Args:
+        results: Dune実行結果（result.rows を含むレスポンス）
+        path: 出力する .npz ファイルのパス
+        rows: 行（省略時は results["result"]["rows"]）
+
+    Returns:
+        保存した行数
+    """
+    result = results.get("result") or {}
+    if rows is None:
+        rows = result.get("rows", [])
+
+    # 列の並びは result.metadata.column_names を優先し、無い列は出現順に追加する
+    column_names: List[str] = list((result.get("metadata") or {}).get("column_names") or [])
+    columns: Dict[str, List[Any]] = {name: [] for name in column_names}
+    row_count = 0
+    for row in rows:
+        for name in row:
+            if name not in columns:
+                columns[name] = [None] * row_count
+        for name, values in columns.items():
+            values.append(row.get(name))
+        row_count += 1
+
+    arrays: Dict[str, np.ndarray] = {}
+    column_meta = []
+    for name, values in columns.items():
+        kind = _infer_kind(values)
+        arrays.update(_encode_column(name, values, kind))
+        column_meta.append({"name": name, "kind": kind})
+
+    # rows 以外（execution_id, state, result.metadata など）はメタデータとしてそのまま保存
+    source = {key: value for key, value in results.items() if key != "result"}
+    source["result"] = {key: value for key, value in result.items() if key != "rows"}
+    meta = {"version": FORMAT_VERSION, "execution_id": results.get("execution_id"), "row_count": row_count,
+            "columns": column_meta, "source": source}
+    arrays[META_KEY] = np.array(json.dumps(meta, ensure_ascii=False))
+
+    # 書きかけのファイルを残さないよう一時ファイルに書いてから置き換える（np.savez は無圧縮）
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return row_count
+
+
+def convert_result_file(json_file: str, path: Optional[str] = None) -> str:
+    """
+    既存の結果JSONファイルから列指向キャッシュを作成
+
+    Args:
+        json_file: Dune実行結果のJSONファイル
+        path: 出力する .npz ファイルのパス（省略時は columnar_path(json_file)）
+
+    Returns:
+        作成したファイルのパス
+    """
+    path = path or columnar_path(json_file)
+    reader = ResultRowReader(json_file)
+    rows = list(reader)
+    results = {key: value for key, value in reader.fields.items() if key != "result"}
+    results["result"] = {"metadata": reader.metadata or {}}
+    write_columnar(results, path, rows)
+    return path
+
+
+def _json_execution_id(json_file: str) -> Optional[str]:
+    """結果JSONの execution_id（rows より前にあれば行を読まずに返す）"""
+    reader = ResultRowReader(json_file)
+    rows = iter(reader)
+    for _ in rows:
+        if "execution_id" in reader.fields:
+            break
+    rows.close()
+    return reader.fields.get("execution_id")
+
+
+def is_columnar_fresh(json_file: str, path: Optional[str] = None) -> bool:
+    """
+    列指向キャッシュが結果JSONと同じ内容か確認
+
+    .npz が存在し、結果JSON以降に更新されていて、メタデータの execution_id が結果JSONと一致する場合のみ True。
+    どちらかに execution_id が無い場合は確認できないため False。
+
+    Args:
+        json_file: Dune実行結果のJSONファイル
+        path: .npz ファイルのパス（省略時は columnar_path(json_file)）
+    """
+    path = path or columnar_path(json_file)
+    if not os.path.exists(path) or not os.path.exists(json_file):
+        return False
+    if os.path.getmtime(path) < os.path.getmtime(json_file):
+        return False
+    execution_id = load_columnar(path).execution_id
+    return execution_id is not None and execution_id == _json_execution_id(json_file)
+
+
+def _read_member(f, path: str, info: zipfile.ZipInfo, mmap: bool) -> np.ndarray:
+    """npz内の1メンバーを読み込む（無圧縮ならファイルを直接メモリマップする）"""
+    f.seek(info.header_offset)
+    local_header = f.read(30)
+    name_length = int.from_bytes(local_header[26:28], "little")
+    extra_length = int.from_bytes(local_header[28:30], "little")
+    f.seek(info.header_offset + 30 + name_length + extra_length)
+
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    offset = f.tell()
+
+    if mmap and info.compress_type == zipfile.ZIP_STORED and not dtype.hasobject and int(np.prod(shape)) > 0:
+        order = "F" if fortran_order else "C"
+        return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order=order)
+    with np.load(path, allow_pickle=False) as npz:
+        return npz[info.filename[:-len(".npy")]]
+
+
+class ColumnarResult:
+    """
+    列指向キャッシュの読み込み結果
+
+    数値・日時の列は column(name) で配列として、辞書エンコードした列は
+    codes(name) / categories(name) で、または column(name) で復元した文字列配列として参照する。
+    """
+
+    def __init__(self, path: str, mmap: bool = True):
+        """
+        Args:
+            path: .npz ファイルのパス
+            mmap: 列をメモリマップするか（False の場合はメモリに読み込む）
+        """
+        self.path = path
+        self.arrays: Dict[str, np.ndarray] = {}
+        with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+            for info in archive.infolist():
+                self.arrays[info.filename[:-len(".npy")]] = _read_member(f, path, info, mmap)
+
+        meta = json.loads(str(self.arrays.pop(META_KEY)))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"未対応の列指向キャッシュのバージョンです: {meta.get('version')}")
+        self.row_count: int = meta["row_count"]
+        self.kinds: Dict[str, str] = {column["name"]: column["kind"] for column in meta["columns"]}
+        self.column_names: List[str] = list(self.kinds)
+        self.source: Dict[str, Any] = meta["source"]
+        self.execution_id: Optional[str] = meta.get("execution_id", self.source.get("execution_id"))
+
+    def codes(self, name: str) -> np.ndarray:
+        """辞書エンコードした列のコード（NULLは -1）"""
+        return self.arrays[f"{name}.codes"]
+
+    def categories(self, name: str) -> np.ndarray:
+        """辞書エンコードした列の値の一覧"""
+        return self.arrays[f"{name}.categories"]
+
+    def column(self, name: str) -> np.ndarray:
+        """列の値（辞書エンコードした列は文字列配列に復元し、NULLは空文字列）"""
+        if self.kinds[name] != "category":
+            return self.arrays[name]
+        categories = np.append(self.categories(name), "")
+        return categories[self.codes(name)]
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """元の結果JSONと同じ形式の行を順に返す"""
+        decoded = []
+        for name in self.column_names:
+            kind = self.kinds[name]
+            if kind == "category":
+                categories = self.categories(name).tolist() + [None]
+                values = [categories[code] for code in self.codes(name).tolist()]
+            elif kind == "timestamp":
+                values = [None if text == "NaT" else text.replace("T", " ") + " UTC"
+                          for text in np.datetime_as_string(self.arrays[name], unit="ms").tolist()]
+            elif kind == "date":
+                values = [None if text == "NaT" else text
+                          for text in np.datetime_as_string(self.arrays[name], unit="D").tolist()]
+            elif kind == "float64":
+                array = self.arrays[name]
+                values = [None if value != value else value for value in array.tolist()]
+            else:
+                values = self.arrays[name].tolist()
+            decoded.append(values)
+
+        names = self.column_names
+        for row_values in zip(*decoded):
+            yield dict(zip(names, row_values))
+
+
+def load_columnar(path: str, mmap: bool = True) -> ColumnarResult:
+    """列指向キャッシュを読み込む"""
+    return ColumnarResult(path, mmap=mmap)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("使い方: python columnar_cache.py Results/Result_Earn.json [...]")
+        sys.exit(1)
+    for json_file in sys.argv[1:]:
+        output = convert_result_file(json_file)
+        print(f"[OK] Generated: {output} "
+              f"({os.path.getsize(json_file):,} bytes → {os.path.getsize(output):,} bytes)")
@@ -0,0 +1,425 @@
+"""
+Dune実行結果のデータ品質チェック
+SQLを生成・ロードする前に、テーブルごとの結果を列の NumPy 配列にしてまとめて検査し、JSONのレポートを出力する
+
+    duplicate_keys（error）:   主キー（conflict_columns）が同じ行が複数ある
+    null_keys（error）:        主キーのカラムが NULL の行がある
+    negative_values（error）:  nonnegative_columns に負の値がある
+    date_gaps（warning）:      日付以外の主キー（トークン・Vaultなど）ごとに、最初と最後の日付の間で欠けている日がある
+    change_outliers（warning）: change_columns の前日比（対数）が、同じキーの前日比の中央値から
+                              z_threshold × MAD 以上離れ、かつ min_ratio 倍以上（1/min_ratio 以下）に変化している
+
+全てのチェックは (キー, 日付) でソートした配列に対する比較と集計で行うため、行ごとのループを使わない。
+SQLGenerator / DatabaseLoader と同じ結果JSONを検査する。隣の列指向キャッシュ（Result_*.npz）は、
+is_columnar_fresh で同じ実行の内容と確認できた場合のみ代わりに読み込む。
+
+使い方:
+    python data_quality.py --results-dir Results --output quality_report.json
+    python generate_migration_sql.py --quality-gate   # チェックに失敗した場合はSQLを生成しない
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from columnar_cache import columnar_path, is_columnar_fresh, load_columnar
+from result_stream import RowSource, open_result_rows
+from table_specs import TABLE_SPECS, TableSpec
+
+
+REPORT_VERSION = 1
+
+SEVERITIES = ("error", "warning")
+
+# 外れ値の判定に使う既定値
+DEFAULT_Z_THRESHOLD = 10.0
+DEFAULT_MIN_RATIO = 2.0
+# 前日比がこの数に満たないキーは外れ値を判定しない（中央値・MADが安定しないため）
+MIN_CHANGES_PER_KEY = 5
+
+# レポートに載せる問題の行の例の数
+MAX_EXAMPLES = 5
+
+# 正規分布の場合に MAD を標準偏差に換算する係数
+_MAD_SCALE = 1.4826
+
+# 日付が NULL（NaT）の行の day_ordinals の値
+_NULL_DAY = np.iinfo(np.int64).min
+
+
+class TableArrays:
+    """
+    1テーブル分の結果を列ごとの配列にしたもの
+
+    主キーのうち日付以外のカラムは辞書エンコードした整数（NULLは -1）、日付は1970-01-01からの日数、
+    数値のカラムは float64（NULLは NaN）で保持する。
+    """
+
+    def __init__(self, spec: TableSpec, source: str, key_codes: Dict[str, np.ndarray],
+                 key_values: Dict[str, np.ndarray], day_ordinals: Optional[np.ndarray],
+                 numbers: Dict[str, np.ndarray]):
+        """
+        Args:
+            spec: テーブル定義
+            source: 読み込み元の表示名
+            key_codes: 日付以外の主キーのカラムごとのコード
+            key_values: 日付以外の主キーのカラムごとのコードに対応する値
+            day_ordinals: 主キーの日付（1970-01-01からの日数、NULLは _NULL_DAY。日付カラムが無い場合は None）
+            numbers: チェック対象の数値カラム
+        """
+        self.spec = spec
+        self.source = source
+        self.key_codes = key_codes
+        self.key_values = key_values
+        self.day_ordinals = day_ordinals
+        self.numbers = numbers
+        self.row_count = len(day_ordinals) if day_ordinals is not None else (
+            len(next(iter(key_codes.values()))) if key_codes else 0)
+
+    @classmethod
+    def from_rows(cls, spec: TableSpec, source: RowSource) -> "TableArrays":
+        """結果ファイル（または行のリーダー）から作成（ストリーミングで読み込む）"""
+        reader = open_result_rows(source)
+        date_column = spec.date_column
+        key_columns = [column for column in spec.conflict_columns if column != date_column]
+        number_columns = _number_columns(spec)
+
+        indexes: Dict[str, Dict[str, int]] = {column: {} for column in key_columns}
+        codes: Dict[str, List[int]] = {column: [] for column in key_columns}
+        days: List[str] = []
+        numbers: Dict[str, List[Any]] = {column: [] for column in number_columns}
+        for row in reader:
+            for column in key_columns:
+                value = row.get(column)
+                codes[column].append(-1 if value is None else indexes[column].setdefault(value, len(indexes[column])))
+            if date_column:
+                value = row.get(date_column)
+                days.append("NaT" if value is None else value[:10])
+            for column in number_columns:
+                numbers[column].append(row.get(column))
+
+        day_ordinals = None
+        if date_column:
+            day_ordinals = np.array(days, dtype="datetime64[D]").astype(np.int64)
+        return cls(spec, reader.source,
+                   {column: np.array(codes[column], dtype=np.int64) for column in key_columns},
+                   {column: np.array(list(indexes[column]), dtype=str) for column in key_columns},
+                   day_ordinals,
+                   # None は NaN になる
+                   {column: np.array(values, dtype=np.float64) for column, values in numbers.items()})
+
+    @classmethod
+    def from_columnar(cls, spec: TableSpec, npz_file: str) -> "TableArrays":
+        """列指向キャッシュ（Result_*.npz）から作成"""
+        result = load_columnar(npz_file)
+        date_column = spec.date_column
+        key_columns = [column for column in spec.conflict_columns if column != date_column]
+        day_ordinals = None
+        if date_column:
+            day_ordinals = result.column(date_column).astype("datetime64[D]").astype(np.int64)
+        return cls(spec, npz_file,
+                   {column: result.codes(column).astype(np.int64) for column in key_columns},
+                   {column: result.categories(column) for column in key_columns},
+                   day_ordinals,
+                   {column: result.column(column).astype(np.float64) for column in _number_columns(spec)})
+
+    @classmethod
+    def load(cls, spec: TableSpec, json_file: str) -> "TableArrays":
+        """
+        結果JSONから作成
+
+        隣の列指向キャッシュが結果JSONと同じ実行のもの（is_columnar_fresh）であればそちらを読み込む。
+        古い・確認できないキャッシュは使わない（SQLGenerator が読むのは常に結果JSONのため）。
+        """
+        if is_columnar_fresh(json_file):
+            return cls.from_columnar(spec, columnar_path(json_file))
+        return cls.from_rows(spec, json_file)
+
+    def group_ids(self) -> np.ndarray:
+        """日付以外の主キーの組み合わせごとの0以上の番号（日付以外の主キーが無いテーブルは全て0）"""
+        if not self.key_codes:
+            return np.zeros(self.row_count, dtype=np.int64)
+        codes = list(self.key_codes.values())
+        if len(codes) == 1:
+            return codes[0] + 1   # NULL（-1）を0にする
+        _, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        return inverse.reshape(-1).astype(np.int64)
+
+    def describe_key(self, index: int) -> Dict[str, Any]:
+        """行の主キーを表示用の dict にする"""
+        key: Dict[str, Any] = {}
+        for column in self.spec.conflict_columns:
+            if column in self.key_codes:
+                code = int(self.key_codes[column][index])
+                key[column] = None if code < 0 else str(self.key_values[column][code])
+            else:
+                key[column] = _format_day(int(self.day_ordinals[index]))
+        return key
+
+
+def _number_columns(spec: TableSpec) -> List[str]:
+    """チェック対象の数値カラム（定義順）"""
+    targets = set(spec.nonnegative_columns) | set(spec.change_columns)
+    return [column for column in spec.column_names if column in targets]
+
+
+def _format_day(ordinal: int) -> Optional[str]:
+    """1970-01-01からの日数を YYYY-MM-DD にする"""
+    if ordinal == _NULL_DAY:
+        return None
+    return str(np.datetime64(ordinal, "D"))
+
+
+def _check(name: str, severity: str, count: int, examples: List[Dict[str, Any]],
+           **details: Any) -> Dict[str, Any]:
+    """1つのチェック結果"""
+    return {"name": name, "severity": severity, "passed": count == 0, "count": int(count),
+            **details, "examples": examples}
+
+
+def _sort_order(groups: np.ndarray, ranks: np.ndarray, rank_count: int) -> np.ndarray:
+    """
+    グループ順・グループ内は ranks の順に並べるインデックス
+
+    (グループ, 順位) を1つの int64 にまとめて1回の argsort で並べる（np.lexsort より数倍速い）。
+    """
+    return np.argsort(groups * rank_count + ranks)
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, group_count: int) -> np.ndarray:
+    """グループごとの中央値（値が無いグループは NaN）"""
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[np.argsort(values)] = np.arange(len(values))
+    order = _sort_order(groups, ranks, len(values))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.cumsum(counts) - counts
+    medians = np.full(group_count, np.nan)
+    present = counts > 0
+    lower = starts[present] + (counts[present] - 1) // 2
+    upper = starts[present] + counts[present] // 2
+    medians[present] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return medians
+
+
+def check_table(arrays: TableArrays, z_threshold: float = DEFAULT_Z_THRESHOLD,
+                min_ratio: float = DEFAULT_MIN_RATIO) -> Dict[str, Any]:
+    """
+    1テーブル分の配列をチェック
+
+    Args:
+        arrays: テーブルの列の配列
+        z_threshold: 前日比の外れ値とするロバストzスコア（|前日比 - 中央値| / (1.4826 × MAD)）
+        min_ratio: 前日比の外れ値とする最小の変化の倍率
+
+    Returns:
+        テーブルのレポート（checks にチェックごとの結果）
+    """
+    spec = arrays.spec
+    started = time.perf_counter()
+    groups = arrays.group_ids()
+    days = arrays.day_ordinals if arrays.day_ordinals is not None else np.zeros(arrays.row_count, dtype=np.int64)
+    # NULLの日付はキーの中で最初に並べる
+    null_days = days == _NULL_DAY
+    first_day = int(days[~null_days].min()) if (~null_days).any() else 0
+    day_ranks = np.where(null_days, 0, days - first_day + 1)
+    order = _sort_order(groups, day_ranks, int(day_ranks.max()) + 1 if arrays.row_count else 1)
+    sorted_groups = groups[order]
+    sorted_days = days[order]
+    same_group = sorted_groups[1:] == sorted_groups[:-1]
+    checks = []
+
+    # 主キーの重複（ソート後に隣り合う行の主キーが同じ）
+    duplicated = same_group & (sorted_days[1:] == sorted_days[:-1])
+    duplicate_rows = order[1:][duplicated]
+    checks.append(_check("duplicate_keys", "error", len(duplicate_rows),
+                         [arrays.describe_key(i) for i in duplicate_rows[:MAX_EXAMPLES]]))
+
+    # 主キーの NULL
+    null_mask = np.zeros(arrays.row_count, dtype=bool)
+    for codes in arrays.key_codes.values():
+        null_mask |= codes < 0
+    if arrays.day_ordinals is not None:
+        null_mask |= arrays.day_ordinals == _NULL_DAY
+    null_rows = np.flatnonzero(null_mask)
+    checks.append(_check("null_keys", "error", len(null_rows),
+                         [arrays.describe_key(i) for i in null_rows[:MAX_EXAMPLES]]))
+
+    # 負の値
+    negative_columns = {}
+    negative_examples = []
+    for column in spec.nonnegative_columns:
+        negative_rows = np.flatnonzero(arrays.numbers[column] < 0)
+        if len(negative_rows):
+            negative_columns[column] = len(negative_rows)
+            negative_examples.extend(dict(arrays.describe_key(i), column=column, value=float(arrays.numbers[column][i]))
+                                     for i in negative_rows[:MAX_EXAMPLES - len(negative_examples)])
+    checks.append(_check("negative_values", "error", sum(negative_columns.values()), negative_examples,
+                         columns=negative_columns))
+
+    if arrays.day_ordinals is not None:
+        # 欠けている日（同じキーで隣り合う行の日付の差が2日以上）。NULLの日付は null_keys で扱う
+        valid_days = same_group & (sorted_days[:-1] != _NULL_DAY)
+        gap = sorted_days[1:] - sorted_days[:-1]
+        gap_mask = valid_days & (gap > 1)
+        gap_positions = np.flatnonzero(gap_mask)
+        gap_examples = [
+            dict(arrays.describe_key(order[i]), next_day=_format_day(int(sorted_days[i + 1])),
+                 missing_days=int(gap[i] - 1))
+            for i in gap_positions[:MAX_EXAMPLES]
+        ]
+        checks.append(_check("date_gaps", "warning", len(gap_positions), gap_examples,
+                             missing_days=int((gap[gap_mask] - 1).sum())))
+
+        # 前日比（対数）の外れ値。キーごとの中央値とMADで標準化する
+        outlier_columns = {}
+        outlier_examples = []
+        group_count = int(sorted_groups.max()) + 1 if arrays.row_count else 0
+        consecutive = same_group & (gap == 1) & (sorted_days[:-1] != _NULL_DAY)
+        for column in spec.change_columns:
+            values = arrays.numbers[column][order]
+            previous, current = values[:-1], values[1:]
+            valid = consecutive & (previous > 0) & (current > 0)
+            positions = np.flatnonzero(valid)
+            if not len(positions):
+                continue
+            log_change = np.log(current[positions] / previous[positions])
+            change_groups = sorted_groups[positions + 1]
+            counts = np.bincount(change_groups, minlength=group_count)
+            median = _group_median(log_change, change_groups, group_count)
+            deviation = np.abs(log_change - median[change_groups])
+            mad = _group_median(deviation, change_groups, group_count) * _MAD_SCALE
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z_scores = np.where(deviation > 0, deviation / mad[change_groups], 0.0)
+            outliers = ((z_scores > z_threshold) & (np.abs(log_change) >= np.log(min_ratio))
+                        & (counts[change_groups] >= MIN_CHANGES_PER_KEY))
+            outlier_positions = positions[outliers]
+            if len(outlier_positions):
+                outlier_columns[column] = len(outlier_positions)
+                outlier_examples.extend(
+                    dict(arrays.describe_key(order[i + 1]), column=column, previous=float(previous[i]),
+                         value=float(current[i]), ratio=float(current[i] / previous[i]))
+                    for i in outlier_positions[:MAX_EXAMPLES - len(outlier_examples)])
+        checks.append(_check("change_outliers", "warning", sum(outlier_columns.values()), outlier_examples,
+                             columns=outlier_columns, z_threshold=z_threshold, min_ratio=min_ratio))
+
+    return {
+        "source": arrays.source,
+        "rows": arrays.row_count,
+        "keys": int(arrays.row_count - same_group.sum()) if arrays.row_count else 0,
+        "check_seconds": round(time.perf_counter() - started, 4),
+        "checks": checks,
+    }
+
+
+def validate_results(results_dir: str = "Results", tables: Optional[List[str]] = None,
+                     fail_on: str = "error", z_threshold: float = DEFAULT_Z_THRESHOLD,
+                     min_ratio: float = DEFAULT_MIN_RATIO) -> Dict[str, Any]:
+    """
+    結果ファイルのあるテーブルを全てチェックし、レポートを作成
+
+    Args:
+        results_dir: Result_*.json の格納ディレクトリ
+        tables: 対象のテーブル（省略時は TABLE_SPECS の全テーブル）
+        fail_on: "error" は error のチェックだけ、"warning" は warning のチェックも失敗として扱う
+        z_threshold: 前日比の外れ値とするロバストzスコア
+        min_ratio: 前日比の外れ値とする最小の変化の倍率
+
+    Returns:
+        レポート（passed が False の場合はSQLを生成しない）
+    """
+    if fail_on not in SEVERITIES:
+        raise ValueError(f"未対応の重要度です: {fail_on}")
+    blocking = SEVERITIES[:SEVERITIES.index(fail_on) + 1]
+    report: Dict[str, Any] = {
+        "version": REPORT_VERSION,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "results_dir": results_dir,
+        "fail_on": fail_on,
+        "passed": True,
+        "tables": {},
+    }
+    for table in tables or list(TABLE_SPECS):
+        spec = TABLE_SPECS[table]
+        json_file = os.path.join(results_dir, spec.result_file)
+        if not os.path.exists(json_file):
+            continue
+        started = time.perf_counter()
+        arrays = TableArrays.load(spec, json_file)
+        load_seconds = time.perf_counter() - started
+        table_report = check_table(arrays, z_threshold, min_ratio)
+        table_report["load_seconds"] = round(load_seconds, 4)
+        table_report["passed"] = all(check["passed"] for check in table_report["checks"]
+                                     if check["severity"] in blocking)
+        report["tables"][table] = table_report
+        report["passed"] = report["passed"] and table_report["passed"]
+    return report
+
+
+def write_report(report: Dict[str, Any], path: str):
+    """レポートをJSONで保存"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    """レポートを表示用の行にする"""
+    lines = []
+    for table, table_report in report["tables"].items():
+        mark = "✓" if table_report["passed"] else "✗"
+        lines.append(f"{mark} {table}: {table_report['rows']}行, {table_report['keys']}キー "
+                     f"（読み込み {table_report['load_seconds']:.2f}秒, チェック {table_report['check_seconds']:.3f}秒）")
+        for check in table_report["checks"]:
+            if not check["passed"]:
+                lines.append(f"    [{check['severity'].upper()}] {check['name']}: {check['count']}件")
+    return lines
+
+
+def run_quality_gate(results_dir: str, report_path: str, fail_on: str = "error") -> bool:
+    """
+    データ品質チェックを実行してレポートを保存し、結果を表示（generate_migration_sql.py から呼び出す）
+
+    Returns:
+        チェックに合格した場合True
+    """
+    report = validate_results(results_dir, fail_on=fail_on)
+    write_report(report, report_path)
+    for line in format_report(report):
+        print(line)
+    status = "[OK]" if report["passed"] else "[NG]"
+    print(f"{status} データ品質チェック: {report_path}")
+    return report["passed"]
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Dune実行結果のデータ品質チェック")
+    parser.add_argument("--results-dir", default="Results", help="Result_*.json の格納ディレクトリ")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLE_SPECS), help="対象のテーブル（省略時は全テーブル）")
+    parser.add_argument("--output", default="quality_report.json", help="レポートの保存先")
+    parser.add_argument("--fail-on", choices=SEVERITIES, default="error",
+                        help="error: error のチェックのみで失敗 / warning: warning のチェックでも失敗")
+    parser.add_argument("--z-threshold", type=float, default=DEFAULT_Z_THRESHOLD,
+                        help=f"前日比の外れ値とするロバストzスコア（デフォルト: {DEFAULT_Z_THRESHOLD}）")
+    parser.add_argument("--min-ratio", type=float, default=DEFAULT_MIN_RATIO,
+                        help=f"前日比の外れ値とする最小の変化の倍率（デフォルト: {DEFAULT_MIN_RATIO}）")
+    args = parser.parse_args()
+
+    report = validate_results(args.results_dir, args.tables, args.fail_on, args.z_threshold, args.min_ratio)
+    write_report(report, args.output)
+    for line in format_report(report):
+        print(line)
+    print(f"[OK] Generated: {args.output}")
+    if not report["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Dune結果JSONをデータベースへ直接ロードするローダー
+.sqlファイルを経由せずに Results/Result_*.json を PostgreSQL（またはSQLite）にUPSERTする
+
+使い方:
+    python generate_migration_sql.py load --dsn postgresql://user@localhost/db
+    python generate_migration_sql.py load --sqlite morpho.db
+"""
+
+import os
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from generate_migration_sql import BATCH_SIZE
+from result_stream import RowSource, open_result_rows
+from table_specs import TABLE_SPECS
+
+
+def _batched(values: Iterable[tuple], batch_size: int) -> Iterable[List[tuple]]:
+    """値タプルを batch_size 件ずつのリストにまとめる"""
+    batch: List[tuple] = []
+    for value in values:
+        batch.append(value)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ConnectionPool:
+    """
+    DB-API接続のシンプルなプール
+
+    テーブルごとのロードを並行実行する際に、ワーカーごとに接続を使い回す。
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int):
+        """
+        Args:
+            connect: 新しい接続を作成する関数
+            size: プールする接続数
+        """
+        self._connect = connect
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._created: List[Any] = []
+        for _ in range(size):
+            self._idle.put(None)
+
+    def acquire(self) -> Any:
+        """接続を取得（空きが無い場合は待機）"""
+        conn = self._idle.get()
+        if conn is None:
+            conn = self._connect()
+            self._created.append(conn)
+        return conn
+
+    def release(self, conn: Any):
+        """接続をプールに戻す"""
+        self._idle.put(conn)
+
+    def close(self):
+        """作成した全ての接続を閉じる"""
+        for conn in self._created:
+            conn.close()
+        self._created = []
+
+
+class DatabaseLoader:
+    """
+    Dune結果JSONをテーブルごとに1トランザクションでUPSERTするローダー
+
+    PostgreSQL では psycopg2.extras.execute_values で複数行をまとめて送信し、
+    SQLite（ローカルでの動作確認用）では executemany を使用する。
+    """
+
+    def __init__(self, pool: ConnectionPool, dialect: str, batch_size: int = BATCH_SIZE,
+                 skip_unchanged: bool = False):
+        """
+        Args:
+            pool: 接続プール
+            dialect: "postgres" または "sqlite"
+            batch_size: 1回の送信でまとめる行数
+            skip_unchanged: 既存の行と更新カラムの値が同じ行を更新しない
+        """
+        if dialect not in ("postgres", "sqlite"):
+            raise ValueError(f"未対応のデータベースです: {dialect}")
+        self.pool = pool
+        self.dialect = dialect
+        self.batch_size = batch_size
+        self.skip_unchanged = skip_unchanged
+
+    def _upsert_sql(self, table: str) -> str:
+        """テーブルのUPSERT文を生成"""
+        spec = TABLE_SPECS[table]
+        columns = spec.column_names
+        update_set = ", ".join(f"{col} = EXCLUDED.{col}" for col in spec.update_columns)
+        if self.dialect == "postgres":
+            values = "%s"
+        else:
+            values = "(" + ", ".join("?" for _ in columns) + ")"
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values} "
+               f"ON CONFLICT ({', '.join(spec.conflict_columns)}) "
+               f"DO UPDATE SET {update_set}, updated_at = CURRENT_TIMESTAMP")
+        if not self.skip_unchanged:
+            return sql
+        if self.dialect == "postgres":
+            return f"{sql} WHERE {spec.changed_condition()}"
+        # SQLite の IS NOT はNULL同士を等しいとみなす（IS DISTINCT FROM と同じ）
+        changed = " OR ".join(f"{table}.{col} IS NOT excluded.{col}" for col in spec.update_columns)
+        return f"{sql} WHERE {changed}"
+
+    def load_table(self, table: str, json_file: RowSource) -> Dict[str, Any]:
+        """
+        1テーブル分の結果ファイルをロード
+
+        Args:
+            table: テーブル名（TABLE_SPECS のキー）
+            json_file: Dune実行結果のJSONファイル（または CSVRowReader などの行のリーダー）
+
+        Returns:
+            table, rows, seconds, rows_per_sec を含むロード結果
+            （skip_unchanged の場合は書き込んだ行数 written、値が同じためスキップした行数 skipped も含む）
+        """
+        sql = self._upsert_sql(table)
+        reader = open_result_rows(json_file)
+        values = TABLE_SPECS[table].iter_row_values(reader)
+        started = time.perf_counter()
+        written = 0
+
+        conn = self.pool.acquire()
+        try:
+            cur = conn.cursor()
+            if self.dialect == "postgres":
+                from psycopg2.extras import execute_values
+                for batch in _batched(values, self.batch_size):
+                    # page_size をバッチの行数に揃えているため、rowcount はこのバッチで書き込んだ行数
+                    execute_values(cur, sql, batch, page_size=self.batch_size)
+                    written += cur.rowcount
+            else:
+                for batch in _batched(values, self.batch_size):
+                    cur.executemany(sql, batch)
+                    written += cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+
+        elapsed = time.perf_counter() - started
+        result = {
+            "table": table,
+            "rows": reader.row_count,
+            "seconds": round(elapsed, 4),
+            "rows_per_sec": round(reader.row_count / elapsed, 1) if elapsed > 0 else None,
+        }
+        if self.skip_unchanged:
+            result.update(written=written, skipped=reader.row_count - written)
+        return result
+
+    def load_all(self, results_dir: str, workers: int = 1) -> List[Dict[str, Any]]:
+        """
+        TABLE_SPECS の全テーブルをロード（結果ファイルが無いテーブルは対象外）
+
+        Args:
+            results_dir: Result_*.json の格納ディレクトリ
+            workers: 並行してロードするテーブル数
+
+        Returns:
+            テーブルごとのロード結果
+        """
+        tables = [
+            (table, os.path.join(results_dir, spec.result_file))
+            for table, spec in TABLE_SPECS.items()
+            if os.path.exists(os.path.join(results_dir, spec.result_file))
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda args: self.load_table(*args), tables))
+
+
+def create_postgres_pool(dsn: str, size: int) -> ConnectionPool:
+    """PostgreSQLの接続プールを作成（psycopg2が必要）"""
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("PostgreSQLへのロードには psycopg2 が必要です（pip install -r requirements.txt）")
+    return ConnectionPool(lambda: psycopg2.connect(dsn), size)
+
+
+def create_sqlite_pool(path: str, size: int) -> ConnectionPool:
+    """SQLiteの接続プールを作成し、ロード先のテーブルを用意する"""
+    conn = sqlite3.connect(path)
+    create_sqlite_schema(conn)
+    conn.close()
+    return ConnectionPool(lambda: sqlite3.connect(path, timeout=60, check_same_thread=False), size)
+
+
+def create_sqlite_schema(conn: sqlite3.Connection):
+    """TABLE_SPECS からSQLite用のテーブルを作成（PostgreSQLの代替としての動作確認用）"""
+    for table, spec in TABLE_SPECS.items():
+        columns = ",\n    ".join(spec.column_names)
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+    {columns},
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY ({', '.join(spec.conflict_columns)})
+)""")
+    conn.commit()
+
+
+def run_load(results_dir: str, dsn: Optional[str] = None, sqlite_path: Optional[str] = None,
+             workers: int = 1, create_schema: bool = False, skip_unchanged: bool = False) -> List[Dict[str, Any]]:
+    """
+    Results ディレクトリの全結果ファイルをデータベースにロードし、テーブルごとの速度を表示
+
+    Args:
+        results_dir: Result_*.json の格納ディレクトリ
+        dsn: PostgreSQLの接続文字列
+        sqlite_path: SQLiteのファイルパス（dsn の代わりに指定）
+        workers: 並行してロードするテーブル数
+        create_schema: PostgreSQLの場合に先に TABLE_SPECS の全テーブルを作成するか
+        skip_unchanged: 既存の行と値が同じ行を更新しない（スキップした行数を表示）
+
+    Returns:
+        テーブルごとのロード結果
+    """
+    if dsn:
+        pool = create_postgres_pool(dsn, workers)
+        dialect = "postgres"
+        if create_schema:
+            from generate_migration_sql import SQLGenerator
+            conn = pool.acquire()
+            with conn.cursor() as cur:
+                # 01_create_schema.sql に含まれないテーブル（wld_price_history など）も作成する
+                for statement in SQLGenerator().schema_statements():
+                    cur.execute(statement)
+            conn.commit()
+            pool.release(conn)
+    elif sqlite_path:
+        pool = create_sqlite_pool(sqlite_path, workers)
+        dialect = "sqlite"
+    else:
+        raise ValueError("dsn または sqlite_path を指定してください")
+
+    try:
+        results = DatabaseLoader(pool, dialect, skip_unchanged=skip_unchanged).load_all(results_dir, workers)
+    finally:
+        pool.close()
+
+    for result in results:
+        print(f"[OK] Loaded: {result['table']} {result['rows']} rows "
+              f"in {result['seconds']:.2f}s ({result['rows_per_sec']} rows/sec)")
+        if skip_unchanged:
+            print(f"     書き込み {result['written']}行 / 変更なしでスキップ {result['skipped']}行")
+    return results
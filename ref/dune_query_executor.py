@@ -3,29 +3,434 @@ Dune Analytics Query Executor
 Query ID: 5963250を実行し、結果をJSON形式で保存するPythonスクリプト
 """
 
+import io
 import os
 import sys
 import json
+import re
 import time
-from datetime import datetime
-from typing import Dict, Any, Optional
+import random
+import argparse
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, TextIO, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from instrumentation import NOOP_TRACER, Tracer, create_tracer
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_BYTES, DEFAULT_CACHE_TTL, ResultCache
+from result_stream import CSVRowReader
+from table_specs import TABLE_SPECS, encode_sql_column
+
+
+DUNE_API_BASE_URL = "https://api.dune.com/api/v1"
+
+# 結果をページ単位で取得する際の1ページあたりの行数
+DEFAULT_PAGE_SIZE = 10000
+
+# 日次で取得するクエリ（api/cron/dune-fetch.ts の QUERY_CONFIGS と同じ）
+# date_filter はクエリが p_date をどう使うか（backfill.py が期間の分け方を決めるのに使う）
+#   since: p_date 以降の全ての日（day >= p_date）
+#   day:   p_date の1日だけ（day = p_date）
+# 期間の終了日を受け取るクエリは end_param にそのパラメータ名を指定する（backfill.py が期間ごとに分けて実行する）
+QUERY_CONFIGS: List[Dict[str, Any]] = [
+    {
+        "query_id": 5963629,
+        "query_name": "World Morpho Collateral History",
+        "table_name": "morpho_collateral_history",
+        "result_file": "Result_Collateral.json",
+        "date_filter": "since",
+    },
+    {
+        "query_id": 5963670,
+        "query_name": "World Morpho Borrow History",
+        "table_name": "morpho_borrow_history",
+        "result_file": "Result_Borrow.json",
+        "date_filter": "day",
+    },
+    {
+        "query_id": 5963703,
+        "query_name": "World DEX Volume History",
+        "table_name": "dex_volume_history",
+        "result_file": "Result_DEX.json",
+        "date_filter": "since",
+    },
+    {
+        "query_id": 5963349,
+        "query_name": "World Morpho Earn History",
+        "table_name": "morpho_earn_history",
+        "result_file": "Result_Earn.json",
+        "date_filter": "since",
+    },
+    {
+        "query_id": 5982584,
+        "query_name": "WLD Daily Price History",
+        "table_name": "wld_price_history",
+        "result_file": "Result_WLDPrice.json",
+        "date_filter": "since",
+    },
+]
+
+# 同時に実行するクエリ数のデフォルト値
+DEFAULT_MAX_CONCURRENCY = 5
+
+# HTTPコネクションプールのサイズ（同時実行数以上にしておく）
+DEFAULT_POOL_SIZE = 10
+
+# リクエストごとのタイムアウト秒数（接続, 読み込み）
+DEFAULT_TIMEOUT = (10, 60)
+
+# 完了済みの実行状態
+COMPLETED_STATE = "QUERY_STATE_COMPLETED"
+# 完了以外の終了状態（COMPLETED_PARTIAL は行が欠けた結果のため、失敗として扱う）
+FAILED_STATES = ("QUERY_STATE_FAILED", "QUERY_STATE_CANCELLED", "QUERY_STATE_EXPIRED",
+                 "QUERY_STATE_COMPLETED_PARTIAL")
+
+# 実行（の結果）がDune上に無くなったことを示すHTTPステータス（期限切れなど）
+GONE_STATUS_CODES = (404, 410)
+
+
+def parse_dune_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    Dune APIのタイムスタンプ（例: 2025-10-15T06:53:27.152016Z）をUTCのdatetimeに変換
+
+    小数秒が6桁を超える場合（ナノ秒精度）はマイクロ秒に切り詰める。
+    """
+    if not value:
+        return None
+    match = re.match(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?', value)
+    if not match:
+        return None
+    fraction = (match.group(2) or "0")[:6].ljust(6, "0")
+    return datetime.strptime(f"{match.group(1)}.{fraction}", "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
+
+
+class AdaptivePollScheduler:
+    """
+    実行ステータスのポーリング間隔を決めるスケジューラ
+
+    最初は短い間隔で確認し、確認するたびに間隔をジッター付きで指数的に伸ばす。
+    ステータスに含まれるサーバー側の情報も考慮する:
+      - queue_position: 待ち行列の後ろにいるほど間隔を広げる
+      - execution_started_at: 実行開始からの経過時間に比例した間隔にとどめ、
+        短時間で終わるクエリの完了を素早く検出する
+    """
+
+    # 待ち行列1件あたりに見込む待ち時間（秒）
+    SECONDS_PER_QUEUE_POSITION = 1.0
+    # 実行開始からの経過時間に対するポーリング間隔の割合
+    RUNNING_TIME_RATIO = 0.25
+
+    def __init__(self, initial_interval: float = 0.5, max_interval: float = 5.0,
+                 multiplier: float = 1.6, jitter: float = 0.2, rng: Optional[random.Random] = None):
+        """
+        Args:
+            initial_interval: 最初のポーリング間隔（秒）
+            max_interval: ポーリング間隔の上限（秒）
+            multiplier: 1回ごとの間隔の倍率
+            jitter: 間隔に加える揺らぎの割合（0.2 なら ±20%）
+            rng: ジッター用の乱数生成器（テスト時に固定するため）
+        """
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self.attempt = 0
+
+    def next_interval(self, status: Dict[str, Any], now: Optional[datetime] = None) -> float:
+        """
+        次のステータス確認までの待ち時間を計算
+
+        Args:
+            status: 直前の check_execution_status のレスポンス
+            now: 現在時刻（UTC、省略時は現在時刻）
+
+        Returns:
+            待ち時間（秒）
+        """
+        interval = self.initial_interval * (self.multiplier ** self.attempt)
+        self.attempt += 1
+
+        queue_position = status.get('queue_position')
+        started_at = parse_dune_timestamp(status.get('execution_started_at'))
+        if queue_position:
+            interval = max(interval, queue_position * self.SECONDS_PER_QUEUE_POSITION)
+        elif started_at:
+            running = ((now or datetime.now(timezone.utc)) - started_at).total_seconds()
+            interval = min(interval, max(self.initial_interval, running * self.RUNNING_TIME_RATIO))
+
+        interval = min(interval, self.max_interval)
+        return interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレート制限（複数スレッドから共有できる）
+
+    rate 件/秒の割合でトークンが補充され、最大 capacity 件まで貯まる。
+    acquire はトークンが1つ得られるまで待つため、短時間のまとまったリクエストは capacity 件まで許し、
+    長い目で見たリクエスト数を rate 件/秒に抑える。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            rate: 1秒あたりに補充するトークン数
+            capacity: 貯められるトークン数の上限（省略時は max(1, rate)）
+            clock: 現在時刻（秒）を返す関数（テスト時に差し替えるため）
+            sleep: 待機に使う関数
+        """
+        if rate <= 0:
+            raise ValueError(f"rate は正の値を指定してください: {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.updated = clock()
+        # 取得したトークン数と、トークン待ちで待機した合計秒数
+        self.acquired = 0
+        self.waited_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        トークンを1つ取得（無い場合は補充されるまで待つ）
+
+        Returns:
+            待機した秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.acquired += 1
+                    self.waited_seconds += waited
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+
+class ResultPageCheckpoint:
+    """
+    ページ単位で取得した実行結果のチェックポイント
+
+    取得済みのページを {checkpoint_dir}/{execution_id}/ 以下に1ページ1ファイルで保存し、
+    次に取得すべきオフセットを state.json に記録する。
+    ダウンロードが中断された場合も、最後に保存したページの次から再開できる。
+
+    実行中・取得中の実行IDはクエリIDとパラメータごとに {checkpoint_dir}/in_flight.json に記録し
+    （record_in_flight）、次回の実行では新たにクエリを実行せずにその実行IDから再開する（find_in_flight）。
+    結果を保存し終えたら discard でチェックポイントと記録を削除する。
+    """
+
+    STATE_FILE = "state.json"
+    IN_FLIGHT_FILE = "in_flight.json"
+    _in_flight_lock = threading.Lock()
+
+    def __init__(self, checkpoint_dir: str, execution_id: str):
+        """
+        Args:
+            checkpoint_dir: チェックポイントの保存先ディレクトリ
+            execution_id: 実行ID
+        """
+        self.directory = os.path.join(checkpoint_dir, execution_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        state_path = os.path.join(self.directory, self.STATE_FILE)
+        if not os.path.exists(state_path):
+            return {"pages": [], "next_offset": 0, "next_uri": None, "completed": False}
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_json(self, filename: str, data: Dict[str, Any]):
+        """一時ファイルに書いてから置き換え、書きかけのファイルを残さない"""
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @property
+    def completed(self) -> bool:
+        return self.state["completed"]
+
+    @property
+    def next_offset(self) -> int:
+        return self.state["next_offset"]
+
+    @property
+    def next_uri(self) -> Optional[str]:
+        return self.state["next_uri"]
+
+    def iter_saved_pages(self) -> Iterator[Dict[str, Any]]:
+        """保存済みのページを取得順に返す"""
+        for filename in self.state["pages"]:
+            with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+                yield json.load(f)
+
+    def save_page(self, page: Dict[str, Any]):
+        """
+        取得したページを保存し、次のオフセットを記録
+
+        Args:
+            page: Dune APIのレスポンス
+        """
+        filename = f"page_{len(self.state['pages']):06d}.json"
+        self._write_json(filename, page)
+
+        next_offset = page.get('next_offset')
+        self.state["pages"].append(filename)
+        self.state["next_offset"] = next_offset
+        self.state["next_uri"] = page.get('next_uri')
+        self.state["completed"] = next_offset is None and not page.get('next_uri')
+        self._write_json(self.STATE_FILE, self.state)
+
+    @staticmethod
+    def _in_flight_key(query_id: int, params: Optional[Dict[str, Any]]) -> str:
+        return json.dumps([query_id, params or {}], sort_keys=True, ensure_ascii=False)
+
+    @classmethod
+    def _update_in_flight(cls, checkpoint_dir: str, key: str, execution_id: Optional[str]):
+        """in_flight.json の1項目を記録（execution_id が None の場合は削除）"""
+        path = os.path.join(checkpoint_dir, cls.IN_FLIGHT_FILE)
+        with cls._in_flight_lock:
+            in_flight = cls._load_in_flight(checkpoint_dir)
+            if execution_id is None:
+                if in_flight.pop(key, None) is None:
+                    return
+            else:
+                in_flight[key] = execution_id
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(in_flight, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def _load_in_flight(cls, checkpoint_dir: str) -> Dict[str, str]:
+        path = os.path.join(checkpoint_dir, cls.IN_FLIGHT_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @classmethod
+    def find_in_flight(cls, checkpoint_dir: str, query_id: int,
+                       params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """前回中断した実行ID（同じクエリIDとパラメータのもの。無い場合はNone）"""
+        with cls._in_flight_lock:
+            return cls._load_in_flight(checkpoint_dir).get(cls._in_flight_key(query_id, params))
+
+    @classmethod
+    def record_in_flight(cls, checkpoint_dir: str, query_id: int, params: Optional[Dict[str, Any]],
+                         execution_id: str):
+        """実行を開始した実行IDを記録（結果を保存し終えるまで残す）"""
+        cls._update_in_flight(checkpoint_dir, cls._in_flight_key(query_id, params), execution_id)
+
+    @classmethod
+    def discard(cls, checkpoint_dir: str, query_id: int, params: Optional[Dict[str, Any]],
+                execution_id: Optional[str]):
+        """実行IDのチェックポイント（保存済みのページ）と実行中の記録を削除"""
+        if execution_id:
+            shutil.rmtree(os.path.join(checkpoint_dir, execution_id), ignore_errors=True)
+        cls._update_in_flight(checkpoint_dir, cls._in_flight_key(query_id, params), None)
+
 
 class DuneAPIClient:
     """Dune Analytics APIクライアント"""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: str = DUNE_API_BASE_URL,
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 result_cache: Optional[ResultCache] = None, tracer: Optional[Tracer] = None,
+                 rate_limiter: Optional[TokenBucket] = None):
         """
         Dune APIクライアントを初期化
 
+        全てのリクエストは keep-alive の Session を通して送信し、
+        ポーリングのたびに TCP/TLS 接続を張り直さずに済むようにする。
+
         Args:
             api_key: Dune API Key
+            base_url: APIのベースURL（テスト用のスタブサーバーを指定可能）
+            pool_size: ホストごとに保持する接続数の上限
+            timeout: リクエストごとのタイムアウト秒数（接続, 読み込み）
+            result_cache: 実行結果のキャッシュ（指定時は run_query がクエリ実行前に参照する）
+            tracer: 処理時間の計測先（省略時は計測しない）
+            rate_limiter: 全てのリクエストの前にトークンを取得するレート制限（省略時は制限しない）
         """
         self.api_key = api_key
-        self.base_url = "https://api.dune.com/api/v1"
+        self.base_url = base_url.rstrip('/')
         self.headers = {"x-dune-api-key": api_key}
+        self.timeout = timeout
+        self.result_cache = result_cache
+        self.tracer = tracer or NOOP_TRACER
+        self.rate_limiter = rate_limiter
+        # 実行IDごとのポーリング統計（wait_for_execution が記録）
+        self.poll_stats: Dict[str, Dict[str, Any]] = {}
+        # 実行せずに再利用した実行IDごとの結果の経過秒数（fetch_fresh_results が記録）
+        self.reused_executions: Dict[str, float] = {}
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def __enter__(self) -> "DuneAPIClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Sessionを閉じ、保持している接続を解放"""
+        self.session.close()
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Session経由でリクエストを送信し、エラー時は例外を送出（rate_limiter がある場合はトークンを取得してから）"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        コネクションプールの利用状況を取得
+
+        Returns:
+            requests: 送信したリクエスト数
+            connections_opened: 新規に開いた接続数
+            connections_reused: 既存の接続を再利用したリクエスト数
+        """
+        pools = self._adapter.poolmanager.pools
+        request_count = 0
+        opened = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            request_count += pool.num_requests
+            opened += pool.num_connections
+        return {
+            "requests": request_count,
+            "connections_opened": opened,
+            "connections_reused": request_count - opened,
+        }
 
     def execute_query(self, query_id: int, params: Optional[Dict[str, Any]] = None) -> str:
         """
@@ -44,10 +449,11 @@ class DuneAPIClient:
         if params:
             body["query_parameters"] = params
 
-        response = requests.post(url, headers=self.headers, json=body)
-        response.raise_for_status()
+        with self.tracer.span("dune.execute", query_id=query_id) as span:
+            response = self._request("POST", url, json=body)
+            result = response.json()
+            span.set(execution_id=result['execution_id'])
 
-        result = response.json()
         print(f"✓ クエリ実行開始: execution_id={result['execution_id']}")
         return result['execution_id']
 
@@ -63,61 +469,470 @@ class DuneAPIClient:
         """
         url = f"{self.base_url}/execution/{execution_id}/status"
 
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
+        response = self._request("GET", url)
 
         return response.json()
 
-    def get_execution_results(self, execution_id: str) -> Dict[str, Any]:
+    def get_execution_results(self, execution_id: str, limit: Optional[int] = None,
+                              offset: Optional[int] = None) -> Dict[str, Any]:
         """
         実行結果を取得（JSON形式）
 
         Args:
             execution_id: 実行ID
+            limit: 取得する最大行数（省略時は全件）
+            offset: 取得開始位置（省略時は先頭から）
 
         Returns:
             クエリ実行結果
         """
         url = f"{self.base_url}/execution/{execution_id}/results"
 
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
+        params = {}
+        if limit is not None:
+            params["limit"] = limit
+        if offset is not None:
+            params["offset"] = offset
 
-        return response.json()
+        page, _ = self._fetch_results_page(url, params or None)
+        return page
+
+    def get_latest_results(self, query_id: int, limit: Optional[int] = None,
+                           offset: Optional[int] = None) -> Dict[str, Any]:
+        """
+        クエリの最新の実行結果を取得（クエリは実行しない）
+
+        Args:
+            query_id: Duneクエリ ID
+            limit: 取得する最大行数（省略時は全件）
+            offset: 取得開始位置（省略時は先頭から）
+
+        Returns:
+            get_execution_results と同じ形式のクエリ実行結果（execution_id / execution_ended_at を含む）
+        """
+        url = f"{self.base_url}/query/{query_id}/results"
+
+        params = {}
+        if limit is not None:
+            params["limit"] = limit
+        if offset is not None:
+            params["offset"] = offset
+
+        page, _ = self._fetch_results_page(url, params or None)
+        return page
+
+    def _fetch_results_page(self, url: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], int]:
+        """結果の1ページを取得し、(レスポンス, 受信したバイト数) を返す"""
+        with self.tracer.span("dune.results_page", offset=(params or {}).get("offset")) as span:
+            response = self._request("GET", url, params=params)
+            page = response.json()
+            size = len(response.content)
+            span.set(bytes=size, rows=len(page.get('result', {}).get('rows', [])))
+        return page, size
+
+    def iter_execution_result_pages(self, execution_id: str, page_size: int = DEFAULT_PAGE_SIZE,
+                                    checkpoint_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        実行結果をページ単位で取得
+
+        レスポンスの next_uri（無い場合は next_offset）をたどって最後のページまで取得する。
+        checkpoint_dir を指定すると各ページをディスクに保存し、中断後の再実行では
+        保存済みのページを返したうえで、最後に保存したページの次から取得を再開する。
+
+        Args:
+            execution_id: 実行ID
+            page_size: 1ページあたりの行数
+            checkpoint_dir: チェックポイントの保存先（オプション）
+
+        Returns:
+            ページ（Dune APIのレスポンス）のイテレータ
+        """
+        checkpoint = ResultPageCheckpoint(checkpoint_dir, execution_id) if checkpoint_dir else None
+
+        offset: Optional[int] = 0
+        next_uri: Optional[str] = None
+        if checkpoint:
+            yield from checkpoint.iter_saved_pages()
+            if checkpoint.completed:
+                return
+            offset, next_uri = checkpoint.next_offset, checkpoint.next_uri
+            if checkpoint.state["pages"]:
+                print(f"  チェックポイントから再開: offset={offset}")
+
+        results_url = f"{self.base_url}/execution/{execution_id}/results"
+        with self.tracer.span("dune.download", execution_id=execution_id) as span:
+            pages = rows = size = 0
+            while offset is not None or next_uri:
+                if next_uri:
+                    page, page_bytes = self._fetch_results_page(next_uri)
+                else:
+                    page, page_bytes = self._fetch_results_page(
+                        results_url, {"limit": page_size, "offset": offset})
+                pages += 1
+                rows += len(page.get('result', {}).get('rows', []))
+                size += page_bytes
+                span.set(pages=pages, rows=rows, bytes=size)
+
+                if checkpoint:
+                    checkpoint.save_page(page)
+                yield page
+
+                next_uri = page.get('next_uri')
+                offset = page.get('next_offset')
+
+    def download_execution_results(self, execution_id: str, page_size: int = DEFAULT_PAGE_SIZE,
+                                   checkpoint_dir: Optional[str] = None) -> Dict[str, Any]:
+        """
+        実行結果を全ページ取得し、1つのレスポンスにまとめる
+
+        Args:
+            execution_id: 実行ID
+            page_size: 1ページあたりの行数
+            checkpoint_dir: チェックポイントの保存先（オプション）
+
+        Returns:
+            get_execution_results と同じ形式のクエリ実行結果
+        """
+        return merge_result_pages(self.iter_execution_result_pages(execution_id, page_size, checkpoint_dir))
+
+    def iter_execution_result_csv_pages(self, execution_id: str,
+                                        page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[TextIO]:
+        """
+        実行結果をCSV形式でページ単位にストリーミング取得
+
+        各ページはレスポンスを受信しながら読み込むテキストストリームとして返すため、
+        呼び出し側は次のページに進む前に読み切ること。次ページのオフセットは
+        レスポンスヘッダー x-dune-next-offset から取得する。受信したバイト数（圧縮されている場合は圧縮後）は
+        dune.download_csv スパンに記録する。
+
+        Args:
+            execution_id: 実行ID
+            page_size: 1ページあたりの行数
+
+        Returns:
+            ページ（CSVのテキストストリーム、先頭行はヘッダー）のイテレータ
+        """
+        url = f"{self.base_url}/execution/{execution_id}/results/csv"
+        offset: Optional[int] = 0
+        with self.tracer.span("dune.download_csv", execution_id=execution_id) as span:
+            pages = size = 0
+            while offset is not None:
+                with self._request("GET", url, params={"limit": page_size, "offset": offset},
+                                   stream=True) as response:
+                    # 読み切った時点で閉じられると TextIOWrapper が読み込めなくなるため、閉じるのはレスポンスに任せる
+                    response.raw.decode_content = True
+                    response.raw.auto_close = False
+                    yield io.TextIOWrapper(response.raw, encoding="utf-8", newline="")
+                    pages += 1
+                    size += response.raw.tell()
+                    span.set(pages=pages, bytes=size)
+                    next_offset = response.headers.get("x-dune-next-offset")
+                offset = int(next_offset) if next_offset else None
+
+    def stream_execution_results_csv(self, execution_id: str, table: Optional[str] = None,
+                                     page_size: int = DEFAULT_PAGE_SIZE) -> CSVRowReader:
+        """
+        実行結果をCSV形式で取得しながら、1行ずつ型付きのdictとして読み込むリーダーを返す
+
+        結果全体をメモリに載せないため、そのまま SQLGenerator.write_table_sql / write_table_copy や
+        DatabaseLoader.load_table に渡せる。JSON形式と違って行ごとにカラム名を繰り返さないため、受信量も少ない。
+
+        Args:
+            execution_id: 実行ID
+            table: 値の型に使うテーブル定義（TABLE_SPECS のキー、省略時はJSONの数値の文法に一致する値を数値にする）
+            page_size: 1ページあたりの行数
+
+        Returns:
+            CSVRowReader（ダウンロードは読み込みを始めた時点で開始する）
+        """
+        column_types = dict(TABLE_SPECS[table].columns) if table else None
+        return CSVRowReader(self.iter_execution_result_csv_pages(execution_id, page_size), column_types,
+                            fields={"execution_id": execution_id, "state": COMPLETED_STATE},
+                            source=f"{self.base_url}/execution/{execution_id}/results/csv")
+
+    def fetch_fresh_results(self, query_id: int, max_age: float,
+                            page_size: int = DEFAULT_PAGE_SIZE) -> Optional[Dict[str, Any]]:
+        """
+        Duneが保持している最新の実行結果が max_age 秒以内に完了したものであれば、全ページ取得して返す
+
+        最初のページで鮮度を確認し、古い場合はそれ以上取得しない。2ページ目以降は
+        最初のページの execution_id から取得するため、取得中に新しい実行が完了しても結果が混ざらない。
+        利用した実行の経過秒数は reused_executions[execution_id] に記録する。
+
+        Args:
+            query_id: Duneクエリ ID
+            max_age: 許容する結果の経過時間（秒、execution_ended_at からの経過時間）
+            page_size: 1ページあたりの行数
+
+        Returns:
+            get_execution_results と同じ形式のクエリ実行結果。結果が無い・古い場合はNone
+        """
+        with self.tracer.span("dune.latest", query_id=query_id, max_age=max_age) as span:
+            try:
+                first = self.get_latest_results(query_id, limit=page_size, offset=0)
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                span.set(fresh=False, age_seconds=None)
+                print(f"  最新の実行結果がありません: query_id={query_id}")
+                return None
+
+            execution_id = first.get('execution_id')
+            age = result_age_seconds(first)
+            fresh = age is not None and age <= max_age
+            span.set(execution_id=execution_id, fresh=fresh, age_seconds=age)
+            if not fresh:
+                age_text = "不明" if age is None else f"{age:.0f}秒前"
+                print(f"  最新の実行結果が古いため再実行します: query_id={query_id}（{age_text}完了）")
+                return None
+
+            pages = [first]
+            results_url = f"{self.base_url}/execution/{execution_id}/results"
+            offset = first.get('next_offset')
+            while offset is not None:
+                page, _ = self._fetch_results_page(results_url, {"limit": page_size, "offset": offset})
+                pages.append(page)
+                offset = page.get('next_offset')
+            span.set(pages=len(pages))
+
+        self.reused_executions[execution_id] = age
+        print(f"✓ 最新の実行結果を使用: query_id={query_id}, execution_id={execution_id}（{age:.0f}秒前に完了）")
+        return merge_result_pages(pages)
+
+    def run_query(self, query_id: int, params: Optional[Dict[str, Any]] = None, timeout: int = 300,
+                  checkpoint_dir: Optional[str] = None, query_name: Optional[str] = None,
+                  max_age: Optional[float] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]], bool]:
+        """
+        クエリを実行して結果を取得（キャッシュがあればクエリを実行せずに返す）
+
+        max_age を指定すると、クエリを実行する前にDuneが保持している最新の実行結果を確認し、
+        max_age 秒以内に完了したものであればそれを返す（fetch_fresh_results）。最新の結果がどのパラメータで
+        実行されたものかはAPIから確認できないため、params を指定した場合は確認せずに実行する。
+
+        全体を dune.query スパンとして計測する。スパンの属性は dune_execution_log の
+        query_id / query_name / execution_id / execution_date / status / row_count / error_message に対応する。
+
+        Args:
+            query_id: Duneクエリ ID
+            params: クエリパラメータ（オプション）
+            timeout: 実行完了を待つタイムアウト秒数
+            checkpoint_dir: 結果ページのチェックポイント保存先（オプション）
+            query_name: クエリ名（計測の属性に使用）
+            max_age: Duneの最新の実行結果を使う場合の許容経過時間（秒、省略時は常に実行する）
+
+        Returns:
+            (実行ID, 実行結果, キャッシュから取得したか)。実行が失敗・タイムアウトした場合、実行結果はNone
+        """
+        execution_date = (params or {}).get("p_date") or datetime.now(timezone.utc).date().isoformat()
+        with self.tracer.span("dune.query", query_id=query_id, query_name=query_name,
+                              execution_date=execution_date) as span:
+            try:
+                execution_id, results, cache_hit = self._run_query(query_id, params, timeout, checkpoint_dir,
+                                                                   max_age)
+            except Exception as e:
+                span.set(status="FAILED", error_message=str(e))
+                raise
+            span.set(execution_id=execution_id, cache_hit=cache_hit,
+                     reused_latest=execution_id in self.reused_executions,
+                     status="COMPLETED" if results is not None else "FAILED",
+                     row_count=len(results.get('result', {}).get('rows', [])) if results is not None else None,
+                     error_message=None if results is not None else "Query execution timeout or failed")
+        return execution_id, results, cache_hit
+
+    def _run_query(self, query_id: int, params: Optional[Dict[str, Any]], timeout: int,
+                   checkpoint_dir: Optional[str],
+                   max_age: Optional[float]) -> Tuple[Optional[str], Optional[Dict[str, Any]], bool]:
+        if self.result_cache is not None:
+            cached = self.result_cache.get(query_id, params)
+            if cached is not None:
+                print(f"[CACHE] Duneで実行せずにキャッシュの結果を使用: query_id={query_id}, "
+                      f"execution_id={cached.get('execution_id')}, "
+                      f"完了時刻={cached.get('execution_ended_at', '不明')}（--cache なしで実行し直せます）")
+                return cached.get('execution_id'), cached, True
+
+        if max_age is not None and not params:
+            results = self.fetch_fresh_results(query_id, max_age)
+            if results is not None:
+                if self.result_cache is not None:
+                    self.result_cache.put(query_id, params, results)
+                return results.get('execution_id'), results, False
+
+        results = None
+        execution_id = self._resume_in_flight(query_id, params, timeout, checkpoint_dir)
+        if execution_id is not None:
+            try:
+                results = self._download_in_flight(query_id, params, execution_id, checkpoint_dir)
+            except requests.exceptions.HTTPError as e:
+                if not is_execution_gone(e):
+                    raise
+                print("✗ 中断した実行の結果は取得できないため、新たに実行します")
+        if results is None:
+            execution_id = self.execute_query(query_id, params)
+            if checkpoint_dir:
+                ResultPageCheckpoint.record_in_flight(checkpoint_dir, query_id, params, execution_id)
+            if not self.wait_for_execution(execution_id, timeout=timeout):
+                return execution_id, None, False
+            results = self._download_in_flight(query_id, params, execution_id, checkpoint_dir)
+
+        if self.result_cache is not None:
+            self.result_cache.put(query_id, params, results)
+        return execution_id, results, False
+
+    def _download_in_flight(self, query_id: int, params: Optional[Dict[str, Any]], execution_id: str,
+                            checkpoint_dir: Optional[str]) -> Dict[str, Any]:
+        """
+        完了した実行の結果を取得
+
+        期限切れなどで実行の結果が無くなっていた場合は、実行中の記録とチェックポイントを削除してから例外を送出する
+        （次回は新たに実行する）。接続エラーなど一時的な失敗では削除せず、次回は保存済みのページの次から再開する。
+        """
+        try:
+            return self.download_execution_results(execution_id, checkpoint_dir=checkpoint_dir)
+        except requests.exceptions.HTTPError as e:
+            if checkpoint_dir and is_execution_gone(e):
+                print(f"  実行結果を取得できません: {e}")
+                ResultPageCheckpoint.discard(checkpoint_dir, query_id, params, execution_id)
+            raise
+
+    def _resume_in_flight(self, query_id: int, params: Optional[Dict[str, Any]], timeout: int,
+                          checkpoint_dir: Optional[str]) -> Optional[str]:
+        """
+        前回中断した実行（checkpoint_dir の in_flight.json に記録したもの）の完了を待つ
+
+        Returns:
+            完了した実行ID。記録が無い場合や、失敗・期限切れなどで再開できない場合はNone
+            （再開できない記録とチェックポイントは削除する）
+        """
+        if not checkpoint_dir:
+            return None
+        execution_id = ResultPageCheckpoint.find_in_flight(checkpoint_dir, query_id, params)
+        if execution_id is None:
+            return None
+        print(f"✓ 中断した実行を再開: query_id={query_id}, execution_id={execution_id}")
+        try:
+            if self.wait_for_execution(execution_id, timeout=timeout):
+                return execution_id
+        except requests.exceptions.HTTPError as e:
+            print(f"  実行ステータスを取得できません: {e}")
+        print("✗ 中断した実行は再開できないため、新たに実行します")
+        ResultPageCheckpoint.discard(checkpoint_dir, query_id, params, execution_id)
+        return None
 
-    def wait_for_execution(self, execution_id: str, timeout: int = 300, poll_interval: int = 5) -> bool:
+    def wait_for_execution(self, execution_id: str, timeout: int = 300, poll_interval: float = 5,
+                           initial_interval: float = 0.5) -> bool:
         """
         クエリ実行が完了するまで待機
 
+        ポーリング間隔は AdaptivePollScheduler で決定し、initial_interval から
+        poll_interval まで伸ばしていく。ステータス確認回数と完了検出までの時間は
+        poll_stats[execution_id] に記録する。
+
         Args:
             execution_id: 実行ID
             timeout: タイムアウト秒数（デフォルト: 300秒）
-            poll_interval: ポーリング間隔（デフォルト: 5秒）
+            poll_interval: ポーリング間隔の上限（デフォルト: 5秒）
+            initial_interval: 最初のポーリング間隔（デフォルト: 0.5秒）
 
         Returns:
             成功した場合True、タイムアウトした場合False
         """
+        stats = {"status_calls": 0, "wait_seconds": 0.0, "detect_latency_seconds": None, "state": None}
+        self.poll_stats[execution_id] = stats
+        with self.tracer.span("dune.wait", execution_id=execution_id) as span:
+            succeeded = self._poll_until_finished(execution_id, stats, timeout, poll_interval, initial_interval)
+            span.set(**stats)
+        return succeeded
+
+    def _poll_until_finished(self, execution_id: str, stats: Dict[str, Any], timeout: int,
+                             poll_interval: float, initial_interval: float) -> bool:
+        """ステータスを確認し続け、完了した場合True、失敗・タイムアウトした場合Falseを返す"""
+        scheduler = AdaptivePollScheduler(initial_interval=initial_interval, max_interval=poll_interval)
         start_time = time.time()
+        deadline = start_time + timeout
 
-        while time.time() - start_time < timeout:
-            status_response = self.check_execution_status(execution_id)
-            state = status_response.get('state', 'UNKNOWN')
+        while True:
+            with self.tracer.span("dune.poll", execution_id=execution_id) as span:
+                status_response = self.check_execution_status(execution_id)
+                state = status_response.get('state', 'UNKNOWN')
+                span.set(state=state, queue_position=status_response.get('queue_position'))
+            stats["status_calls"] += 1
+            stats["wait_seconds"] = time.time() - start_time
+            stats["state"] = state
 
             print(f"  実行ステータス: {state}")
 
-            if state == "QUERY_STATE_COMPLETED":
-                print("✓ クエリ実行完了")
+            if state == COMPLETED_STATE:
+                # サーバー側の完了時刻から検出までの遅れ（ローカル時計とのずれを含む）
+                ended_at = parse_dune_timestamp(status_response.get('execution_ended_at'))
+                if ended_at:
+                    latency = (datetime.now(timezone.utc) - ended_at).total_seconds()
+                    stats["detect_latency_seconds"] = max(latency, 0.0)
+                print(f"✓ クエリ実行完了（ステータス確認 {stats['status_calls']}回, "
+                      f"待機 {stats['wait_seconds']:.1f}秒）")
                 return True
-            elif state in ["QUERY_STATE_FAILED", "QUERY_STATE_CANCELLED"]:
+            elif state in FAILED_STATES:
                 print(f"✗ クエリ実行失敗: {state}")
                 return False
 
-            time.sleep(poll_interval)
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(scheduler.next_interval(status_response), remaining))
 
         print("✗ タイムアウト: クエリ実行が時間内に完了しませんでした")
         return False
 
 
+def is_execution_gone(error: requests.exceptions.HTTPError) -> bool:
+    """HTTPエラーが、実行（の結果）がDune上に無くなったこと（期限切れなど）によるものか"""
+    return error.response is not None and error.response.status_code in GONE_STATUS_CODES
+
+
+def result_age_seconds(response: Dict[str, Any], now: Optional[datetime] = None) -> Optional[float]:
+    """
+    実行結果の完了時刻（execution_ended_at）からの経過秒数
+
+    Args:
+        response: Dune APIの結果・ステータスのレスポンス
+        now: 現在時刻（省略時はUTCの現在時刻）
+
+    Returns:
+        経過秒数。完了していない・完了時刻が無い場合はNone
+    """
+    if response.get('state', COMPLETED_STATE) != COMPLETED_STATE:
+        return None
+    ended_at = parse_dune_timestamp(response.get('execution_ended_at'))
+    if ended_at is None:
+        return None
+    return max((now or datetime.now(timezone.utc)) - ended_at, timedelta(0)).total_seconds()
+
+
+def merge_result_pages(pages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    ページ単位の実行結果を1つのレスポンスにまとめる
+
+    Args:
+        pages: iter_execution_result_pages が返すページ
+
+    Returns:
+        全ページの行を結合したクエリ実行結果
+    """
+    merged: Dict[str, Any] = {}
+    rows: List[Dict[str, Any]] = []
+    for page in pages:
+        if not merged:
+            merged = {key: value for key, value in page.items() if key not in ('next_uri', 'next_offset')}
+            merged['result'] = dict(page.get('result', {}))
+        rows.extend(page.get('result', {}).get('rows', []))
+
+    if merged:
+        merged['result']['rows'] = rows
+        metadata = merged['result'].get('metadata')
+        if metadata is not None:
+            merged['result']['metadata'] = dict(metadata, row_count=len(rows))
+    return merged
+
+
 def generate_sql_insert_statements(data: Dict[str, Any], table_name: str = "dune_results") -> str:
     """
     JSON結果からSQL INSERT文を生成
@@ -146,27 +961,247 @@ def generate_sql_insert_statements(data: Dict[str, Any], table_name: str = "dune
     sql_statements.append(f"-- Total rows: {len(rows)}")
     sql_statements.append("")
 
-    for row in rows:
-        values = []
-        for col in columns:
-            value = row.get(col)
-            if value is None:
-                values.append("NULL")
-            elif isinstance(value, (int, float)):
-                values.append(str(value))
-            else:
-                # 文字列の場合、エスケープ処理
-                escaped_value = str(value).replace("'", "''")
-                values.append(f"'{escaped_value}'")
-
-        values_str = ', '.join(values)
-        sql_statements.append(f"INSERT INTO {table_name} ({columns_str}) VALUES ({values_str});")
+    # 列ごとにまとめてエンコードし、最後に行ごとのINSERT文に組み立てる
+    prefix = f"INSERT INTO {table_name} ({columns_str}) VALUES (".replace("{", "{{").replace("}", "}}")
+    template = prefix + ", ".join(["{}"] * len(columns)) + ");"
+    if columns:
+        encoded = [encode_sql_column([row.get(col) for row in rows]) for col in columns]
+        sql_statements.extend(map(template.format, *encoded))
+    else:
+        sql_statements.extend([template.format()] * len(rows))
 
     return '\n'.join(sql_statements)
 
 
+def _format_error(error: Exception) -> str:
+    """例外を表示用の文字列にする（APIリクエストエラー以外は例外の型名を付ける）"""
+    if isinstance(error, requests.exceptions.RequestException):
+        return str(error)
+    return f"{type(error).__name__}: {error}"
+
+
+def run_queries_concurrently(client: DuneAPIClient, query_configs: List[Dict[str, Any]],
+                             params: Optional[Dict[str, Any]] = None,
+                             max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                             timeout: int = 300,
+                             on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+                             max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    複数のクエリを並行して実行し、完了したものから結果を取得
+
+    各クエリの実行・完了待ち・結果取得をスレッドプール上で行うため、
+    全体の所要時間は各クエリの合計ではなく、最も遅いクエリの所要時間に近くなる。
+
+    Args:
+        client: Duneクライアント
+        query_configs: 実行するクエリ（QUERY_CONFIGS と同じ形式）
+        params: 全クエリに渡すクエリパラメータ（オプション）
+        max_concurrency: 同時に実行するクエリ数の上限
+        timeout: 1クエリあたりのタイムアウト秒数
+        on_complete: クエリが完了するたびに結果を渡して呼び出すコールバック
+        max_age: Duneの最新の実行結果を使う場合の許容経過時間（秒、省略時は常に実行する）
+
+    Returns:
+        完了順に並んだ各クエリの実行結果
+    """
+    def new_outcome(config: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "query_id": config["query_id"],
+            "query_name": config["query_name"],
+            "execution_id": None,
+            "status": "failed",
+            "results": None,
+            "error_message": None,
+            "started_at": datetime.now(),
+            "completed_at": None,
+            "poll_stats": None,
+            "cache_hit": False,
+            "latest_age_seconds": None,
+        }
+
+    def run(config: Dict[str, Any]) -> Dict[str, Any]:
+        outcome = new_outcome(config)
+        execution_id, results, cache_hit = client.run_query(config["query_id"], params, timeout=timeout,
+                                                            query_name=config["query_name"], max_age=max_age)
+        outcome["execution_id"] = execution_id
+        outcome["cache_hit"] = cache_hit
+        outcome["latest_age_seconds"] = client.reused_executions.get(execution_id)
+
+        outcome["poll_stats"] = client.poll_stats.get(execution_id)
+        if results is not None:
+            outcome["results"] = results
+            outcome["status"] = "success"
+        else:
+            outcome["error_message"] = "Query execution timeout or failed"
+        outcome["completed_at"] = datetime.now()
+        return outcome
+
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        futures = {pool.submit(run, config): config for config in query_configs}
+        for future in as_completed(futures):
+            # 1クエリの例外（APIエラー、想定外のレスポンス、チェックポイントの書き込み失敗など）は
+            # そのクエリの失敗として記録し、他のクエリの処理は続ける
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = new_outcome(futures[future])
+                outcome["error_message"] = _format_error(e)
+                outcome["completed_at"] = datetime.now()
+            if on_complete:
+                try:
+                    on_complete(outcome)
+                except Exception as e:
+                    outcome["status"] = "failed"
+                    outcome["error_message"] = _format_error(e)
+                    print(f"✗ {outcome['query_name']}: {outcome['error_message']}")
+            outcomes.append(outcome)
+
+    return outcomes
+
+
+def save_columnar(results: Dict[str, Any], result_file: str) -> str:
+    """
+    結果JSONと同じ場所に列指向キャッシュ（.npz）を保存（numpyが必要）
+
+    Args:
+        results: Dune実行結果
+        result_file: 保存した結果JSONのパス
+
+    Returns:
+        保存した .npz ファイルのパス
+    """
+    try:
+        from columnar_cache import columnar_path, write_columnar
+    except ImportError:
+        raise RuntimeError("列指向キャッシュの保存には numpy が必要です（pip install -r requirements.txt）")
+    path = columnar_path(result_file)
+    write_columnar(results, path)
+    return path
+
+
+def remove_columnar(result_file: str) -> Optional[str]:
+    """
+    結果JSONに対応する列指向キャッシュ（.npz）を削除（--columnar なしで結果JSONを書き直した場合、古い .npz を残さない）
+
+    Returns:
+        削除したファイルのパス（無かった場合はNone）
+    """
+    try:
+        from columnar_cache import columnar_path
+    except ImportError:
+        # numpyが無い環境では .npz を作成も読み込みもしない（古い .npz は is_columnar_fresh で使われない）
+        return None
+    path = columnar_path(result_file)
+    if not os.path.exists(path):
+        return None
+    os.remove(path)
+    return path
+
+
+def run_all_queries(client: DuneAPIClient, output_dir: str, params: Optional[Dict[str, Any]] = None,
+                    max_concurrency: int = DEFAULT_MAX_CONCURRENCY, columnar: bool = False,
+                    max_age: Optional[float] = None) -> bool:
+    """
+    QUERY_CONFIGS の全クエリを並行実行し、結果を output_dir に保存
+
+    Args:
+        client: Duneクライアント
+        output_dir: 結果の保存先ディレクトリ
+        params: 全クエリに渡すクエリパラメータ（オプション）
+        max_concurrency: 同時に実行するクエリ数の上限
+        columnar: 結果JSONに加えて列指向キャッシュ（.npz）も保存するか
+        max_age: Duneの最新の実行結果を使う場合の許容経過時間（秒、省略時は常に実行する）
+
+    Returns:
+        全クエリが成功した場合True
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    result_files = {config["query_id"]: config["result_file"] for config in QUERY_CONFIGS}
+
+    def save(outcome: Dict[str, Any]):
+        if outcome["status"] != "success":
+            print(f"✗ {outcome['query_name']}: {outcome['error_message']}")
+            return
+        result_file = os.path.join(output_dir, result_files[outcome["query_id"]])
+        with open(result_file, 'w', encoding='utf-8') as f:
+            json.dump(outcome["results"], f, indent=2, ensure_ascii=False)
+        elapsed = (outcome["completed_at"] - outcome["started_at"]).total_seconds()
+        row_count = len(outcome["results"].get('result', {}).get('rows', []))
+        status_calls = outcome["poll_stats"]["status_calls"] if outcome["poll_stats"] else 0
+        if outcome["cache_hit"]:
+            detail = "キャッシュ"
+        elif outcome["latest_age_seconds"] is not None:
+            detail = f"最新の実行結果, {outcome['latest_age_seconds']:.0f}秒前に完了"
+        else:
+            detail = f"ステータス確認 {status_calls}回"
+        print(f"✓ {outcome['query_name']}: {row_count}行を {result_file} に保存しました"
+              f"（{elapsed:.1f}秒, {detail}）")
+        if columnar:
+            print(f"  ✓ 列指向キャッシュを {save_columnar(outcome['results'], result_file)} に保存しました")
+        elif remove_columnar(result_file):
+            print("  ✓ 古い列指向キャッシュを削除しました（--columnar で再作成できます）")
+
+    started = time.time()
+    outcomes = run_queries_concurrently(client, QUERY_CONFIGS, params, max_concurrency, on_complete=save,
+                                        max_age=max_age)
+    success_count = sum(1 for outcome in outcomes if outcome["status"] == "success")
+
+    print("\n" + "=" * 60)
+    print(f"実行クエリ数: {len(outcomes)}  成功: {success_count}  失敗: {len(outcomes) - success_count}")
+    print(f"所要時間: {time.time() - started:.1f}秒")
+    print(format_connection_stats(client))
+    if client.result_cache is not None:
+        print(format_cache_stats(client.result_cache))
+    print("=" * 60)
+    return success_count == len(outcomes)
+
+
+def format_connection_stats(client: DuneAPIClient) -> str:
+    """HTTP接続の利用状況を表示用の文字列にする"""
+    stats = client.connection_stats()
+    return (f"HTTPリクエスト: {stats['requests']}回 "
+            f"(新規接続: {stats['connections_opened']}, 接続再利用: {stats['connections_reused']})")
+
+
+def format_cache_stats(cache: ResultCache) -> str:
+    """結果キャッシュの利用状況を表示用の文字列にする"""
+    stats = cache.stats
+    return (f"結果キャッシュ: ヒット {stats['hits']}回, ミス {stats['misses']}回 "
+            f"(期限切れ: {stats['expired']}, 削除: {stats['evictions']}, "
+            f"合計 {cache.total_bytes / (1024 * 1024):.1f}MiB)")
+
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Dune Analytics Query Executor")
+    parser.add_argument("--all", action="store_true",
+                        help="QUERY_CONFIGS の全クエリを並行実行し、結果を保存する")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"同時に実行するクエリ数の上限（デフォルト: {DEFAULT_MAX_CONCURRENCY}）")
+    parser.add_argument("--p-date", help="クエリパラメータ p_date（YYYY-MM-DD）")
+    parser.add_argument("--output-dir", default="Results", help="--all 指定時の保存先ディレクトリ")
+    parser.add_argument("--cache", action="store_true",
+                        help="結果キャッシュを使う（同じクエリID・パラメータ・実行日の結果が有効期限内にあれば、"
+                             "Duneでクエリを実行せずに返す）")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="結果キャッシュの保存先ディレクトリ")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+                        help=f"結果キャッシュの有効期限（秒、デフォルト: {DEFAULT_CACHE_TTL}）")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_BYTES / (1024 * 1024),
+                        help="結果キャッシュの合計サイズの上限（MiB）。超えた分は最終参照の古い順に削除")
+    parser.add_argument("--max-age", type=float,
+                        help="Duneの最新の実行結果がこの秒数以内に完了したものであれば、クエリを実行せずに使う"
+                             "（--p-date 指定時は使わない）")
+    parser.add_argument("--trace", help="処理時間の計測結果をJSON Lines形式で追記するファイル")
+    parser.add_argument("--columnar", action="store_true",
+                        help="結果JSONに加えて列指向キャッシュ（.npz）も保存する（numpyが必要）")
+    return parser.parse_args()
+
+
 def main():
     """メイン処理"""
+    args = parse_args()
+
     print("=" * 60)
     print("Dune Analytics Query Executor")
     print("=" * 60)
@@ -181,38 +1216,62 @@ def main():
         print("  .envファイルを作成し、DUNE_API_KEY=your_api_key_hereを追加してください")
         sys.exit(1)
 
+    params = {"p_date": args.p_date} if args.p_date else None
+    result_cache = None
+    if args.cache:
+        result_cache = ResultCache(args.cache_dir, ttl=args.cache_ttl,
+                                   max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+    if args.all:
+        print(f"Query IDs: {', '.join(str(config['query_id']) for config in QUERY_CONFIGS)}")
+        print(f"最大同時実行数: {args.max_concurrency}")
+        print("=" * 60)
+        try:
+            client = DuneAPIClient(api_key, result_cache=result_cache, tracer=create_tracer(args.trace))
+            if not run_all_queries(client, args.output_dir, params, args.max_concurrency, args.columnar,
+                                   args.max_age):
+                sys.exit(1)
+        except requests.exceptions.RequestException as e:
+            print(f"\n✗ APIリクエストエラー: {e}")
+            sys.exit(1)
+        except Exception as e:
+            print(f"\n✗ エラー: {_format_error(e)}")
+            sys.exit(1)
+        return
+
     # Query IDの取得（Requirement.txtから）
     QUERY_ID = 5963629  # Requirement.txtに記載のQuery ID
+    # ページ単位で取得した結果の保存先（中断時はここから再開）
+    CHECKPOINT_DIR = "checkpoints"
 
     print(f"Query ID: {QUERY_ID}")
     print("=" * 60)
 
     try:
         # Duneクライアントの初期化
-        client = DuneAPIClient(api_key)
+        client = DuneAPIClient(api_key, result_cache=result_cache, tracer=create_tracer(args.trace))
 
-        # クエリを実行
+        # クエリを実行し、完了まで待機して結果を取得（キャッシュがあればそれを使用）
         print("\n1. クエリを実行中...")
-        execution_id = client.execute_query(QUERY_ID)
+        execution_id, results, _ = client.run_query(QUERY_ID, params, checkpoint_dir=CHECKPOINT_DIR,
+                                                    max_age=args.max_age)
 
-        # 実行完了まで待機
-        print("\n2. 実行完了を待機中...")
-        success = client.wait_for_execution(execution_id)
-
-        if not success:
+        if results is None:
             print("✗ クエリ実行に失敗しました")
             sys.exit(1)
 
-        # 結果を取得
-        print("\n3. 結果を取得中...")
-        results = client.get_execution_results(execution_id)
-
         # Result.jsonに保存
-        print("\n4. 結果をResult.jsonに保存中...")
+        print("\n2. 結果をResult.jsonに保存中...")
         result_file = "Result.json"
         with open(result_file, 'w', encoding='utf-8') as f:
             json.dump(results, f, indent=2, ensure_ascii=False)
         print(f"✓ 結果を {result_file} に保存しました")
+        if args.columnar:
+            print(f"✓ 列指向キャッシュを {save_columnar(results, result_file)} に保存しました")
+        elif remove_columnar(result_file):
+            print("✓ 古い列指向キャッシュを削除しました（--columnar で再作成できます）")
+        # 結果を保存し終えたので、チェックポイント（結果の2つ目のコピー）と実行中の記録を削除
+        ResultPageCheckpoint.discard(CHECKPOINT_DIR, QUERY_ID, params, execution_id)
 
         # 結果のサマリを表示
         if 'result' in results and 'rows' in results['result']:
@@ -230,7 +1289,7 @@ def main():
                     print(f"  {i}. {json.dumps(row, ensure_ascii=False)[:100]}...")
 
         # SQL INSERT文を生成
-        print("\n5. SQL INSERT文を生成中...")
+        print("\n3. SQL INSERT文を生成中...")
         sql_statements = generate_sql_insert_statements(results, table_name="price_data")
 
         sql_file = "insert_statements.sql"
@@ -250,6 +1309,7 @@ def main():
         with open(metadata_file, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
         print(f"✓ メタデータを {metadata_file} に保存しました")
+        print(format_connection_stats(client))
 
         print("\n" + "=" * 60)
         print("✓ 処理が正常に完了しました")
@@ -0,0 +1,255 @@
+"""
+Morpho Earn 履歴の分析
+Result_Earn.json（または列指向キャッシュ Result_Earn.npz）を Vault ごとに並べた NumPy 配列に読み込み、
+conversion_rate の比から日次・7日・30日のAPY、純流入額、TVLの移動平均をまとめて計算する
+
+全ての指標は (Vault, 日付) でソートした配列に対する searchsorted と配列演算で求めるため、
+行ごとのループを使わない。期間は暦日で数え、欠けている日があっても正しく扱う。
+
+使い方:
+    python earn_analytics.py Results/Result_Earn.json
+"""
+
+import sys
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from columnar_cache import columnar_path, is_columnar_fresh, load_columnar
+from result_stream import ResultRowReader
+from row_model import TableRowSet
+
+
+DAYS_PER_YEAR = 365
+
+# 集計する期間（日）
+DEFAULT_WINDOWS = (1, 7, 30)
+
+# (Vault, 日付) を1つの整数キーにまとめる際の日付部分のビット数
+_DAY_BITS = 32
+
+# 1970-01-01 の date.toordinal()（day_ordinal を datetime64[D] に変換する際の基準）
+_EPOCH_ORDINAL = 719163
+
+
+class EarnHistory:
+    """
+    Vault・日付順に並べた Earn 履歴
+
+    各配列は同じ長さで、vault_codes（vaults のインデックス）、days（datetime64[D]）の順にソートされている。
+    """
+
+    def __init__(self, vaults: np.ndarray, vault_codes: np.ndarray, days: np.ndarray,
+                 conversion_rate: np.ndarray, total_shares: np.ndarray,
+                 tvl_usd: np.ndarray, delta_assets: np.ndarray):
+        """
+        Args:
+            vaults: Vaultアドレスの一覧
+            vault_codes: 行ごとのVault（vaults のインデックス）
+            days: 行ごとの日付
+            conversion_rate: シェアあたりの資産量
+            total_shares: 発行済みシェア
+            tvl_usd: TVL（USD、欠損は NaN）
+            delta_assets: その日の純流入（資産量）
+        """
+        day_ordinals = days.astype("datetime64[D]").astype(np.int64)
+        order = np.lexsort((day_ordinals, vault_codes))
+
+        self.vaults = np.asarray(vaults)
+        self.vault_codes = np.asarray(vault_codes, dtype=np.int64)[order]
+        self.days = days.astype("datetime64[D]")[order]
+        self.day_ordinals = day_ordinals[order]
+        self.conversion_rate = np.asarray(conversion_rate, dtype=np.float64)[order]
+        self.total_shares = np.asarray(total_shares, dtype=np.float64)[order]
+        self.tvl_usd = np.asarray(tvl_usd, dtype=np.float64)[order]
+        self.delta_assets = np.asarray(delta_assets, dtype=np.float64)[order]
+        # 同じVaultの中で日付順に並ぶ検索用キー
+        self.keys = (self.vault_codes << _DAY_BITS) + self.day_ordinals
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "EarnHistory":
+        """Result_Earn.json と同じ形式の行から作成"""
+        vault_index: Dict[str, int] = {}
+        codes: List[int] = []
+        days: List[str] = []
+        conversion_rate: List[float] = []
+        total_shares: List[float] = []
+        tvl_usd: List[float] = []
+        delta_assets: List[float] = []
+        for row in rows:
+            codes.append(vault_index.setdefault(row["vault_address"], len(vault_index)))
+            days.append(row["day"][:10])
+            conversion_rate.append(row["conversion_rate"])
+            total_shares.append(row["total_shares"])
+            tvl = row.get("tvl_usd")
+            tvl_usd.append(np.nan if tvl is None else tvl)
+            delta_assets.append(row["delta_assets"])
+        return cls(np.array(list(vault_index), dtype=str), np.array(codes, dtype=np.int64),
+                   np.array(days, dtype="datetime64[D]"), np.array(conversion_rate), np.array(total_shares),
+                   np.array(tvl_usd), np.array(delta_assets))
+
+    @classmethod
+    def from_row_set(cls, rows: TableRowSet) -> "EarnHistory":
+        """
+        row_model.TableRowSet（morpho_earn_history の行オブジェクト）から作成
+
+        日付は解析済みの day_ordinal を使い、Vaultアドレスは intern 済みの文字列をそのままキーにする。
+        """
+        vault_index: Dict[str, int] = {}
+        codes = [vault_index.setdefault(vault, len(vault_index)) for vault in rows.column("vault_address")]
+        days = (np.array(rows.day_ordinals(), dtype=np.int64) - _EPOCH_ORDINAL).astype("datetime64[D]")
+        tvl_usd = np.array(rows.column("tvl_usd"), dtype=np.float64)   # None は NaN になる
+        return cls(np.array(list(vault_index), dtype=str), np.array(codes, dtype=np.int64), days,
+                   np.array(rows.column("conversion_rate"), dtype=np.float64),
+                   np.array(rows.column("total_shares"), dtype=np.float64), tvl_usd,
+                   np.array(rows.column("delta_assets"), dtype=np.float64))
+
+    @classmethod
+    def from_json(cls, json_file: str) -> "EarnHistory":
+        """Result_Earn.json から作成（ストリーミングで読み込む）"""
+        return cls.from_rows(ResultRowReader(json_file))
+
+    @classmethod
+    def from_columnar(cls, npz_file: str) -> "EarnHistory":
+        """列指向キャッシュ（Result_Earn.npz）から作成"""
+        result = load_columnar(npz_file)
+        return cls(result.categories("vault_address"), result.codes("vault_address"), result.column("day"),
+                   result.column("conversion_rate"), result.column("total_shares"),
+                   result.column("tvl_usd"), result.column("delta_assets"))
+
+    @classmethod
+    def load(cls, path: str) -> "EarnHistory":
+        """
+        拡張子に応じて .json または .npz から作成
+
+        .json の場合、隣の .npz が同じ実行の内容と確認できれば（is_columnar_fresh）そちらを読み込む。
+        """
+        if path.endswith(".npz"):
+            return cls.from_columnar(path)
+        if is_columnar_fresh(path):
+            return cls.from_columnar(columnar_path(path))
+        return cls.from_json(path)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _previous_index(self, window_days: int) -> np.ndarray:
+        """各行について、同じVaultで window_days 日以上前の最新の行のインデックス（無い場合は -1）"""
+        target = self.keys - window_days
+        previous = np.searchsorted(self.keys, target, side="right") - 1
+        valid = previous >= 0
+        valid[valid] &= self.vault_codes[previous[valid]] == self.vault_codes[valid]
+        return np.where(valid, previous, -1)
+
+    def _window_start(self, window_days: int) -> np.ndarray:
+        """各行について、同じVaultで直近 window_days 日間（当日を含む）の最初の行のインデックス"""
+        return np.searchsorted(self.keys, self.keys - (window_days - 1), side="left")
+
+    def apy(self, window_days: int = 1) -> np.ndarray:
+        """
+        conversion_rate の比から年率換算したAPY
+
+        window_days 日以上前の最新の値との比を、実際の経過日数で年率に換算する。
+        比較できる過去の値が無い行は NaN。
+
+        Args:
+            window_days: 比較する期間（日）
+
+        Returns:
+            行ごとのAPY（0.05 = 5%）
+        """
+        previous = self._previous_index(window_days)
+        valid = previous >= 0
+        result = np.full(len(self), np.nan)
+        prev = previous[valid]
+        elapsed = (self.day_ordinals[valid] - self.day_ordinals[prev]).astype(np.float64)
+        ratio = self.conversion_rate[valid] / self.conversion_rate[prev]
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result[valid] = np.power(ratio, DAYS_PER_YEAR / elapsed) - 1
+        return result
+
+    def _rolling_sum(self, values: np.ndarray, window_days: int):
+        """
+        直近 window_days 日間の合計と、NaN を除いた件数
+
+        主キーは (Vault, 日付) のため期間内の行は最大 window_days 行で、ずらした配列を足し合わせて求める
+        （全体の累積和の差分を取る方法は、行数が多いと桁落ちで誤差が大きくなるため使わない）。
+        """
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        start = self._window_start(window_days)
+        index = np.arange(len(self))
+        total = np.zeros(len(self))
+        count = np.zeros(len(self), dtype=np.int64)
+        for lag in range(min(window_days, len(self))):
+            source = index - lag
+            in_window = source >= start
+            total[in_window] += filled[source[in_window]]
+            count[in_window] += present[source[in_window]]
+        return total, count
+
+    def net_flow(self, window_days: int = 1) -> np.ndarray:
+        """直近 window_days 日間の純流入（delta_assets の合計、資産量）"""
+        total, _ = self._rolling_sum(self.delta_assets, window_days)
+        return total
+
+    def rolling_tvl(self, window_days: int = 7) -> np.ndarray:
+        """直近 window_days 日間のTVLの平均（USD、値が無い場合は NaN）"""
+        total, count = self._rolling_sum(self.tvl_usd, window_days)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+    def tvl_change(self) -> np.ndarray:
+        """同じVaultの前回の値からのTVLの変化（USD、前回が無い場合は NaN）"""
+        previous = self._previous_index(1)
+        valid = previous >= 0
+        result = np.full(len(self), np.nan)
+        result[valid] = self.tvl_usd[valid] - self.tvl_usd[previous[valid]]
+        return result
+
+    def metrics(self, windows: Iterable[int] = DEFAULT_WINDOWS) -> Dict[str, np.ndarray]:
+        """
+        全ての指標をまとめて計算
+
+        Args:
+            windows: 集計する期間（日）
+
+        Returns:
+            指標名（apy_7d, net_flow_30d など）→ 行ごとの値
+        """
+        result = {"tvl_change": self.tvl_change()}
+        for window in windows:
+            result[f"apy_{window}d"] = self.apy(window)
+            result[f"net_flow_{window}d"] = self.net_flow(window)
+            result[f"rolling_tvl_{window}d"] = self.rolling_tvl(window)
+        return result
+
+    def latest(self, windows: Iterable[int] = DEFAULT_WINDOWS) -> List[Dict[str, Any]]:
+        """Vaultごとに最新日の指標を返す"""
+        metrics = self.metrics(windows)
+        # ソート済みのため、Vaultが変わる直前の行が各Vaultの最新日
+        last = np.flatnonzero(np.append(self.vault_codes[1:] != self.vault_codes[:-1], True))
+        summary = []
+        for i in last:
+            row = {
+                "vault_address": str(self.vaults[self.vault_codes[i]]),
+                "day": str(self.days[i]),
+                "tvl_usd": float(self.tvl_usd[i]),
+            }
+            row.update({name: float(values[i]) for name, values in metrics.items()})
+            summary.append(row)
+        return summary
+
+
+def _format_percent(value: float) -> str:
+    return "-" if np.isnan(value) else f"{value * 100:.2f}%"
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "Results/Result_Earn.json"
+    history = EarnHistory.load(path)
+    print(f"{len(history)}行, {len(history.vaults)} Vaults")
+    for row in history.latest():
+        print(f"  {row['vault_address']} {row['day']}  TVL ${row['tvl_usd']:,.0f}  "
+              f"APY 1d {_format_percent(row['apy_1d'])} / 7d {_format_percent(row['apy_7d'])} / "
+              f"30d {_format_percent(row['apy_30d'])}  純流入 7d {row['net_flow_7d']:,.2f}")
@@ -0,0 +1,259 @@
+"""
+Morpho Earn 集計パイプライン（Dune_Query/Query_Earn_5963349.txt）のローカル再計算
+Duneから書き出した入金・出金イベントとVault・価格の一覧から、Result_Earn.json と同じ
+日次の delta_assets / delta_shares / conversion_rate / total_shares / tvl_usd を計算する
+
+過去分の再計算（バックフィル）のたびに Dune でクエリ全体を実行せずに済むよう、
+イベントを (Vault, 日付) でソートし、日ごとの合計と Vault ごとの累積和を NumPy でまとめて求める。
+
+入力ファイル（Dune_Query/Export_Earn_Events.txt のクエリ結果、Dune結果JSON形式）:
+    vaults.json:    vault_address, vault_asset, vault_symbol, vault_asset_symbol, vault_asset_decimals
+    deposits.json:  evt_block_time, contract_address, assets, shares（evt_deposit）
+    withdraws.json: evt_block_time, contract_address, assets, shares（evt_withdraw）
+    prices.json:    day, contract_address, price（prices.usd_daily の worldchain 分）
+
+使い方:
+    python earn_replay.py fixtures/earn --p-date 2025-10-09 --output Results/Result_Earn_replay.json
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from result_stream import ResultRowReader
+
+
+# 出力する列（Result_Earn.json の metadata.column_names と同じ順序）
+OUTPUT_COLUMNS = ["day", "vault_address", "vault_symbol", "vault_asset", "vault_asset_symbol",
+                  "delta_assets", "delta_shares", "conversion_rate", "total_shares", "tvl_usd"]
+
+# シェアの小数点以下の桁数（MetaMorpho のシェアは18桁）
+SHARE_DECIMALS = 18
+
+# (Vault/資産, 日付) を1つの整数キーにまとめる際の日付部分のビット数
+_DAY_BITS = 32
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def _day_ordinals(values: Iterable[str]) -> np.ndarray:
+    """"2025-10-15 01:23:45.000 UTC" や "2025-10-15" の日付部分を1970-01-01からの日数にする"""
+    return (np.array([value[:10] for value in values], dtype="datetime64[D]") - _EPOCH).astype(np.int64)
+
+
+def _format_day(ordinal: int) -> str:
+    return str(_EPOCH + np.timedelta64(int(ordinal), "D")) + " 00:00:00.000 UTC"
+
+
+def _raw_to_float(value: Any) -> float:
+    """uint256 の生の値（文字列または数値）を double にする（Duneの cast(x as double) と同じ丸め）"""
+    if value.__class__ is str:
+        return float(int(value))
+    return float(value)
+
+
+class EarnReplay:
+    """
+    入金・出金イベントから Earn の日次履歴を再計算
+
+    Query_Earn_5963349.txt の各CTEに対応する処理:
+        deposit_withdraw1:   生の値を double にして、資産の桁数・シェアの18桁で割る（出金は負）
+        delta_holdings_daily: (日付, Vault) ごとに合計し、conversion_rate = 資産の合計 / シェアの合計
+        holdings_daily0:     Vault ごとに日付順の累積和で total_shares を求める
+        holdings_daily:      前日の価格 × total_shares × conversion_rate を tvl_usd とする
+    """
+
+    def __init__(self, vaults: Iterable[Dict[str, Any]], prices: Iterable[Dict[str, Any]]):
+        """
+        Args:
+            vaults: Vaultの一覧（Query_Earn の creations CTE と同じ列）
+            prices: 日次の価格（day, contract_address, price）
+        """
+        self.vaults: List[Dict[str, Any]] = list(vaults)
+        self.vault_index = {vault["vault_address"]: i for i, vault in enumerate(self.vaults)}
+        self.asset_decimals = np.array([vault["vault_asset_decimals"] for vault in self.vaults], dtype=np.float64)
+
+        assets = sorted({vault["vault_asset"] for vault in self.vaults})
+        self.asset_index = {asset: i for i, asset in enumerate(assets)}
+        self.vault_asset_codes = np.array([self.asset_index[vault["vault_asset"]] for vault in self.vaults],
+                                          dtype=np.int64)
+
+        # Vaultの資産に関係する価格だけを (資産, 日付) 順に並べる
+        prices = [price for price in prices if price["contract_address"] in self.asset_index]
+        codes = np.array([self.asset_index[price["contract_address"]] for price in prices], dtype=np.int64)
+        keys = (codes << _DAY_BITS) + _day_ordinals(price["day"] for price in prices)
+        values = np.array([price["price"] for price in prices], dtype=np.float64)
+        order = np.argsort(keys, kind="stable")
+        self.price_keys = keys[order]
+        self.price_values = values[order]
+
+    def _event_arrays(self, events: Iterable[Dict[str, Any]], sign: float):
+        """イベント行を (Vault, 日付, 資産量, シェア) の配列にする（Vault一覧に無いイベントは除く）"""
+        vault_codes: List[int] = []
+        times: List[str] = []
+        assets: List[float] = []
+        shares: List[float] = []
+        vault_index = self.vault_index
+        for event in events:
+            code = vault_index.get(event["contract_address"])
+            if code is None:
+                continue
+            vault_codes.append(code)
+            times.append(event["evt_block_time"])
+            assets.append(_raw_to_float(event["assets"]))
+            shares.append(_raw_to_float(event["shares"]))
+
+        codes = np.array(vault_codes, dtype=np.int64)
+        return (codes, _day_ordinals(times),
+                sign * np.array(assets, dtype=np.float64) / np.power(10.0, self.asset_decimals[codes]),
+                sign * np.array(shares, dtype=np.float64) / np.power(10.0, SHARE_DECIMALS))
+
+    def _lookup_prices(self, asset_codes: np.ndarray, day_ordinals: np.ndarray) -> np.ndarray:
+        """(資産, 日付) の価格（無い場合は NaN）"""
+        keys = (asset_codes << _DAY_BITS) + day_ordinals
+        index = np.searchsorted(self.price_keys, keys)
+        index = np.minimum(index, max(len(self.price_keys) - 1, 0))
+        result = np.full(len(keys), np.nan)
+        if len(self.price_keys):
+            found = self.price_keys[index] == keys
+            result[found] = self.price_values[index[found]]
+        return result
+
+    def daily_arrays(self, deposits: Iterable[Dict[str, Any]],
+                     withdraws: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """
+        (Vault, 日付) ごとの日次履歴を配列で計算
+
+        Args:
+            deposits: 入金イベント
+            withdraws: 出金イベント
+
+        Returns:
+            vault_codes, day_ordinals, delta_assets, delta_shares, conversion_rate, total_shares, tvl_usd
+            （(Vault, 日付) 順）
+        """
+        parts = [self._event_arrays(deposits, 1.0), self._event_arrays(withdraws, -1.0)]
+        vault_codes, day_ordinals, assets, shares = (np.concatenate(arrays) for arrays in zip(*parts))
+
+        # (Vault, 日付) ごとに合計
+        keys = (vault_codes << _DAY_BITS) + day_ordinals
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(keys) else np.array([], int)
+        daily_keys = keys[starts]
+        daily_vaults = daily_keys >> _DAY_BITS
+        daily_days = daily_keys & ((1 << _DAY_BITS) - 1)
+        delta_assets = np.add.reduceat(assets[order], starts) if len(starts) else np.array([])
+        delta_shares = np.add.reduceat(shares[order], starts) if len(starts) else np.array([])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            conversion_rate = delta_assets / delta_shares
+
+        # Vault ごとに日付順の累積和（Vault をまたいで累積しないよう、Vault ごとに区切って計算）
+        total_shares = np.empty(len(delta_shares))
+        bounds = np.flatnonzero(np.concatenate(([True], daily_vaults[1:] != daily_vaults[:-1], [True])))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            np.cumsum(delta_shares[start:end], out=total_shares[start:end])
+
+        # 前日の価格 × total_shares × conversion_rate
+        price = self._lookup_prices(self.vault_asset_codes[daily_vaults], daily_days - 1)
+        tvl_usd = price * total_shares * conversion_rate
+
+        return {
+            "vault_codes": daily_vaults,
+            "day_ordinals": daily_days,
+            "delta_assets": delta_assets,
+            "delta_shares": delta_shares,
+            "conversion_rate": conversion_rate,
+            "total_shares": total_shares,
+            "tvl_usd": tvl_usd,
+        }
+
+    def replay(self, deposits: Iterable[Dict[str, Any]], withdraws: Iterable[Dict[str, Any]],
+               p_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Result_Earn.json と同じ形式の行を計算
+
+        Args:
+            deposits: 入金イベント
+            withdraws: 出金イベント
+            p_date: この日付（YYYY-MM-DD）以降の行だけを返す（クエリパラメータ p_date と同じ）
+
+        Returns:
+            日付の降順、vault_symbol の昇順に並べた行
+        """
+        daily = self.daily_arrays(deposits, withdraws)
+        selected = np.arange(len(daily["day_ordinals"]))
+        if p_date:
+            selected = selected[daily["day_ordinals"] >= _day_ordinals([p_date])[0]]
+
+        symbols = np.array([vault["vault_symbol"] for vault in self.vaults], dtype=str)
+        order = np.lexsort((symbols[daily["vault_codes"][selected]], -daily["day_ordinals"][selected]))
+        selected = selected[order]
+
+        rows = []
+        vaults = self.vaults
+        columns = {name: daily[name][selected].tolist()
+                   for name in ("delta_assets", "delta_shares", "conversion_rate", "total_shares", "tvl_usd")}
+        for i, (code, ordinal) in enumerate(zip(daily["vault_codes"][selected].tolist(),
+                                                daily["day_ordinals"][selected].tolist())):
+            vault = vaults[code]
+            tvl_usd = columns["tvl_usd"][i]
+            rows.append({
+                "day": _format_day(ordinal),
+                "vault_address": vault["vault_address"],
+                "vault_symbol": vault["vault_symbol"],
+                "vault_asset": vault["vault_asset"],
+                "vault_asset_symbol": vault["vault_asset_symbol"],
+                "delta_assets": columns["delta_assets"][i],
+                "delta_shares": columns["delta_shares"][i],
+                "conversion_rate": columns["conversion_rate"][i],
+                "total_shares": columns["total_shares"][i],
+                # 価格が無い日は NULL（Dune の left join と同じ）
+                "tvl_usd": None if tvl_usd != tvl_usd else tvl_usd,
+            })
+        return rows
+
+
+def replay_fixture(fixture_dir: str, p_date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    vaults.json / deposits.json / withdraws.json / prices.json を格納したディレクトリから再計算
+
+    Args:
+        fixture_dir: 入力ファイルの格納ディレクトリ
+        p_date: この日付（YYYY-MM-DD）以降の行だけを返す
+
+    Returns:
+        Result_Earn.json と同じ形式の行
+    """
+    def rows(name: str) -> ResultRowReader:
+        return ResultRowReader(os.path.join(fixture_dir, name))
+
+    engine = EarnReplay(rows("vaults.json"), rows("prices.json"))
+    return engine.replay(rows("deposits.json"), rows("withdraws.json"), p_date)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Morpho Earn 履歴のローカル再計算")
+    parser.add_argument("fixture_dir", help="vaults.json / deposits.json / withdraws.json / prices.json の格納ディレクトリ")
+    parser.add_argument("--p-date", help="この日付（YYYY-MM-DD）以降の行だけを出力")
+    parser.add_argument("--output", default="Results/Result_Earn_replay.json", help="出力ファイル")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.fixture_dir):
+        print(f"✗ エラー: {args.fixture_dir} が見つかりません")
+        sys.exit(1)
+
+    rows = replay_fixture(args.fixture_dir, args.p_date)
+    results = {"result": {"rows": rows, "metadata": {"column_names": OUTPUT_COLUMNS, "row_count": len(rows)}}}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"[OK] Generated: {args.output} ({len(rows)} rows)")
+
+
+if __name__ == "__main__":
+    main()
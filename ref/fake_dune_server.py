@@ -0,0 +1,425 @@
+"""
+ローカルで動作する Dune API の代替サーバー（ベンチマーク・動作確認用）
+クエリ実行・ステータス確認・結果のページ取得（実行ごと・クエリの最新の実行、JSON / CSV）を Dune API と同じ形式で返す
+
+使い方:
+    python fake_dune_server.py --port 8765 --results-dir Results
+    python fake_dune_server.py --latest-age 600   # 10分前に完了した実行があるものとして起動
+    # 別のプロセスから DuneAPIClient(api_key, base_url="http://127.0.0.1:8765/api/v1") で接続する
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from result_stream import ResultRowReader
+
+
+API_PREFIX = "/api/v1"
+
+# limit を指定しない結果取得で返す最大行数
+DEFAULT_RESULT_LIMIT = 10000
+
+
+class FakeServerError(Exception):
+    """リクエストをエラー（HTTPステータス code）で返す"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _isoformat(timestamp: float) -> str:
+    """UNIX時刻を Dune API と同じ形式（2025-10-15T06:53:04.696916Z）にする"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class FakeExecution:
+    """1回分のクエリ実行（経過時間から状態を決める）"""
+
+    def __init__(self, execution_id: str, query_id: int, submitted_at: float,
+                 queue_seconds: float, execution_seconds: float,
+                 parameters: Optional[Dict[str, Any]] = None, fails: bool = False):
+        self.execution_id = execution_id
+        self.query_id = query_id
+        self.submitted_at = submitted_at
+        self.started_at = submitted_at + queue_seconds
+        self.ended_at = self.started_at + execution_seconds
+        self.parameters = parameters or {}
+        self.fails = fails
+        # 期限切れになった（結果が削除された）実行
+        self.expired = False
+
+    def status(self, now: float) -> Dict[str, Any]:
+        """現在の状態を Dune API のステータスレスポンスの形式で返す"""
+        status: Dict[str, Any] = {
+            "execution_id": self.execution_id,
+            "query_id": self.query_id,
+            "submitted_at": _isoformat(self.submitted_at),
+        }
+        if now < self.started_at:
+            status.update(state="QUERY_STATE_PENDING", is_execution_finished=False,
+                          queue_position=max(1, int(self.started_at - now) + 1))
+        elif now < self.ended_at:
+            status.update(state="QUERY_STATE_EXECUTING", is_execution_finished=False,
+                          execution_started_at=_isoformat(self.started_at))
+        elif self.expired:
+            status.update(state="QUERY_STATE_EXPIRED", is_execution_finished=True,
+                          execution_started_at=_isoformat(self.started_at),
+                          execution_ended_at=_isoformat(self.ended_at))
+        elif self.fails:
+            status.update(state="QUERY_STATE_FAILED", is_execution_finished=True,
+                          execution_started_at=_isoformat(self.started_at),
+                          execution_ended_at=_isoformat(self.ended_at))
+        else:
+            status.update(state="QUERY_STATE_COMPLETED", is_execution_finished=True,
+                          execution_started_at=_isoformat(self.started_at),
+                          execution_ended_at=_isoformat(self.ended_at))
+        return status
+
+
+class FakeDuneServer:
+    """
+    Dune API の代替サーバー
+
+    クエリIDごとに返す行を登録しておくと、execute → status → results の流れを
+    Dune API と同じレスポンス形式（next_offset / next_uri によるページ分割を含む）で再現する。
+    実行はキューで queue_seconds 秒、実行中に execution_seconds 秒かかったものとして扱う。
+    query/{id}/results はそのクエリの完了済みの実行のうち最後に完了したものを返す
+    （add_completed_execution で過去に完了した実行を登録できる）。
+    date_column_by_query を指定したクエリは、p_date パラメータ以降（date_filter_by_query が "day" の場合は
+    p_date の1日だけ）の行を返す。failure_rate の割合の実行は QUERY_STATE_FAILED で終わる。
+    interrupt_results で結果取得の途中の失敗（接続断・期限切れ）を再現できる。
+    """
+
+    def __init__(self, rows_by_query: Dict[int, List[Dict[str, Any]]],
+                 columns_by_query: Optional[Dict[int, List[str]]] = None,
+                 queue_seconds: float = 0.0, execution_seconds: float = 1.0,
+                 host: str = "127.0.0.1", port: int = 0, clock: Callable[[], float] = time.time,
+                 date_column_by_query: Optional[Dict[int, str]] = None,
+                 date_filter_by_query: Optional[Dict[int, str]] = None,
+                 failure_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            rows_by_query: クエリIDごとの結果の行
+            columns_by_query: クエリIDごとの列名（省略時は最初の行のキー）
+            queue_seconds: 実行開始までの待ち時間（秒）
+            execution_seconds: 実行時間（秒）
+            host: 待ち受けるアドレス
+            port: 待ち受けるポート（0 の場合は空いているポート）
+            clock: 現在時刻（UNIX時刻）を返す関数
+            date_column_by_query: クエリIDごとの p_date で絞り込む日付カラム
+            date_filter_by_query: クエリIDごとの p_date の使い方（"since" または "day"、省略時は "since"）
+            failure_rate: 失敗させる実行の割合（0〜1）
+            seed: 失敗させる実行を決める乱数のシード
+        """
+        self.rows_by_query = rows_by_query
+        self.columns_by_query = columns_by_query or {}
+        self.queue_seconds = queue_seconds
+        self.execution_seconds = execution_seconds
+        self.clock = clock
+        self.date_column_by_query = date_column_by_query or {}
+        self.date_filter_by_query = date_filter_by_query or {}
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self.executions: Dict[str, FakeExecution] = {}
+        self.request_counts: Dict[str, int] = {"execute": 0, "status": 0, "results": 0, "latest": 0, "csv": 0}
+        # 種類ごとに返したレスポンス本文のバイト数
+        self.bytes_sent: Dict[str, int] = dict.fromkeys(self.request_counts, 0)
+        # 実行IDごとの [失敗させるまでに返すページ数, 期限切れにするか]（interrupt_results が登録）
+        self._interrupts: Dict[str, List[Any]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self) -> "FakeDuneServer":
+        """別スレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """現在のスレッドで待ち受ける（Ctrl+C で終了）"""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        """待ち受けを終了"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeDuneServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def execute(self, query_id: int, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with self._lock:
+            self.request_counts["execute"] += 1
+            execution_id = f"FAKE{next(self._ids):08d}"
+            fails = self.failure_rate > 0 and self._rng.random() < self.failure_rate
+            self.executions[execution_id] = FakeExecution(
+                execution_id, query_id, self.clock(), self.queue_seconds, self.execution_seconds,
+                parameters, fails)
+        return {"execution_id": execution_id, "state": "QUERY_STATE_PENDING"}
+
+    def add_completed_execution(self, query_id: int, age_seconds: float) -> str:
+        """
+        age_seconds 秒前に完了した実行を登録（Dune が保持している過去の実行結果の代わり）
+
+        Returns:
+            登録した実行ID
+        """
+        with self._lock:
+            execution_id = f"FAKE{next(self._ids):08d}"
+            ended_at = self.clock() - age_seconds
+            self.executions[execution_id] = FakeExecution(
+                execution_id, query_id, ended_at - self.queue_seconds - self.execution_seconds,
+                self.queue_seconds, self.execution_seconds)
+        return execution_id
+
+    def interrupt_results(self, execution_id: str, after_pages: int, expire: bool = False):
+        """
+        実行の結果を after_pages ページ返した後、次の結果取得を失敗させる（1回だけ）
+
+        Args:
+            execution_id: 実行ID
+            after_pages: 失敗させるまでに返すページ数
+            expire: True の場合は実行を期限切れにする（以降の結果取得は 410、ステータスは QUERY_STATE_EXPIRED）。
+                False の場合はその1回だけ 500 を返す
+        """
+        with self._lock:
+            self._interrupts[execution_id] = [after_pages, expire]
+
+    def status(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.request_counts["status"] += 1
+        execution = self.executions.get(execution_id)
+        return execution.status(self.clock()) if execution else None
+
+    def results(self, execution_id: str, limit: Optional[int], offset: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.request_counts["results"] += 1
+            execution = self.executions.get(execution_id)
+            if execution is None:
+                return None
+            interrupt = self._interrupts.get(execution_id)
+            if interrupt is not None:
+                if interrupt[0] > 0:
+                    interrupt[0] -= 1
+                else:
+                    del self._interrupts[execution_id]
+                    if not interrupt[1]:
+                        raise FakeServerError(500, "connection reset")
+                    execution.expired = True
+        if execution.expired:
+            raise FakeServerError(410, "execution expired")
+        return self._result_page(execution, limit, offset, f"{self.base_url}/execution/{execution_id}/results")
+
+    def latest_results(self, query_id: int, limit: Optional[int], offset: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.request_counts["latest"] += 1
+            now = self.clock()
+            completed = [execution for execution in self.executions.values()
+                         if execution.query_id == query_id and execution.ended_at <= now
+                         and not execution.expired]
+        if not completed:
+            return None
+        execution = max(completed, key=lambda execution: execution.ended_at)
+        return self._result_page(execution, limit, offset, f"{self.base_url}/query/{query_id}/results")
+
+    def csv_results(self, execution_id: str, limit: Optional[int],
+                    offset: int) -> Optional[Tuple[str, Dict[str, str]]]:
+        """
+        実行結果の1ページをCSV形式で返す（Dune API の results/csv と同じく、次ページは x-dune-next-offset ヘッダーで示す）
+
+        Returns:
+            (CSV本文, レスポンスヘッダー)。実行が無い・完了していない場合はNone
+        """
+        with self._lock:
+            self.request_counts["csv"] += 1
+        execution = self.executions.get(execution_id)
+        if execution is None or execution.status(self.clock())["state"] != "QUERY_STATE_COMPLETED":
+            return None
+
+        rows = self._execution_rows(execution)
+        limit = limit or DEFAULT_RESULT_LIMIT
+        columns = self.columns_by_query.get(execution.query_id) or (list(rows[0]) if rows else [])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows([row.get(column) for column in columns] for row in rows[offset:offset + limit])
+        headers = {}
+        if offset + limit < len(rows):
+            headers["x-dune-next-offset"] = str(offset + limit)
+            headers["x-dune-next-uri"] = (f"{self.base_url}/execution/{execution_id}/results/csv"
+                                          f"?limit={limit}&offset={offset + limit}")
+        return buffer.getvalue(), headers
+
+    def _execution_rows(self, execution: FakeExecution) -> List[Dict[str, Any]]:
+        """実行のパラメータ（p_date）で絞り込んだ結果の行"""
+        rows = self.rows_by_query.get(execution.query_id, [])
+        column = self.date_column_by_query.get(execution.query_id)
+        p_date = execution.parameters.get("p_date")
+        if column is None or not p_date:
+            return rows
+        if self.date_filter_by_query.get(execution.query_id) == "day":
+            return [row for row in rows if row[column][:10] == p_date]
+        return [row for row in rows if row[column][:10] >= p_date]
+
+    def _result_page(self, execution: FakeExecution, limit: Optional[int], offset: int,
+                     url: str) -> Dict[str, Any]:
+        """実行結果の1ページ（未完了の場合はステータスのみ）"""
+        response = execution.status(self.clock())
+        if response["state"] != "QUERY_STATE_COMPLETED":
+            return response
+
+        rows = self._execution_rows(execution)
+        limit = limit or DEFAULT_RESULT_LIMIT
+        page = rows[offset:offset + limit]
+        columns = self.columns_by_query.get(execution.query_id) or (list(rows[0]) if rows else [])
+        response["result"] = {
+            "rows": page,
+            "metadata": {"column_names": columns, "row_count": len(page), "total_row_count": len(rows)},
+        }
+        if offset + limit < len(rows):
+            response["next_offset"] = offset + limit
+            response["next_uri"] = f"{url}?limit={limit}&offset={offset + limit}"
+        return response
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, body: Dict[str, Any], kind: Optional[str] = None):
+                self._send_bytes(code, json.dumps(body, ensure_ascii=False).encode("utf-8"),
+                                 "application/json", {}, kind)
+
+            def _send_bytes(self, code: int, data: bytes, content_type: str, headers: Dict[str, str],
+                            kind: Optional[str]):
+                if kind:
+                    with server._lock:
+                        server.bytes_sent[kind] += len(data)
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                parts = urlparse(self.path).path[len(API_PREFIX):].strip("/").split("/")
+                if len(parts) == 3 and parts[0] == "query" and parts[2] == "execute":
+                    return self._send(200, server.execute(int(parts[1]), body.get("query_parameters")), "execute")
+                self._send(404, {"error": "not found"})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = url.path[len(API_PREFIX):].strip("/").split("/")
+                query = parse_qs(url.query)
+                limit = int(query["limit"][0]) if "limit" in query else None
+                offset = int(query.get("offset", ["0"])[0])
+                if len(parts) == 4 and parts[0] == "execution" and parts[2:] == ["results", "csv"]:
+                    page = server.csv_results(parts[1], limit, offset)
+                    if page is None:
+                        return self._send(404, {"error": "not found"})
+                    body, headers = page
+                    return self._send_bytes(200, body.encode("utf-8"), "text/csv", headers, "csv")
+
+                response = kind = None
+                try:
+                    if len(parts) == 3 and parts[0] == "execution" and parts[2] == "status":
+                        response, kind = server.status(parts[1]), "status"
+                    elif len(parts) == 3 and parts[0] == "execution" and parts[2] == "results":
+                        response, kind = server.results(parts[1], limit, offset), "results"
+                    elif len(parts) == 3 and parts[0] == "query" and parts[2] == "results":
+                        response, kind = server.latest_results(int(parts[1]), limit, offset), "latest"
+                except FakeServerError as e:
+                    return self._send(e.code, {"error": str(e)})
+                if response is None:
+                    return self._send(404, {"error": "not found"})
+                self._send(200, response, kind)
+
+        return Handler
+
+
+def load_result_rows(json_file: str) -> Dict[str, Any]:
+    """結果JSONファイルから行と列名を読み込む"""
+    reader = ResultRowReader(json_file)
+    rows = list(reader)
+    columns = (reader.metadata or {}).get("column_names") or (list(rows[0]) if rows else [])
+    return {"rows": rows, "columns": columns}
+
+
+def main():
+    """メイン処理"""
+    from dune_query_executor import QUERY_CONFIGS
+    from table_specs import TABLE_SPECS
+
+    parser = argparse.ArgumentParser(description="Dune API の代替サーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--results-dir", default="Results", help="QUERY_CONFIGS の result_file を読み込むディレクトリ")
+    parser.add_argument("--queue-seconds", type=float, default=0.0)
+    parser.add_argument("--execution-seconds", type=float, default=1.0)
+    parser.add_argument("--latest-age", type=float,
+                        help="各クエリにこの秒数前に完了した実行があるものとして起動する（query/{id}/results で返す）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="失敗させる実行の割合（0〜1）")
+    parser.add_argument("--seed", type=int, default=0, help="失敗させる実行を決める乱数のシード")
+    args = parser.parse_args()
+
+    rows_by_query = {}
+    columns_by_query = {}
+    date_column_by_query = {}
+    date_filter_by_query = {}
+    for config in QUERY_CONFIGS:
+        json_file = os.path.join(args.results_dir, config["result_file"])
+        if os.path.exists(json_file):
+            loaded = load_result_rows(json_file)
+            rows_by_query[config["query_id"]] = loaded["rows"]
+            columns_by_query[config["query_id"]] = loaded["columns"]
+            date_column_by_query[config["query_id"]] = TABLE_SPECS[config["table_name"]].date_column
+            date_filter_by_query[config["query_id"]] = config.get("date_filter", "since")
+
+    server = FakeDuneServer(rows_by_query, columns_by_query, args.queue_seconds, args.execution_seconds,
+                            port=args.port, date_column_by_query=date_column_by_query,
+                            date_filter_by_query=date_filter_by_query, failure_rate=args.failure_rate,
+                            seed=args.seed)
+    if args.latest_age is not None:
+        for query_id in rows_by_query:
+            server.add_completed_execution(query_id, args.latest_age)
+    print(f"[OK] Listening: {server.base_url} ({len(rows_by_query)} queries)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
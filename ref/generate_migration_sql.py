@@ -1,234 +1,337 @@
 """
 初期データ移行用のSQL生成スクリプト
 Results フォルダ内のJSONファイルからPostgreSQL用のSQL INSERT文を生成
+
+--incremental を指定すると、キーごとの出力済みの最新の日付（ウォーターマーク）と直近の行の内容ハッシュを
+migration_sql/watermarks.json で管理し、新規・変更行だけを migration_sql/incremental/ 以下に出力する
+
+--format copy を指定すると、INSERT文の代わりに COPY でステージングテーブルへ読み込み、
+1回の INSERT ... SELECT ... ON CONFLICT でマージするSQLを生成する
+
+--skip-unchanged を指定すると、既存の行と値が同じ行は ON CONFLICT で更新せず（WHERE ... IS DISTINCT FROM）、
+バッチごとに更新した行数とスキップした行数を表示するSQLを生成する
+
+--shards N を指定すると、テーブルごとのファイルを主キーのハッシュ（--shard-by key）または
+日付の範囲（--shard-by date）で N 個に分け、並行インポート用の load_shards.sh を生成する
+
+--quality-gate を指定すると、生成・ロードの前に結果ファイルのデータ品質チェック（data_quality.py）を行い、
+レポートを保存する。チェックに失敗した場合はSQLを生成・ロードせずに終了する
 """
 
-import json
+import argparse
+import io
 import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any
+from itertools import islice
+from typing import List, Dict, Any, Callable, Iterable, Optional, TextIO
+
+from instrumentation import NOOP_TRACER, Tracer, create_tracer
+from partitioning import (MIN_POSTGRES_VERSION, PARTITION_INTERVALS, date_index_sql, default_partition_sql,
+                          earliest_dates, initial_partitions_sql, partition_clause, partition_functions_sql,
+                          schema_requirements_sql)
+from result_stream import RowSource, open_result_rows
+from sql_shards import (LOADER_SCRIPT, SHARD_DIR, SHARD_STRATEGIES, ShardRouter, date_boundaries, shard_filename,
+                        write_loader_files)
+from table_specs import TABLE_SPECS, TableSpec, escape_sql_value
+from watermark import DEFAULT_LOOKBACK_DAYS, WatermarkManifest
+
+
+# 1つのINSERT文にまとめる行数
+BATCH_SIZE = 1000
+
+# 出力形式
+OUTPUT_FORMATS = ("insert", "copy")
+
+# 01_create_schema.sql に含まれないテーブルの作成SQL（TableSpec.schema_file）の格納ディレクトリ
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migration_sql")
+
+# 出力する行を絞り込む関数（行のイテレータを受け取り、出力する行を返す）
+RowFilter = Callable[[Iterable[Dict[str, Any]]], Iterable[Dict[str, Any]]]
+
+
+def _write_table_file(results_dir: str, output_format: str, table: str, json_file: str, path: str,
+                      tracer: Optional[Tracer] = None, router: Optional[ShardRouter] = None,
+                      shard: int = 0, skip_unchanged: bool = False) -> int:
+    """
+    1テーブル分（router を指定した場合はそのうち1シャード分）のSQLファイルを書き出す
+
+    generate_all の並列実行時にワーカープロセスから呼び出すため、モジュールレベルに置く。
+
+    Returns:
+        出力した行数
+    """
+    generator = SQLGenerator(results_dir, tracer=tracer, skip_unchanged=skip_unchanged)
+    row_filter = router.filter(shard) if router else None
+    with open(path, 'w', encoding='utf-8') as f:
+        if output_format == "copy":
+            # シャードを並行して読み込めるよう、ステージングテーブルをシャードごとに分ける
+            staging = f"staging_{table}_{shard:02d}" if router else None
+            return generator.write_table_copy(f, table, json_file, row_filter=row_filter, staging=staging)
+        return generator.write_table_sql(f, table, json_file, row_filter=row_filter)
+
+
+def _create_unique_dir(parent: str, name: str) -> str:
+    """parent/name を新規に作成（既に存在する場合は name_2, name_3, ... を作成）して、そのパスを返す"""
+    os.makedirs(parent, exist_ok=True)
+    suffix = 1
+    while True:
+        path = os.path.join(parent, name if suffix == 1 else f"{name}_{suffix}")
+        try:
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            suffix += 1
 
 
 class SQLGenerator:
     """SQL文生成クラス"""
 
-    def __init__(self, results_dir: str = "Results"):
+    def __init__(self, results_dir: str = "Results", tracer: Optional[Tracer] = None,
+                 skip_unchanged: bool = False):
+        """
+        Args:
+            results_dir: Result_*.json の格納ディレクトリ
+            tracer: 処理時間の計測先（テーブルごとに sql.table、バッチごとに sql.batch を記録）
+            skip_unchanged: 既存の行と更新カラムの値が同じ行を更新しないSQLを生成する
+                            （不要な行の書き換え・updated_at トリガー・WALを避ける）
+        """
         self.results_dir = results_dir
+        self.tracer = tracer or NOOP_TRACER
+        self.skip_unchanged = skip_unchanged
 
     def escape_sql_string(self, value: Any) -> str:
         """SQL文字列のエスケープ処理"""
+        return escape_sql_value(value)
+
+    def escape_copy_value(self, value: Any) -> str:
+        """COPY（text形式）用の値のエスケープ処理"""
         if value is None:
-            return "NULL"
+            return "\\N"
         elif isinstance(value, (int, float)):
             return str(value)
         else:
-            # 文字列のエスケープ（シングルクォートを二重に）
-            escaped = str(value).replace("'", "''")
-            return f"'{escaped}'"
-
-    def generate_collateral_sql(self, json_file: str) -> str:
-        """Collateral HistoryのSQL生成"""
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        sql_lines = [
-            "-- Morpho Collateral History データ移行",
+            # バックスラッシュ・タブ・改行をエスケープ
+            return str(value).replace("\\", "\\\\").replace("\t", "\\t") \
+                .replace("\n", "\\n").replace("\r", "\\r")
+
+    def write_table_copy(self, out: TextIO, table: str, json_file: RowSource,
+                         row_filter: Optional[RowFilter] = None, staging: Optional[str] = None) -> int:
+        """
+        1テーブル分のデータを COPY 形式で out に逐次書き出す
+
+        UNLOGGEDのステージングテーブルに COPY ... FROM stdin で読み込み、
+        1回の INSERT ... SELECT ... ON CONFLICT で本テーブルにマージする。
+        バッチごとのINSERT文のような構文解析・実行計画のコストがかからない。
+
+        Args:
+            out: 出力先
+            table: テーブル名（TABLE_SPECS のキー）
+            json_file: Dune実行結果のJSONファイル（または CSVRowReader などの行のリーダー）
+            row_filter: 出力する行の絞り込み（オプション）
+            staging: ステージングテーブル名（省略時は staging_<テーブル名>）
+
+        Returns:
+            出力した行数
+        """
+        spec = TABLE_SPECS[table]
+        staging = staging or f"staging_{table}"
+        column_list = ", ".join(spec.column_names)
+        reader = open_result_rows(json_file)
+        out.write("\n".join([
+            f"-- {spec.title} データ移行（COPY形式）",
             f"-- Generated at: {datetime.now().isoformat()}",
-            f"-- Source: {json_file}",
+            f"-- Source: {reader.source}",
+            "",
+            f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS);",
+            f"TRUNCATE {staging};",
+            "",
+            f"COPY {staging} ({column_list}) FROM stdin;",
+            "",
+        ]))
+
+        rows = row_filter(reader) if row_filter else reader
+        escape = self.escape_copy_value
+        row_count = 0
+        with self.tracer.span("sql.table", table=table, format="copy") as span:
+            for values in spec.iter_row_values(rows):
+                out.write("\t".join([escape(value) for value in values]))
+                out.write("\n")
+                row_count += 1
+            span.set(rows=row_count)
+
+        out.write("\n".join([
+            "\\.",
+            "",
+            f"-- Total rows: {row_count}",
+            *self._upsert_lines(spec, [f"INSERT INTO {table} ({column_list})",
+                                       f"SELECT {column_list} FROM {staging}"], row_count),
+            "",
+            f"DROP TABLE {staging};",
+            "",
+        ]))
+        return row_count
+
+    def write_table_sql(self, out: TextIO, table: str, json_file: RowSource,
+                        row_filter: Optional[RowFilter] = None) -> int:
+        """
+        1テーブル分のINSERT文を out に逐次書き出す
+
+        行は ResultRowReader（または渡されたリーダー）で1行ずつ読み込み、BATCH_SIZE 件ごとにINSERT文として書き出すため、
+        入力ファイルの大きさに関わらずメモリ使用量は1バッチ分に収まる。
+        総行数はヘッダーに出力する必要があるため、本体は一時ファイルに書いてから連結する。
+
+        Args:
+            out: 出力先
+            table: テーブル名（TABLE_SPECS のキー）
+            json_file: Dune実行結果のJSONファイル（または CSVRowReader などの行のリーダー）
+            row_filter: 出力する行の絞り込み（オプション）
+
+        Returns:
+            出力した行数
+        """
+        spec = TABLE_SPECS[table]
+        reader = open_result_rows(json_file)
+        header = [
+            f"-- {spec.title} データ移行",
+            f"-- Generated at: {datetime.now().isoformat()}",
+            f"-- Source: {reader.source}",
             ""
         ]
+        out.write("\n".join(header))
+
+        rows = iter(row_filter(reader) if row_filter else reader)
+        row_count = 0
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as body, \
+                self.tracer.span("sql.table", table=table, format="insert") as table_span:
+            batch_number = 0
+            while True:
+                batch_rows = list(islice(rows, BATCH_SIZE))
+                if not batch_rows:
+                    break
+                batch_number += 1
+                row_count += len(batch_rows)
+                with self.tracer.span("sql.batch", table=table, batch_number=batch_number, rows=len(batch_rows)):
+                    self._write_batch(body, spec, batch_number, spec.encode_values(batch_rows), len(batch_rows))
+            table_span.set(rows=row_count, batches=batch_number)
+
+            if reader.has_rows:
+                out.write("\n" + "\n".join([f"-- Total rows: {row_count}", ""]))
+                body.seek(0)
+                shutil.copyfileobj(body, out)
+        return row_count
+
+    def _write_batch(self, out: TextIO, spec: TableSpec, batch_number: int, values: str, row_count: int):
+        """1バッチ分のINSERT ... ON CONFLICT文を書き出す"""
+        sql_lines = [f"-- Batch {batch_number}"]
+        sql_lines.extend(self._upsert_lines(spec, spec.insert_lines + ["VALUES", values], row_count))
+        sql_lines.append("")
+        out.write("\n" + "\n".join(sql_lines))
+
+    def _upsert_lines(self, spec: TableSpec, insert_lines: List[str], row_count: int) -> List[str]:
+        """
+        INSERT ... ON CONFLICT 文の行
+
+        skip_unchanged の場合は値が変わらない行を更新しない WHERE 句を付け、
+        書き込んだ行数（written_rows）とスキップした行数（skipped_rows）を返す SELECT で囲む。
+
+        Args:
+            spec: テーブル定義
+            insert_lines: INSERT INTO から VALUES / SELECT までの行
+            row_count: 文に含まれる行数
+        """
+        if not self.skip_unchanged:
+            return insert_lines + spec.conflict_lines
+        return ["WITH upserted AS ("] + insert_lines + spec.changed_conflict_lines + [
+            "RETURNING 1",
+            ")",
+            f"SELECT '{spec.table}' AS table_name, {row_count} AS source_rows, count(*) AS written_rows, "
+            f"{row_count} - count(*) AS skipped_rows FROM upserted;",
+        ]
+
+    def generate_table_sql(self, table: str, json_file: str) -> str:
+        """1テーブル分のINSERT文を文字列として生成"""
+        buffer = io.StringIO()
+        self.write_table_sql(buffer, table, json_file)
+        return buffer.getvalue()
 
-        if 'result' in data and 'rows' in data['result']:
-            rows = data['result']['rows']
-            sql_lines.append(f"-- Total rows: {len(rows)}")
-            sql_lines.append("")
-
-            # バッチごとにINSERT文を生成
-            batch_size = 1000
-            for i in range(0, len(rows), batch_size):
-                batch = rows[i:i+batch_size]
-
-                sql_lines.append(f"-- Batch {i//batch_size + 1}")
-                sql_lines.append("INSERT INTO morpho_collateral_history")
-                sql_lines.append("    (day, collateral_token, collateral_symbol, collateral_amount, collateral_amount_usd)")
-                sql_lines.append("VALUES")
-
-                values_list = []
-                for row in batch:
-                    values = f"    ({self.escape_sql_string(row['day'])}, " \
-                            f"{self.escape_sql_string(row['collateral_token'])}, " \
-                            f"{self.escape_sql_string(row['collateral_symbol'])}, " \
-                            f"{self.escape_sql_string(row['collateral_amount'])}, " \
-                            f"{self.escape_sql_string(row.get('collateral_amount_usd'))})"
-                    values_list.append(values)
-
-                sql_lines.append(",\n".join(values_list))
-                sql_lines.append("ON CONFLICT (day, collateral_token)")
-                sql_lines.append("DO UPDATE SET")
-                sql_lines.append("    collateral_amount = EXCLUDED.collateral_amount,")
-                sql_lines.append("    collateral_amount_usd = EXCLUDED.collateral_amount_usd,")
-                sql_lines.append("    updated_at = CURRENT_TIMESTAMP;")
-                sql_lines.append("")
-
-        return "\n".join(sql_lines)
+    def generate_collateral_sql(self, json_file: str) -> str:
+        """Collateral HistoryのSQL生成"""
+        return self.generate_table_sql("morpho_collateral_history", json_file)
 
     def generate_borrow_sql(self, json_file: str) -> str:
         """Borrow HistoryのSQL生成"""
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        sql_lines = [
-            "-- Morpho Borrow History データ移行",
-            f"-- Generated at: {datetime.now().isoformat()}",
-            f"-- Source: {json_file}",
-            ""
-        ]
-
-        if 'result' in data and 'rows' in data['result']:
-            rows = data['result']['rows']
-            sql_lines.append(f"-- Total rows: {len(rows)}")
-            sql_lines.append("")
-
-            batch_size = 1000
-            for i in range(0, len(rows), batch_size):
-                batch = rows[i:i+batch_size]
-
-                sql_lines.append(f"-- Batch {i//batch_size + 1}")
-                sql_lines.append("INSERT INTO morpho_borrow_history")
-                sql_lines.append("    (day, loan_token, loan_symbol, borrow_amount, borrow_amount_usd)")
-                sql_lines.append("VALUES")
-
-                values_list = []
-                for row in batch:
-                    values = f"    ({self.escape_sql_string(row['day'])}, " \
-                            f"{self.escape_sql_string(row['loan_token'])}, " \
-                            f"{self.escape_sql_string(row['loan_symbol'])}, " \
-                            f"{self.escape_sql_string(row['borrow_amount'])}, " \
-                            f"{self.escape_sql_string(row.get('borrow_amount_usd'))})"
-                    values_list.append(values)
-
-                sql_lines.append(",\n".join(values_list))
-                sql_lines.append("ON CONFLICT (day, loan_token)")
-                sql_lines.append("DO UPDATE SET")
-                sql_lines.append("    borrow_amount = EXCLUDED.borrow_amount,")
-                sql_lines.append("    borrow_amount_usd = EXCLUDED.borrow_amount_usd,")
-                sql_lines.append("    updated_at = CURRENT_TIMESTAMP;")
-                sql_lines.append("")
-
-        return "\n".join(sql_lines)
+        return self.generate_table_sql("morpho_borrow_history", json_file)
 
     def generate_dex_sql(self, json_file: str) -> str:
         """DEX Volume HistoryのSQL生成"""
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        sql_lines = [
-            "-- DEX Volume History データ移行",
-            f"-- Generated at: {datetime.now().isoformat()}",
-            f"-- Source: {json_file}",
-            ""
-        ]
-
-        if 'result' in data and 'rows' in data['result']:
-            rows = data['result']['rows']
-            sql_lines.append(f"-- Total rows: {len(rows)}")
-            sql_lines.append("")
-
-            batch_size = 1000
-            for i in range(0, len(rows), batch_size):
-                batch = rows[i:i+batch_size]
-
-                sql_lines.append(f"-- Batch {i//batch_size + 1}")
-                sql_lines.append("INSERT INTO dex_volume_history")
-                sql_lines.append("    (date, blockchain, chain_volume_wld, chain_volume_usd, chain_num_swaps,")
-                sql_lines.append("     total_volume_wld, total_volume_usd, total_num_swaps)")
-                sql_lines.append("VALUES")
-
-                values_list = []
-                for row in batch:
-                    values = f"    ({self.escape_sql_string(row['date'])}, " \
-                            f"{self.escape_sql_string(row['blockchain'])}, " \
-                            f"{self.escape_sql_string(row['chain_volume_wld'])}, " \
-                            f"{self.escape_sql_string(row['chain_volume_usd'])}, " \
-                            f"{self.escape_sql_string(row['chain_num_swaps'])}, " \
-                            f"{self.escape_sql_string(row['total_volume_wld'])}, " \
-                            f"{self.escape_sql_string(row['total_volume_usd'])}, " \
-                            f"{self.escape_sql_string(row['total_num_swaps'])})"
-                    values_list.append(values)
-
-                sql_lines.append(",\n".join(values_list))
-                sql_lines.append("ON CONFLICT (date, blockchain)")
-                sql_lines.append("DO UPDATE SET")
-                sql_lines.append("    chain_volume_wld = EXCLUDED.chain_volume_wld,")
-                sql_lines.append("    chain_volume_usd = EXCLUDED.chain_volume_usd,")
-                sql_lines.append("    chain_num_swaps = EXCLUDED.chain_num_swaps,")
-                sql_lines.append("    total_volume_wld = EXCLUDED.total_volume_wld,")
-                sql_lines.append("    total_volume_usd = EXCLUDED.total_volume_usd,")
-                sql_lines.append("    total_num_swaps = EXCLUDED.total_num_swaps,")
-                sql_lines.append("    updated_at = CURRENT_TIMESTAMP;")
-                sql_lines.append("")
-
-        return "\n".join(sql_lines)
+        return self.generate_table_sql("dex_volume_history", json_file)
 
     def generate_earn_sql(self, json_file: str) -> str:
         """Earn HistoryのSQL生成"""
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        return self.generate_table_sql("morpho_earn_history", json_file)
+
+    def schema_statements(self, partition_by: Optional[str] = None) -> List[str]:
+        """
+        TABLE_SPECS の全テーブルを作成するSQL（load --create-schema で実行する）
+
+        generate_schema_sql の後に、各テーブルの schema_file（06_create_wld_price_history.sql など）を続ける。
+        schema_file は generate_schema_sql が作成する関数（update_updated_at_column）を使うため、この順序で実行する。
+
+        Args:
+            partition_by: generate_schema_sql に渡すパーティション単位
+
+        Returns:
+            実行順のSQL
+        """
+        statements = [self.generate_schema_sql(partition_by)]
+        for spec in TABLE_SPECS.values():
+            if spec.schema_file:
+                with open(os.path.join(SCHEMA_DIR, spec.schema_file), 'r', encoding='utf-8') as f:
+                    statements.append(f.read())
+        return statements
+
+    def generate_schema_sql(self, partition_by: Optional[str] = None,
+                            partition_start: Optional[Dict[str, str]] = None) -> str:
+        """
+        テーブル作成SQLを生成
+
+        Args:
+            partition_by: "month" / "year" を指定すると、履歴テーブルを日付で範囲パーティション化し、
+                          日付のインデックスを BRIN にする（partitioning.py を参照、PostgreSQL 13 以上）
+            partition_start: テーブルごとの最初のパーティションの日付（YYYY-MM-DD。省略時は今日から）
+
+        Returns:
+            テーブル作成SQL
+        """
+        if partition_by and partition_by not in PARTITION_INTERVALS:
+            raise ValueError(f"未対応のパーティション単位です: {partition_by}")
+        history_tables = {
+            "collateral": "morpho_collateral_history",
+            "borrow": "morpho_borrow_history",
+            "dex": "dex_volume_history",
+            "earn": "morpho_earn_history",
+        }
+        table_sql = {}
+        for name, table in history_tables.items():
+            table_sql[f"{name}_partition"] = partition_clause(table, partition_by)
+            # パーティション化しない場合は空行も出力しない（従来のスキーマと同じ内容にする）
+            default_partition = default_partition_sql(table, partition_by)
+            table_sql[f"{name}_default_partition"] = default_partition + "\n" if default_partition else ""
+            table_sql[f"{name}_date_index"] = date_index_sql(table, partition_by)
+        requirements = schema_requirements_sql(partition_by)
+        table_sql["requirements"] = requirements + "\n" if requirements else ""
+        partition_sql = ""
+        if partition_by:
+            partition_sql = "\n" + partition_functions_sql(partition_by) + "\n" + \
+                initial_partitions_sql(partition_start or {})
 
-        sql_lines = [
-            "-- Morpho Earn History データ移行",
-            f"-- Generated at: {datetime.now().isoformat()}",
-            f"-- Source: {json_file}",
-            ""
-        ]
-
-        if 'result' in data and 'rows' in data['result']:
-            rows = data['result']['rows']
-            sql_lines.append(f"-- Total rows: {len(rows)}")
-            sql_lines.append("")
-
-            batch_size = 1000
-            for i in range(0, len(rows), batch_size):
-                batch = rows[i:i+batch_size]
-
-                sql_lines.append(f"-- Batch {i//batch_size + 1}")
-                sql_lines.append("INSERT INTO morpho_earn_history")
-                sql_lines.append("    (day, vault_address, vault_symbol, vault_asset, vault_asset_symbol,")
-                sql_lines.append("     conversion_rate, delta_assets, delta_shares, total_shares, tvl_usd)")
-                sql_lines.append("VALUES")
-
-                values_list = []
-                for row in batch:
-                    values = f"    ({self.escape_sql_string(row['day'])}, " \
-                            f"{self.escape_sql_string(row['vault_address'])}, " \
-                            f"{self.escape_sql_string(row['vault_symbol'])}, " \
-                            f"{self.escape_sql_string(row['vault_asset'])}, " \
-                            f"{self.escape_sql_string(row['vault_asset_symbol'])}, " \
-                            f"{self.escape_sql_string(row['conversion_rate'])}, " \
-                            f"{self.escape_sql_string(row['delta_assets'])}, " \
-                            f"{self.escape_sql_string(row['delta_shares'])}, " \
-                            f"{self.escape_sql_string(row['total_shares'])}, " \
-                            f"{self.escape_sql_string(row.get('tvl_usd'))})"
-                    values_list.append(values)
-
-                sql_lines.append(",\n".join(values_list))
-                sql_lines.append("ON CONFLICT (day, vault_address)")
-                sql_lines.append("DO UPDATE SET")
-                sql_lines.append("    conversion_rate = EXCLUDED.conversion_rate,")
-                sql_lines.append("    delta_assets = EXCLUDED.delta_assets,")
-                sql_lines.append("    delta_shares = EXCLUDED.delta_shares,")
-                sql_lines.append("    total_shares = EXCLUDED.total_shares,")
-                sql_lines.append("    tvl_usd = EXCLUDED.tvl_usd,")
-                sql_lines.append("    updated_at = CURRENT_TIMESTAMP;")
-                sql_lines.append("")
-
-        return "\n".join(sql_lines)
-
-    def generate_schema_sql(self) -> str:
-        """テーブル作成SQLを生成"""
         schema_sql = """-- PostgreSQL Schema Creation Script
 -- Generated at: {timestamp}
-
+{requirements}
 -- Drop existing tables (optional - comment out if not needed)
 -- DROP TABLE IF EXISTS morpho_collateral_history CASCADE;
 -- DROP TABLE IF EXISTS morpho_borrow_history CASCADE;
@@ -246,9 +349,9 @@ CREATE TABLE IF NOT EXISTS morpho_collateral_history (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (day, collateral_token)
-);
-
-CREATE INDEX IF NOT EXISTS idx_morpho_collateral_day ON morpho_collateral_history(day DESC);
+){collateral_partition};
+{collateral_default_partition}
+{collateral_date_index}
 CREATE INDEX IF NOT EXISTS idx_morpho_collateral_token ON morpho_collateral_history(collateral_token);
 
 -- Create morpho_borrow_history table
@@ -261,9 +364,9 @@ CREATE TABLE IF NOT EXISTS morpho_borrow_history (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (day, loan_token)
-);
-
-CREATE INDEX IF NOT EXISTS idx_morpho_borrow_day ON morpho_borrow_history(day DESC);
+){borrow_partition};
+{borrow_default_partition}
+{borrow_date_index}
 CREATE INDEX IF NOT EXISTS idx_morpho_borrow_token ON morpho_borrow_history(loan_token);
 
 -- Create dex_volume_history table
@@ -279,9 +382,9 @@ CREATE TABLE IF NOT EXISTS dex_volume_history (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (date, blockchain)
-);
-
-CREATE INDEX IF NOT EXISTS idx_dex_volume_date ON dex_volume_history(date DESC);
+){dex_partition};
+{dex_default_partition}
+{dex_date_index}
 CREATE INDEX IF NOT EXISTS idx_dex_volume_blockchain ON dex_volume_history(blockchain);
 
 -- Create morpho_earn_history table
@@ -299,9 +402,9 @@ CREATE TABLE IF NOT EXISTS morpho_earn_history (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (day, vault_address)
-);
-
-CREATE INDEX IF NOT EXISTS idx_morpho_earn_day ON morpho_earn_history(day DESC);
+){earn_partition};
+{earn_default_partition}
+{earn_date_index}
 CREATE INDEX IF NOT EXISTS idx_morpho_earn_vault ON morpho_earn_history(vault_address);
 
 -- Create dune_execution_log table
@@ -351,48 +454,176 @@ DROP TRIGGER IF EXISTS update_morpho_earn_history_updated_at ON morpho_earn_hist
 CREATE TRIGGER update_morpho_earn_history_updated_at
     BEFORE UPDATE ON morpho_earn_history
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
-""".format(timestamp=datetime.now().isoformat())
+{partition_sql}""".format(timestamp=datetime.now().isoformat(), partition_sql=partition_sql, **table_sql)
 
         return schema_sql
 
-    def generate_all(self):
-        """全てのSQLファイルを生成"""
+    def generate_incremental(self, output_format: str = "insert", output_dir: str = "migration_sql",
+                             lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> Dict[str, Dict[str, int]]:
+        """
+        前回の出力から新規・変更された行だけのSQLファイルを生成
+
+        output_dir/watermarks.json にキーごとの最終出力日（ウォーターマーク）と、直近 lookback_days 日分の
+        出力済みの行の内容ハッシュを記録する（watermark.py を参照）。
+        差分のあるテーブルだけを output_dir/incremental/<生成日時>/ に出力する。同じ秒に生成した場合は
+        <生成日時>_2 のように別のディレクトリを作成し、既存のディレクトリ・ファイルは変更しない。
+        マニフェストは全テーブルの出力が終わってから更新するため、途中で失敗しても再実行すればよい。
+
+        Args:
+            output_format: "insert"（バッチINSERT文）または "copy"（COPY + 一括マージ）
+            output_dir: 出力ディレクトリ
+            lookback_days: ウォーターマークより前で内容ハッシュを比較し直す日数
+
+        Returns:
+            テーブルごとの出力行数（emitted）と除外した行数（skipped）
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"未対応の出力形式です: {output_format}")
+
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = WatermarkManifest(os.path.join(output_dir, "watermarks.json"), lookback_days)
+        delta_dir = _create_unique_dir(os.path.join(output_dir, "incremental"),
+                                       datetime.now().strftime("%Y%m%d_%H%M%S"))
+        write = self.write_table_copy if output_format == "copy" else self.write_table_sql
+
+        summary = {}
+        deltas = []
+        for table, spec in TABLE_SPECS.items():
+            json_file = os.path.join(self.results_dir, spec.result_file)
+            if not os.path.exists(json_file):
+                continue
+
+            delta = manifest.table(spec)
+            # delta_dir はこの実行で作成したディレクトリのため、中のファイルも全てこの実行で作成したもの
+            path = os.path.join(delta_dir, spec.output_filename(output_format))
+            with open(path, 'w', encoding='utf-8') as f:
+                write(f, table, json_file, row_filter=delta.filter)
+            if delta.emitted == 0:
+                os.remove(path)
+            else:
+                print(f"[OK] Generated: {path} ({delta.emitted} rows)")
+            print(f"     {table}: 新規・変更 {delta.emitted}行 / 変更なし {delta.skipped}行"
+                  f"（うちウォーターマークより前 {delta.skipped_before_watermark}行）")
+            summary[table] = {"emitted": delta.emitted, "skipped": delta.skipped}
+            deltas.append(delta)
+
+        for delta in deltas:
+            delta.commit()
+        manifest.save()
+        if not os.listdir(delta_dir):
+            os.rmdir(delta_dir)
+        return summary
+
+    def generate_all(self, output_format: str = "insert", jobs: int = 1, output_dir: str = "migration_sql",
+                     shards: int = 1, shard_by: str = "key", partition_by: Optional[str] = None):
+        """
+        全てのSQLファイルを生成
+
+        テーブルごとのファイルは互いに独立しているため、jobs に2以上を指定すると
+        プロセスプールで並列に生成する。各ファイルの内容は逐次生成と同一になる。
+
+        shards に2以上を指定すると、テーブルごとのファイルを output_dir/shards/ 以下の shards 個のファイルに分け、
+        複数の接続から並行してインポートする load_shards.sh を生成する（sql_shards.py を参照）。
+
+        Args:
+            output_format: "insert"（バッチINSERT文）または "copy"（COPY + 一括マージ）
+            jobs: 並列に生成するプロセス数
+            output_dir: 出力ディレクトリ
+            shards: テーブルごとのファイルの分割数
+            shard_by: "key"（主キーのハッシュ）または "date"（日付の範囲）で分割
+            partition_by: "month" / "year" を指定すると、履歴テーブルを日付で範囲パーティション化したスキーマを生成
+                          （結果ファイルの最初の日付から3か月先までのパーティションを作成する）
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"未対応の出力形式です: {output_format}")
+        if shard_by not in SHARD_STRATEGIES:
+            raise ValueError(f"未対応のシャード分割方法です: {shard_by}")
+
         # 出力ディレクトリの作成
-        output_dir = "migration_sql"
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
         # スキーマ作成SQL
-        schema_sql = self.generate_schema_sql()
+        partition_start = earliest_dates(self.results_dir) if partition_by else None
+        schema_sql = self.generate_schema_sql(partition_by, partition_start)
         with open(os.path.join(output_dir, "01_create_schema.sql"), 'w', encoding='utf-8') as f:
             f.write(schema_sql)
         print(f"[OK] Generated: {output_dir}/01_create_schema.sql")
 
-        # Collateral History
-        collateral_sql = self.generate_collateral_sql(os.path.join(self.results_dir, "Result_Collateral.json"))
-        with open(os.path.join(output_dir, "02_insert_collateral.sql"), 'w', encoding='utf-8') as f:
-            f.write(collateral_sql)
-        print(f"[OK] Generated: {output_dir}/02_insert_collateral.sql")
-
-        # Borrow History
-        borrow_sql = self.generate_borrow_sql(os.path.join(self.results_dir, "Result_Borrow.json"))
-        with open(os.path.join(output_dir, "03_insert_borrow.sql"), 'w', encoding='utf-8') as f:
-            f.write(borrow_sql)
-        print(f"[OK] Generated: {output_dir}/03_insert_borrow.sql")
-
-        # DEX Volume History
-        dex_sql = self.generate_dex_sql(os.path.join(self.results_dir, "Result_DEX.json"))
-        with open(os.path.join(output_dir, "04_insert_dex.sql"), 'w', encoding='utf-8') as f:
-            f.write(dex_sql)
-        print(f"[OK] Generated: {output_dir}/04_insert_dex.sql")
-
-        # Earn History
-        earn_sql = self.generate_earn_sql(os.path.join(self.results_dir, "Result_Earn.json"))
-        with open(os.path.join(output_dir, "05_insert_earn.sql"), 'w', encoding='utf-8') as f:
-            f.write(earn_sql)
-        print(f"[OK] Generated: {output_dir}/05_insert_earn.sql")
-
-        # 実行手順を記載したREADME
+        use_copy = output_format == "copy"
+        tasks = []
+        for table, spec in TABLE_SPECS.items():
+            json_file = os.path.join(self.results_dir, spec.result_file)
+            filename = spec.output_filename(output_format)
+            # 結果ファイルの無いテーブル（--all で取得していない WLD Price など）は出力しない
+            if not os.path.exists(json_file):
+                continue
+            if shards > 1:
+                boundaries = date_boundaries(spec, json_file, shards) if shard_by == "date" else []
+                router = ShardRouter(table, shards, shard_by, boundaries)
+                tasks.extend((table, json_file, os.path.join(SHARD_DIR, shard_filename(filename, shard)),
+                              router, shard)
+                             for shard in range(shards))
+            else:
+                tasks.append((table, json_file, filename, None, 0))
+        if shards > 1:
+            os.makedirs(os.path.join(output_dir, SHARD_DIR), exist_ok=True)
+
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [
+                    pool.submit(_write_table_file, self.results_dir, output_format, table, json_file,
+                                os.path.join(output_dir, filename), self.tracer, router, shard,
+                                self.skip_unchanged)
+                    for table, json_file, filename, router, shard in tasks
+                ]
+                # 表示順を一定にするため、完了順ではなくテーブル順に結果を待つ
+                row_counts = [future.result() for future in futures]
+        else:
+            row_counts = [
+                _write_table_file(self.results_dir, output_format, table, json_file,
+                                  os.path.join(output_dir, filename), self.tracer, router, shard,
+                                  self.skip_unchanged)
+                for table, json_file, filename, router, shard in tasks
+            ]
+
+        data_files = []
+        for (_, _, filename, router, _), row_count in zip(tasks, row_counts):
+            if router is None:
+                print(f"[OK] Generated: {output_dir}/{filename}")
+            elif row_count == 0:
+                # 行が振り分けられなかったシャード（日付の種類がシャード数より少ない場合など）は出力しない
+                os.remove(os.path.join(output_dir, filename))
+                continue
+            else:
+                print(f"[OK] Generated: {output_dir}/{filename} ({row_count} rows)")
+            data_files.append(filename)
+
+        if shards > 1:
+            write_loader_files(output_dir, schema_sql, dict.fromkeys(task[0] for task in tasks), data_files,
+                               jobs=shards)
+            print(f"[OK] Generated: {output_dir}/{LOADER_SCRIPT}")
+
+        import_commands = "\n".join(
+            f"   psql -U username -d database_name -f {filename}" for filename in data_files)
+        include_commands = "\n".join(f"\\i {filename}" for filename in data_files)
+        if use_copy:
+            notes = """- 各ファイルはCOPYでUNLOGGEDのステージングテーブルに読み込み、ON CONFLICT付きの1回のINSERT ... SELECTで本テーブルにマージします
+- マージはON CONFLICT句で行われるため、重複実行しても安全です
+- ステージングテーブルはマージ後に削除されます
+- updated_atフィールドは自動的に更新されます"""
+        else:
+            notes = """- 各INSERT文にはON CONFLICT句が含まれているため、重複実行しても安全です
+- 大量データの場合、バッチサイズ（1000件）ごとに処理されます
+- updated_atフィールドは自動的に更新されます"""
+        if partition_by:
+            notes += """
+- 履歴テーブルは日付で範囲パーティション化されています（PostgreSQL {version} 以上が必要です）。先の期間のパーティションは `SELECT create_future_partitions();` を定期的に（月1回など）実行して作成してください。範囲外の行は DEFAULT パーティションに入り、パーティション作成時に移動されます""".format(
+                version=MIN_POSTGRES_VERSION)
+        if self.skip_unchanged:
+            notes += """
+- 既存の行と値が同じ行は更新しません（WHERE ... IS DISTINCT FROM）。各文の実行後に書き込んだ行数（written_rows）とスキップした行数（skipped_rows）が表示されます"""
+
         readme_content = """# 初期データ移行手順
 
 ## 実行順序
@@ -404,17 +635,14 @@ CREATE TRIGGER update_morpho_earn_history_updated_at
 
 2. **データインポート**
    ```sql
-   psql -U username -d database_name -f 02_insert_collateral.sql
-   psql -U username -d database_name -f 03_insert_borrow.sql
-   psql -U username -d database_name -f 04_insert_dex.sql
-   psql -U username -d database_name -f 05_insert_earn.sql
+{import_commands}
    ```
 
 ## 一括実行
 
 全てのSQLファイルを順番に実行:
 ```bash
-for file in *.sql; do
+for file in {sql_files}; do
     echo "Executing $file..."
     psql -U username -d database_name -f "$file"
 done
@@ -426,26 +654,104 @@ done
 ```sql
 BEGIN;
 \\i 01_create_schema.sql
-\\i 02_insert_collateral.sql
-\\i 03_insert_borrow.sql
-\\i 04_insert_dex.sql
-\\i 05_insert_earn.sql
+{include_commands}
 COMMIT;
 ```
 
 ## 注意事項
 
-- 各INSERT文にはON CONFLICT句が含まれているため、重複実行しても安全です
-- 大量データの場合、バッチサイズ（1000件）ごとに処理されます
-- updated_atフィールドは自動的に更新されます
-"""
+{notes}
+{parallel_section}""".format(import_commands=import_commands, include_commands=include_commands, notes=notes,
+           sql_files=f"01_create_schema.sql {SHARD_DIR}/*_shard*.sql" if shards > 1 else "*.sql",
+           parallel_section=self._parallel_readme_section(shards, shard_by) if shards > 1 else "")
         with open(os.path.join(output_dir, "README.md"), 'w', encoding='utf-8') as f:
             f.write(readme_content)
         print(f"[OK] Generated: {output_dir}/README.md")
 
         print(f"\n[COMPLETE] 全てのSQLファイルが {output_dir} ディレクトリに生成されました")
 
+    @staticmethod
+    def _parallel_readme_section(shards: int, shard_by: str) -> str:
+        """README.md の並列インポートの節（シャード分割時のみ）"""
+        strategy = "主キーのハッシュ" if shard_by == "key" else "日付の範囲"
+        return """
+## 並列インポート
+
+各テーブルのデータを{strategy}で最大 {shards} 個のファイル（{shard_dir}/ 以下）に分割しています。
+複数の接続から並行してインポートする場合:
+```bash
+PGDATABASE=database_name ./load_shards.sh {shards}
+```
+
+- 引数は並列接続数です（接続先は PGHOST / PGUSER などの環境変数で指定）
+- 主キー以外のインデックスはインポート前に削除し、全シャードの読み込み後に作り直します（{shard_dir}/drop_indexes.sql / {shard_dir}/create_indexes.sql）
+- シャードごとに主キーが重ならないため、並行してマージしても行ロックは競合しません
+- 各シャードはそれぞれ1つのトランザクションで実行されます。全体を1つのトランザクションにする場合は上記の手順で順番に実行してください
+""".format(strategy=strategy, shards=shards, shard_dir=SHARD_DIR)
+
 
 if __name__ == "__main__":
-    generator = SQLGenerator()
-    generator.generate_all()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="初期データ移行用のSQL生成")
+    parser.add_argument("command", nargs="?", choices=("generate", "load"), default="generate",
+                        help="generate: SQLファイルを生成（デフォルト） / load: データベースへ直接ロード")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="insert",
+                        help="insert: バッチINSERT文 / copy: COPY + 一括マージ")
+    parser.add_argument("--results-dir", default="Results", help="Result_*.json の格納ディレクトリ")
+    parser.add_argument("--incremental", action="store_true",
+                        help="generate: 前回から新規・変更された行だけを migration_sql/incremental/ に出力"
+                             "（--jobs / --shards / --shard-by / --partition-by とは同時に指定できない）")
+    parser.add_argument("--lookback-days", type=int, default=DEFAULT_LOOKBACK_DAYS,
+                        help="--incremental: ウォーターマークより前で変更を確認し直す日数"
+                             f"（デフォルト: {DEFAULT_LOOKBACK_DAYS}、これより前の日の変更は出力しない）")
+    parser.add_argument("--jobs", type=int, default=1, help="generate: テーブルごとのファイルを並列に生成するプロセス数")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="既存の行と値が同じ行を更新しない（generate: WHERE ... IS DISTINCT FROM 付きのSQL / load: 同じ条件でUPSERT）")
+    parser.add_argument("--partition-by", choices=PARTITION_INTERVALS,
+                        help="generate: 履歴テーブルを日付で範囲パーティション化したスキーマを生成（BRINインデックス付き）")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="generate: テーブルごとのファイルを分割する数（2以上で並行インポート用の load_shards.sh も生成）")
+    parser.add_argument("--shard-by", choices=SHARD_STRATEGIES, default="key",
+                        help="generate: key: 主キーのハッシュで分割 / date: 日付の範囲で分割")
+    parser.add_argument("--trace", help="generate: 処理時間の計測結果をJSON Lines形式で追記するファイル")
+    parser.add_argument("--dsn", help="load: PostgreSQLの接続文字列")
+    parser.add_argument("--sqlite", help="load: PostgreSQLの代わりに使うSQLiteファイル（動作確認用）")
+    parser.add_argument("--workers", type=int, default=1, help="load: 並行してロードするテーブル数")
+    parser.add_argument("--create-schema", action="store_true", help="load: ロード前に全テーブル（wld_price_history を含む）を作成")
+    parser.add_argument("--quality-gate", nargs="?", const="error", choices=("error", "warning"),
+                        help="生成・ロードの前にデータ品質チェックを行い、失敗した場合は中止する"
+                             "（warning を指定すると warning のチェックでも中止、numpyが必要）")
+    parser.add_argument("--quality-report", default=os.path.join("migration_sql", "quality_report.json"),
+                        help="--quality-gate のレポートの保存先")
+    args = parser.parse_args()
+    if args.incremental:
+        # 差分の出力は1ディレクトリへの逐次生成のみ（並列・分割・パーティションのスキーマには対応しない）
+        unsupported = [option for option, used in (
+            ("load", args.command == "load"),
+            ("--jobs", args.jobs != 1),
+            ("--shards", args.shards != 1),
+            ("--shard-by", args.shard_by != "key"),
+            ("--partition-by", args.partition_by is not None),
+        ) if used]
+        if unsupported:
+            parser.error(f"--incremental は {', '.join(unsupported)} と同時に指定できません")
+
+    if args.quality_gate:
+        try:
+            from data_quality import run_quality_gate
+        except ImportError:
+            raise RuntimeError("データ品質チェックには numpy が必要です（pip install -r requirements.txt）")
+        if not run_quality_gate(args.results_dir, args.quality_report, args.quality_gate):
+            sys.exit(1)
+
+    if args.command == "load":
+        from db_loader import run_load
+        run_load(args.results_dir, dsn=args.dsn, sqlite_path=args.sqlite,
+                 workers=args.workers, create_schema=args.create_schema, skip_unchanged=args.skip_unchanged)
+    else:
+        generator = SQLGenerator(args.results_dir, tracer=create_tracer(args.trace),
+                                 skip_unchanged=args.skip_unchanged)
+        if args.incremental:
+            generator.generate_incremental(output_format=args.format, lookback_days=args.lookback_days)
+        else:
+            generator.generate_all(output_format=args.format, jobs=args.jobs,
+                                   shards=args.shards, shard_by=args.shard_by, partition_by=args.partition_by)
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+処理時間の計測（スパン）
+DuneAPIClient と SQLGenerator の主要な処理（クエリ実行・ステータス確認・結果取得・バッチ生成）を
+スパンとして記録し、JSON Lines ファイルなどに出力する
+
+デフォルトの NOOP_TRACER は何も記録せず、計測を有効にしない限りほぼコストがかからない。
+スパンの started_at / completed_at は dune_execution_log の同名カラムと同じく処理の開始・終了時刻（UTC）。
+
+使い方:
+    tracer = JSONLinesTracer("trace.jsonl")
+    client = DuneAPIClient(api_key, tracer=tracer)
+    with tracer.span("custom.step", table="morpho_earn_history") as span:
+        ...
+        span.set(rows=123)
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _utcnow_iso() -> str:
+    """現在時刻（UTC、ミリ秒まで）を ISO 8601 形式で返す"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class _NoopSpan:
+    """何も記録しないスパン（全ての NOOP_TRACER.span で同じインスタンスを返す）"""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    スパンを記録しないトレーサー（デフォルト）
+
+    計測を行うトレーサーはこのクラスを継承し、span を実装する。
+    """
+
+    enabled = False
+
+    def span(self, name: str, **attributes) -> Any:
+        """
+        処理の開始から終了までを計測するコンテキストマネージャを返す
+
+        Args:
+            name: スパン名（dune.execute, sql.batch など）
+            **attributes: スパンに付ける属性
+
+        Returns:
+            set(**attributes) で属性を追加できるスパン
+        """
+        return NOOP_SPAN
+
+    def close(self):
+        pass
+
+
+NOOP_TRACER = Tracer()
+
+
+class Span:
+    """計測中のスパン"""
+
+    __slots__ = ("tracer", "name", "attributes", "span_id", "parent_id", "started_at", "_started")
+
+    def __init__(self, tracer: "RecordingTracer", name: str, attributes: Dict[str, Any],
+                 parent_id: Optional[str]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.started_at = ""
+        self._started = 0.0
+
+    def set(self, **attributes):
+        """属性を追加（行数・バイト数など、処理の途中で分かる値）"""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.started_at = _utcnow_iso()
+        self._started = time.perf_counter()
+        self.tracer._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        duration = time.perf_counter() - self._started
+        self.tracer._pop(self)
+        self.tracer.export({
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "started_at": self.started_at,
+            "completed_at": _utcnow_iso(),
+            "duration_seconds": round(duration, 6),
+            "error": f"{exc_type.__name__}: {exc}" if exc_type else None,
+            "attributes": self.attributes,
+        })
+        return False
+
+
+class RecordingTracer(Tracer):
+    """
+    終了したスパンを exporter（記録を受け取る関数）に渡すトレーサー
+
+    スパンの親子関係はスレッドごとに管理するため、クエリを並行実行する場合も
+    各スレッドのスパンはそのスレッドで開始したスパンの子になる。
+    """
+
+    enabled = True
+
+    def __init__(self, *exporters: Callable[[Dict[str, Any]], None]):
+        """
+        Args:
+            *exporters: 終了したスパンの記録（dict）を受け取る関数
+        """
+        self.exporters: List[Callable[[Dict[str, Any]], None]] = list(exporters)
+        self._local = threading.local()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, span: Span):
+        self._stack().append(span)
+
+    def _pop(self, span: Span):
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+
+    def span(self, name: str, **attributes) -> Span:
+        stack = self._stack()
+        return Span(self, name, attributes, stack[-1].span_id if stack else None)
+
+    def export(self, record: Dict[str, Any]):
+        """終了したスパンを各 exporter に渡す"""
+        for exporter in self.exporters:
+            exporter(record)
+
+
+class JSONLinesTracer(RecordingTracer):
+    """
+    終了したスパンを1行1件のJSONとしてファイルに追記するトレーサー
+
+    ファイルは追記モードで開くため、generate_all のワーカープロセスからも同じファイルに書き込める。
+    """
+
+    def __init__(self, path: str, *exporters: Callable[[Dict[str, Any]], None]):
+        """
+        Args:
+            path: 出力するファイルのパス
+            *exporters: ファイルへの出力に加えて記録を受け取る関数
+        """
+        super().__init__(self._write, *exporters)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # ワーカープロセスにはファイルのパスだけを渡し、そちらで開き直す
+        return {"path": self.path}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__init__(state["path"])
+
+
+def create_tracer(trace_file: Optional[str] = None) -> Tracer:
+    """trace_file を指定した場合は JSONLinesTracer、指定しない場合は NOOP_TRACER を返す"""
+    return JSONLinesTracer(trace_file) if trace_file else NOOP_TRACER
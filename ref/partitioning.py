@@ -0,0 +1,164 @@
+"""
+履歴テーブルの日付による範囲パーティション
+generate_migration_sql.py --partition-by month|year で使用するスキーマの部品を生成する
+
+パーティション化したテーブルでは:
+    - 日付カラムで PARTITION BY RANGE し、範囲外の行は DEFAULT パーティションに入る
+    - 日付のB-treeインデックスの代わりに BRIN インデックスを作成する（日付順に追記されるため小さく効果が高い）
+    - create_history_partitions() で指定した期間のパーティションを作成する
+      （DEFAULT パーティションに入っていた該当期間の行は新しいパーティションに移す）
+    - create_future_partitions() を定期的に実行して、先の期間のパーティションを用意しておく
+
+INSERT ... ON CONFLICT と COPY はどちらも親テーブルに対して実行すればよく、
+PostgreSQL が日付に応じたパーティションに振り分ける（主キーに日付カラムを含むため ON CONFLICT も使える）。
+
+updated_at を更新する行単位の BEFORE UPDATE トリガーを親テーブルに作成するため、PostgreSQL 13 以上が必要。
+"""
+
+import os
+from typing import Dict, Iterable, Optional
+
+from result_stream import ResultRowReader
+from table_specs import TABLE_SPECS
+
+
+# パーティションの単位
+PARTITION_INTERVALS = ("month", "year")
+
+# パーティション化する履歴テーブル → (日付カラム, 日付インデックス名)
+HISTORY_TABLES: Dict[str, tuple] = {
+    "morpho_collateral_history": ("day", "idx_morpho_collateral_day"),
+    "morpho_borrow_history": ("day", "idx_morpho_borrow_day"),
+    "dex_volume_history": ("date", "idx_dex_volume_date"),
+    "morpho_earn_history": ("day", "idx_morpho_earn_day"),
+}
+
+# create_future_partitions() のデフォルトの作成期間
+DEFAULT_PARTITION_AHEAD = "3 months"
+
+# パーティション化したスキーマに必要な PostgreSQL のバージョン（パーティション化した親テーブルの行単位の BEFORE トリガー）
+MIN_POSTGRES_VERSION = 13
+
+
+def partition_clause(table: str, partition_by: Optional[str]) -> str:
+    """CREATE TABLE の閉じ括弧に続ける PARTITION BY 句（パーティション化しない場合は空文字列）"""
+    if not partition_by:
+        return ""
+    return f" PARTITION BY RANGE ({HISTORY_TABLES[table][0]})"
+
+
+def default_partition_sql(table: str, partition_by: Optional[str]) -> str:
+    """範囲外の行を入れる DEFAULT パーティションの作成SQL（パーティション化しない場合は空文字列）"""
+    if not partition_by:
+        return ""
+    return f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;"
+
+
+def date_index_sql(table: str, partition_by: Optional[str]) -> str:
+    """日付カラムのインデックス（パーティション化する場合は BRIN）"""
+    column, index = HISTORY_TABLES[table]
+    if not partition_by:
+        return f"CREATE INDEX IF NOT EXISTS {index} ON {table}({column} DESC);"
+    return f"CREATE INDEX IF NOT EXISTS {index} ON {table} USING BRIN ({column});"
+
+
+def schema_requirements_sql(partition_by: Optional[str]) -> str:
+    """スキーマ作成SQLの先頭に付ける、必要な PostgreSQL のバージョンのコメント（パーティション化しない場合は空文字列）"""
+    if not partition_by:
+        return ""
+    return (f"-- Requires PostgreSQL {MIN_POSTGRES_VERSION} or later "
+            f"(row-level BEFORE UPDATE triggers on partitioned tables)")
+
+
+def partition_functions_sql(partition_by: str, ahead: str = DEFAULT_PARTITION_AHEAD) -> str:
+    """パーティション作成用の関数 create_history_partitions / create_future_partitions"""
+    if partition_by not in PARTITION_INTERVALS:
+        raise ValueError(f"未対応のパーティション単位です: {partition_by}")
+    tables = ", ".join(f"'{table}'" for table in HISTORY_TABLES)
+    return """-- Create partitions for [p_from, p_to] (rows already in the DEFAULT partition are moved)
+CREATE OR REPLACE FUNCTION create_history_partitions(
+    p_table TEXT, p_from DATE, p_to DATE, p_interval TEXT DEFAULT '{interval}'
+) RETURNS INTEGER AS $$
+DECLARE
+    v_key TEXT;
+    v_start DATE := date_trunc(p_interval, p_from)::date;
+    v_end DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    SELECT a.attname INTO v_key
+    FROM pg_partitioned_table pt
+    JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+    WHERE pt.partrelid = p_table::regclass;
+
+    WHILE v_start <= p_to LOOP
+        v_end := (v_start + ('1 ' || p_interval)::interval)::date;
+        v_name := p_table || '_p' || to_char(v_start, CASE p_interval WHEN 'year' THEN 'YYYY' ELSE 'YYYY_MM' END);
+        IF to_regclass(v_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', v_name, p_table);
+            EXECUTE format('WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+                           'INSERT INTO %I SELECT * FROM moved',
+                           p_table || '_default', v_key, v_start, v_key, v_end, v_name);
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           p_table, v_name, v_start, v_end);
+            v_created := v_created + 1;
+        END IF;
+        v_start := v_end;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ language 'plpgsql';
+
+-- Create partitions up to p_ahead from today for all history tables (run periodically, e.g. monthly)
+CREATE OR REPLACE FUNCTION create_future_partitions(p_ahead INTERVAL DEFAULT '{ahead}')
+RETURNS INTEGER AS $$
+DECLARE
+    v_table TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY[{tables}] LOOP
+        v_created := v_created + create_history_partitions(v_table, CURRENT_DATE, (CURRENT_DATE + p_ahead)::date);
+    END LOOP;
+    RETURN v_created;
+END;
+$$ language 'plpgsql';
+""".format(interval=partition_by, ahead=ahead, tables=tables)
+
+
+def initial_partitions_sql(start_dates: Dict[str, str], ahead: str = DEFAULT_PARTITION_AHEAD) -> str:
+    """
+    データの最初の日付から今日 + ahead までのパーティションを作成するSQL
+
+    Args:
+        start_dates: テーブル → 最初の日付（YYYY-MM-DD。無いテーブルは今日から）
+        ahead: 今日からどれだけ先まで作成するか
+    """
+    lines = ["-- Create partitions from the first day of the data"]
+    for table in HISTORY_TABLES:
+        start = f"DATE '{start_dates[table]}'" if start_dates.get(table) else "CURRENT_DATE"
+        lines.append(f"SELECT create_history_partitions('{table}', {start}, "
+                     f"(CURRENT_DATE + INTERVAL '{ahead}')::date);")
+    return "\n".join(lines) + "\n"
+
+
+def earliest_dates(results_dir: str, tables: Iterable[str] = HISTORY_TABLES) -> Dict[str, str]:
+    """
+    Result_*.json の日付カラムの最小値（YYYY-MM-DD）をテーブルごとに求める
+
+    Args:
+        results_dir: Result_*.json の格納ディレクトリ
+        tables: 対象のテーブル
+
+    Returns:
+        テーブル → 最初の日付（結果ファイルが無い・行が無いテーブルは含まない）
+    """
+    dates = {}
+    for table in tables:
+        json_file = os.path.join(results_dir, TABLE_SPECS[table].result_file)
+        if not os.path.exists(json_file):
+            continue
+        column = HISTORY_TABLES[table][0]
+        first = min((row[column][:10] for row in ResultRowReader(json_file)), default=None)
+        if first:
+            dates[table] = first
+    return dates
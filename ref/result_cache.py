@@ -0,0 +1,192 @@
+"""
+Dune実行結果のローカルキャッシュ
+クエリIDとクエリパラメータ（p_date などの日付範囲を含む）と実行日のハッシュをキーに実行結果を保存し、
+同じ条件で再実行する場合は Dune でクエリを実行せずにキャッシュから返す
+（p_date を指定しない実行はクエリ側で当日の範囲になるため、日付が変わるとキャッシュを使わない）
+
+有効期限（TTL）を過ぎたエントリは使わずに削除し、合計サイズが上限を超えた場合は
+最後に参照された時刻が古いものから削除する（LRU）。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+
+DEFAULT_CACHE_DIR = "result_cache"
+
+# キャッシュの有効期限（秒）
+DEFAULT_CACHE_TTL = 3600
+
+# キャッシュの合計サイズの上限（バイト）
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(query_id: int, params: Optional[Dict[str, Any]] = None,
+              effective_date: Optional[str] = None) -> str:
+    """
+    クエリIDとパラメータからキャッシュキー（SHA-256）を計算（パラメータの順序には依存しない）
+
+    Args:
+        query_id: クエリID
+        params: クエリパラメータ
+        effective_date: 実行の対象日（YYYY-MM-DD、p_date を指定しない実行の当日など）
+    """
+    payload = json.dumps({"query_id": query_id, "params": params or {}, "effective_date": effective_date},
+                         sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    実行結果のディスクキャッシュ
+
+    {cache_dir}/{key}.json に実行結果を、{cache_dir}/index.json に各エントリの
+    作成時刻・最終参照時刻・サイズを保存する。スレッドセーフ。
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = DEFAULT_CACHE_TTL,
+                 max_bytes: int = DEFAULT_CACHE_MAX_BYTES, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            cache_dir: キャッシュの保存先ディレクトリ
+            ttl: 有効期限（秒）
+            max_bytes: 合計サイズの上限（バイト）
+            clock: 現在時刻（UNIX時刻）を返す関数（テスト用に差し替え可能）
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return {}
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        # 結果ファイルが手動で削除されたエントリは除く
+        return {key: entry for key, entry in index.items() if os.path.exists(self._entry_path(key))}
+
+    def effective_date(self, params: Optional[Dict[str, Any]] = None) -> str:
+        """実行の対象日（p_date、指定が無い場合は clock の当日（UTC））"""
+        return (params or {}).get("p_date") or \
+            datetime.fromtimestamp(self.clock(), tz=timezone.utc).date().isoformat()
+
+    def _key(self, query_id: int, params: Optional[Dict[str, Any]]) -> str:
+        return cache_key(query_id, params, self.effective_date(params))
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _write_file(self, path: str, data: Any):
+        """一時ファイルに書いてから置き換え、書きかけのファイルを残さない"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _save_index(self):
+        self._write_file(os.path.join(self.cache_dir, self.INDEX_FILE), self.index)
+
+    def _remove(self, key: str):
+        self.index.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def total_bytes(self) -> int:
+        """キャッシュの合計サイズ（バイト）"""
+        return sum(entry["bytes"] for entry in self.index.values())
+
+    def get(self, query_id: int, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュされた実行結果を取得
+
+        Args:
+            query_id: クエリID
+            params: クエリパラメータ
+
+        Returns:
+            実行結果（キャッシュに無いか有効期限切れの場合はNone）
+        """
+        key = self._key(query_id, params)
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            now = self.clock()
+            if now - entry["created_at"] > self.ttl:
+                self._remove(key)
+                self._save_index()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            with open(self._entry_path(key), 'r', encoding='utf-8') as f:
+                results = json.load(f)
+            entry["last_access"] = now
+            self._save_index()
+            self.stats["hits"] += 1
+            return results
+
+    def put(self, query_id: int, params: Optional[Dict[str, Any]], results: Dict[str, Any]):
+        """
+        実行結果をキャッシュに保存し、上限を超えた分を古いものから削除
+
+        Args:
+            query_id: クエリID
+            params: クエリパラメータ
+            results: 実行結果
+        """
+        key = self._key(query_id, params)
+        with self._lock:
+            path = self._entry_path(key)
+            self._write_file(path, results)
+            now = self.clock()
+            self.index[key] = {
+                "query_id": query_id,
+                "params": params or {},
+                "effective_date": self.effective_date(params),
+                "created_at": now,
+                "last_access": now,
+                "bytes": os.path.getsize(path),
+            }
+            self.stats["stores"] += 1
+            self._evict(now)
+            self._save_index()
+
+    def _evict(self, now: float):
+        """有効期限切れのエントリを削除し、合計サイズが上限以下になるまで最終参照の古い順に削除"""
+        for key in [key for key, entry in self.index.items() if now - entry["created_at"] > self.ttl]:
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+        total = self.total_bytes
+        for key in sorted(self.index, key=lambda key: self.index[key]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]["bytes"]
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """全てのエントリを削除"""
+        with self._lock:
+            for key in list(self.index):
+                self._remove(key)
+            self._save_index()
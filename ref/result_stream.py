@@ -0,0 +1,335 @@
+"""
+Dune結果JSONのストリーミング読み込み
+Result_*.json 全体をメモリに載せずに result.rows を1行ずつ取り出す
+
+CSV形式の結果（Dune API の results/csv）も CSVRowReader で同じように1行ずつ型付きのdictとして読み込める。
+"""
+
+import csv
+import json
+import re
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Union
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _JSONTokenReader:
+    """ファイルをチャンク単位で読み進めるJSONリーダー"""
+
+    def __init__(self, f: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """次のチャンクを読み込む（読み込めなかった場合False）"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 消費済みの部分は捨ててバッファを小さく保つ
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """空白を読み飛ばして次の1文字を返す"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("JSONの途中でファイルが終了しました")
+
+    def expect(self, char: str):
+        """次の文字が char であることを確認して読み進める"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSONの構文エラー: '{char}' を期待しましたが '{found}' でした")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """JSON値を1つ読み込む"""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # 値がチャンク境界で切れている場合は追加で読み込んで再試行
+                if self._fill():
+                    continue
+                raise
+            # 数値がチャンク末尾で切れている可能性があるため、末尾で終わった場合は続きを確認
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def iter_object_keys(self) -> Iterator[str]:
+        """オブジェクトのキーを順に返す（呼び出し側が値を消費すること）"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"JSONの構文エラー: 予期しない文字 '{separator}'")
+
+    def iter_array_items(self) -> Iterator[Any]:
+        """配列の要素を1つずつ返す"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"JSONの構文エラー: 予期しない文字 '{separator}'")
+
+
+class ResultRowReader:
+    """
+    Dune実行結果ファイルから result.rows を1行ずつ読み込むリーダー
+
+    rows 以外のトップレベル項目（execution_id, state など）と result.metadata は
+    小さいため通常通りデコードし、読み込み後に属性として参照できる。
+    """
+
+    def __init__(self, json_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            json_file: Dune実行結果のJSONファイル
+            chunk_size: 1回に読み込む文字数
+        """
+        self.json_file = json_file
+        self.source = json_file
+        self.chunk_size = chunk_size
+        self.has_rows = False
+        self.row_count = 0
+        self.fields: Dict[str, Any] = {}
+        self.metadata: Dict[str, Any] = {}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self.has_rows = False
+        self.row_count = 0
+        with open(self.json_file, 'r', encoding='utf-8') as f:
+            reader = _JSONTokenReader(f, self.chunk_size)
+            for key in reader.iter_object_keys():
+                if key != 'result' or reader.peek() != '{':
+                    self.fields[key] = reader.value()
+                    continue
+
+                for result_key in reader.iter_object_keys():
+                    if result_key == 'rows':
+                        self.has_rows = True
+                        for row in reader.iter_array_items():
+                            self.row_count += 1
+                            yield row
+                    elif result_key == 'metadata':
+                        self.metadata = reader.value()
+                    else:
+                        reader.value()
+
+
+def iter_result_rows(json_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Dune実行結果ファイルの result.rows を1行ずつ返す
+
+    Args:
+        json_file: Dune実行結果のJSONファイル
+        chunk_size: 1回に読み込む文字数
+
+    Returns:
+        行（dict）のイテレータ
+    """
+    return iter(ResultRowReader(json_file, chunk_size))
+
+
+# CSVの値をまとめて型変換する行数
+CSV_BATCH_SIZE = 1000
+
+# JSONの数値の文法（型が分からないカラムはこれに一致する値だけを数値にする）
+_JSON_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?')
+
+
+class _CSVNumberError(ValueError):
+    """数値カラムに数値として解釈できない値があった（index は列の値の中の位置）"""
+
+    def __init__(self, index: int, value: str):
+        super().__init__(f"数値として解釈できない値です: {value!r}")
+        self.index = index
+        self.value = value
+
+
+def _parse_csv_number(value: str) -> Any:
+    """数値カラムの値（JSONと同じく、整数表記は int、それ以外は float）"""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _parse_csv_auto(value: str) -> Any:
+    """型が分からないカラムの値（JSONの数値の文法に一致しなければ文字列のまま。nan / inf なども文字列）"""
+    if _JSON_NUMBER.fullmatch(value):
+        return _parse_csv_number(value)
+    return value
+
+
+def _decode_text_column(values: Sequence[str]) -> Sequence[Optional[str]]:
+    """文字列カラムの値（空の値は None）"""
+    if "" not in values:
+        return values
+    return [value or None for value in values]
+
+
+def _decode_number_column(values: Sequence[str]) -> Sequence[Any]:
+    """
+    数値カラムの値をまとめて変換
+
+    列の値を1つのJSON配列として一度にデコードする（1値ずつ int() / float() を呼ぶより速い）。
+    JSONの数値として不正な値（先頭の + や 0 など）が含まれる場合は1つずつ変換する。
+
+    Raises:
+        _CSVNumberError: 数値として解釈できない値（"N/A" など）が含まれる場合
+    """
+    try:
+        decoded = json.loads("[" + ",".join([value or "null" for value in values]) + "]")
+    except ValueError:
+        decoded = None
+    if decoded is not None and len(decoded) == len(values):
+        return decoded
+    result = []
+    for index, value in enumerate(values):
+        try:
+            result.append(_parse_csv_number(value))
+        except ValueError:
+            raise _CSVNumberError(index, value) from None
+    return result
+
+
+def _decode_auto_column(values: Sequence[str]) -> Sequence[Any]:
+    """型が分からないカラムの値（数値として解釈できない値は文字列のまま）"""
+    return [_parse_csv_auto(value) if value else None for value in values]
+
+
+# テーブル定義のカラム型ごとのCSVの列のデコーダー
+CSV_COLUMN_DECODERS: Dict[str, Callable[[Sequence[str]], Sequence[Any]]] = {
+    "timestamp": _decode_text_column,
+    "date": _decode_text_column,
+    "text": _decode_text_column,
+    "numeric": _decode_number_column,
+    "integer": _decode_number_column,
+}
+
+
+class CSVRowReader:
+    """
+    Dune実行結果のCSV（1ページ目から順に、各ページの先頭行はヘッダー）を1行ずつ型付きのdictとして読み込むリーダー
+
+    ResultRowReader と同じ属性（has_rows, row_count, fields, metadata）を持ち、SQLGenerator などに
+    そのまま渡せる。CSVには型の情報が無いため、column_types（テーブル定義のカラム型）に従って
+    CSV_BATCH_SIZE 行ずつ列単位で変換し、型が分からないカラムはJSONの数値の文法に一致すれば数値にする。
+    空の値は None になる（CSVでは空文字列とNULLを区別できない）。数値カラムに数値として解釈できない値が
+    あれば、行番号とカラム名を含む ValueError を送出する。
+    ページは読み込みながら取得するため、繰り返し読み込むことはできない。
+    """
+
+    def __init__(self, pages: Iterable[TextIO], column_types: Optional[Dict[str, str]] = None,
+                 fields: Optional[Dict[str, Any]] = None, source: str = "csv",
+                 batch_size: int = CSV_BATCH_SIZE):
+        """
+        Args:
+            pages: CSVのページ（テキストストリーム）のイテラブル
+            column_types: カラム名 → テーブル定義のカラム型（COLUMN_TYPES）
+            fields: 行以外のトップレベル項目（execution_id など）
+            source: 読み込み元の表示名（生成SQLのコメントに使用）
+            batch_size: まとめて型変換する行数
+        """
+        self.pages = pages
+        self.column_types = column_types or {}
+        self.source = source
+        self.batch_size = batch_size
+        self.has_rows = False
+        self.row_count = 0
+        self.fields: Dict[str, Any] = dict(fields or {})
+        self.metadata: Dict[str, Any] = {}
+
+    def _decoders(self, columns: Sequence[str]) -> List[Callable[[Sequence[str]], Sequence[Any]]]:
+        return [CSV_COLUMN_DECODERS.get(self.column_types.get(column), _decode_auto_column) for column in columns]
+
+    @staticmethod
+    def _decode_batch(columns: Sequence[str], decoders: Sequence[Callable[[Sequence[str]], Sequence[Any]]],
+                      batch: List[List[str]], first_row: int) -> List[Sequence[Any]]:
+        """バッチの行を列ごとに変換する（first_row はバッチの先頭行の、ヘッダーを除いた1始まりの行番号）"""
+        decoded = []
+        for column, decode, values in zip(columns, decoders, zip(*batch)):
+            try:
+                decoded.append(decode(values))
+            except _CSVNumberError as e:
+                raise ValueError(f"CSVの {first_row + e.index}行目のカラム {column} の値 {e.value!r} は"
+                                 f"数値として解釈できません") from None
+        return decoded
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self.row_count = 0
+        columns: Optional[List[str]] = None
+        for page in self.pages:
+            reader = csv.reader(page)
+            header = next(reader, None)
+            if header is None:
+                continue
+            if columns is None:
+                columns = header
+                decoders = self._decoders(columns)
+                self.metadata = {"column_names": columns}
+                self.has_rows = True
+            elif header != columns:
+                raise ValueError(f"ページごとにCSVのヘッダーが異なります: {header}")
+
+            while True:
+                batch = list(islice(reader, self.batch_size))
+                if not batch:
+                    break
+                first_row = self.row_count + 1
+                self.row_count += len(batch)
+                decoded = self._decode_batch(columns, decoders, batch, first_row)
+                for values in zip(*decoded):
+                    yield dict(zip(columns, values))
+        self.metadata["row_count"] = self.row_count
+
+
+# 行の読み込み元（結果JSONファイルのパス、または ResultRowReader / CSVRowReader）
+RowSource = Union[str, ResultRowReader, CSVRowReader]
+
+
+def open_result_rows(source: RowSource):
+    """
+    結果ファイルのパスまたは読み込み済みのリーダーから行のリーダーを返す
+
+    SQLGenerator / DatabaseLoader はこの関数を通して行を読み込むため、
+    JSONファイルの代わりに CSVRowReader（ダウンロード中のCSV）を渡すこともできる。
+    """
+    return ResultRowReader(source) if isinstance(source, str) else source
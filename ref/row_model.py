@@ -0,0 +1,171 @@
+"""
+テーブルごとの型付き行オブジェクト
+Dune結果の行（dict）を __slots__ のクラスに詰め替え、メモリ上に多数の行を保持する際の使用量を減らす
+
+    - カラムは TableSpec の定義順の属性（インスタンスごとの __dict__ を持たない）
+    - アドレス・シンボルなどの文字列と日付の文字列は sys.intern で共有する
+      （dict の行では行ごとに同じ文字列とキーの文字列が別々に作られる）
+    - 主キーの日付は day_ordinal（date.toordinal() の整数）としても保持する。
+      日付文字列の解析はメモ化しているため、同じ日付は1回しか解析しない
+
+行オブジェクトは row["day"] / row.get("tvl_usd") のように dict と同じ書き方でも参照できる。
+TableRowSet は ResultRowReader と同じ属性を持つため、SQLGenerator / DatabaseLoader にそのまま渡せる。
+
+使い方:
+    rows = load_row_set("morpho_earn_history", "Results/Result_Earn.json")
+    generator.write_table_sql(f, "morpho_earn_history", rows)
+    history = EarnHistory.from_row_set(rows)
+"""
+
+import sys
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from result_stream import RowSource, open_result_rows
+from table_specs import TABLE_SPECS, TableSpec
+
+
+@lru_cache(maxsize=None)
+def day_ordinal(value: str) -> int:
+    """日付・日時の文字列（先頭が YYYY-MM-DD）を date.toordinal() の整数に変換（メモ化）"""
+    return date.fromisoformat(value[:10]).toordinal()
+
+
+def _intern_text(value: Any) -> Any:
+    """文字列を intern して共有する（None など文字列以外はそのまま）"""
+    return sys.intern(value) if value.__class__ is str else value
+
+
+class TableRow:
+    """
+    1行分の値（テーブルごとのサブクラスを row_class で作成する）
+
+    サブクラスは TableSpec のカラム名と day_ordinal（主キーの日付。日付カラムが無いテーブルは None）を
+    __slots__ に持つ。
+    """
+
+    __slots__ = ()
+
+    spec: TableSpec
+
+    def __getitem__(self, column: str) -> Any:
+        try:
+            return getattr(self, column)
+        except AttributeError:
+            raise KeyError(column) from None
+
+    def get(self, column: str, default: Any = None) -> Any:
+        return getattr(self, column, default)
+
+    def keys(self) -> List[str]:
+        return self.spec.column_names
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dune結果と同じ形式の dict に戻す"""
+        return dict(zip(self.spec.column_names, self.spec.row_attributes(self)))
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.spec.row_attributes(self) == self.spec.row_attributes(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
+
+
+@lru_cache(maxsize=None)
+def row_class(table: str) -> type:
+    """
+    テーブルの行クラスを作成（テーブルごとに1回だけ作成する）
+
+    コンストラクタ from_row は dict の行を受け取り、文字列を intern し、日付カラムを day_ordinal に変換する。
+    """
+    spec = TABLE_SPECS[table]
+    date_column = spec.date_column
+    name = "".join(part.title() for part in table.split("_")) + "Row"
+    cls = type(name, (TableRow,), {"__slots__": (*spec.column_names, "day_ordinal"), "spec": spec})
+
+    # dict の行 → 行オブジェクト（テーブル定義から組み立てて一度だけコンパイルする）
+    text_types = ("timestamp", "date", "text")
+    assignments = []
+    for column, column_type in spec.columns:
+        accessor = f"row.get({column!r})" if column in spec.optional_columns else f"row[{column!r}]"
+        assignments.append(f"    obj.{column} = {'_intern(' + accessor + ')' if column_type in text_types else accessor}")
+    if date_column:
+        assignments.append(f"    value = obj.{date_column}")
+        assignments.append("    obj.day_ordinal = None if value is None else _day_ordinal(value)")
+    else:
+        assignments.append("    obj.day_ordinal = None")
+    source = "def from_row(row):\n    obj = _new(_cls)\n" + "\n".join(assignments) + "\n    return obj\n"
+    namespace = {"_new": object.__new__, "_cls": cls, "_intern": _intern_text,
+                 "_day_ordinal": day_ordinal}
+    exec(compile(source, f"<row_model:{table}>", "exec"), namespace)
+    cls.from_row = staticmethod(namespace["from_row"])
+    return cls
+
+
+class TableRowSet:
+    """
+    1テーブル分の行オブジェクトのリスト
+
+    ResultRowReader と同じ属性（has_rows, row_count, fields, metadata, source）を持ち、
+    SQLGenerator.write_table_sql などに結果ファイルの代わりに渡せる（何度でも読み込める）。
+    """
+
+    def __init__(self, table: str, rows: List[TableRow], source: str = "rows",
+                 fields: Optional[Dict[str, Any]] = None, metadata: Optional[Dict[str, Any]] = None,
+                 has_rows: bool = True):
+        """
+        Args:
+            table: テーブル名（TABLE_SPECS のキー）
+            rows: 行オブジェクト（dict の行も可）
+            source: 読み込み元の表示名（生成SQLのコメントに使用）
+            fields: 行以外のトップレベル項目（execution_id など）
+            metadata: result.metadata
+            has_rows: 読み込み元に result.rows があったか
+        """
+        self.table = table
+        self.spec = TABLE_SPECS[table]
+        self.rows = rows
+        self.source = source
+        self.fields = dict(fields or {})
+        self.metadata = dict(metadata or {})
+        self.has_rows = has_rows
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[TableRow]:
+        return iter(self.rows)
+
+    def column(self, name: str) -> List[Any]:
+        """1カラム分の値（行の順）"""
+        return [getattr(row, name) for row in self.rows]
+
+    def day_ordinals(self) -> List[Optional[int]]:
+        """行ごとの主キーの日付（date.toordinal() の整数）"""
+        return [row.day_ordinal for row in self.rows]
+
+
+def load_row_set(table: str, source: RowSource) -> TableRowSet:
+    """
+    結果ファイル（または ResultRowReader / CSVRowReader）の行を行オブジェクトに変換して読み込む
+
+    Args:
+        table: テーブル名（TABLE_SPECS のキー）
+        source: Dune実行結果のJSONファイル、または行のリーダー
+
+    Returns:
+        TableRowSet
+    """
+    reader = open_result_rows(source)
+    rows = list(map(row_class(table).from_row, reader))
+    return TableRowSet(table, rows, source=reader.source, fields=reader.fields, metadata=reader.metadata,
+                       has_rows=reader.has_rows)
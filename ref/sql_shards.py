@@ -0,0 +1,193 @@
+"""
+生成SQLのシャード分割
+1テーブル分のデータを主キーのハッシュまたは日付の範囲で N 個のファイルに分け、
+複数の psql 接続から並行してインポートするスクリプトを生成する
+
+シャードごとに主キーが重ならないため、並行して ON CONFLICT でマージしても行ロックが競合しない。
+インポート中は主キー以外のインデックスを削除し、全シャードの読み込み後にまとめて作り直す
+（主キーは ON CONFLICT に必要なため削除しない）。
+
+使い方:
+    python generate_migration_sql.py --shards 4 --shard-by date
+    cd migration_sql && PGDATABASE=database_name ./load_shards.sh 4
+"""
+
+import os
+import re
+import stat
+import zlib
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from result_stream import ResultRowReader
+from table_specs import TABLE_SPECS, TableSpec
+
+
+# シャードの分け方
+#   key:  主キーのハッシュ（行数が均等になる）
+#   date: 主キーの日付の範囲（各シャードが連続した期間になる。日付カラムが無いテーブルは key と同じ）
+SHARD_STRATEGIES = ("key", "date")
+
+SHARD_DIR = "shards"
+LOADER_SCRIPT = "load_shards.sh"
+DROP_INDEXES_FILE = "drop_indexes.sql"
+CREATE_INDEXES_FILE = "create_indexes.sql"
+
+_INDEX_PATTERN = re.compile(r"^CREATE INDEX IF NOT EXISTS (\w+) ON (\w+)(?: USING \w+)?\s*\(.*\);$", re.MULTILINE)
+
+
+def date_boundaries(spec: TableSpec, json_file: str, shards: int) -> List[str]:
+    """
+    行数がほぼ均等になるように日付の範囲の境界を決める
+
+    Args:
+        spec: テーブル定義
+        json_file: Dune実行結果のJSONファイル
+        shards: シャード数
+
+    Returns:
+        昇順の境界値（シャード i は boundaries[i-1] 以上 boundaries[i] 未満。重複は除くため shards - 1 個以下）
+    """
+    column = spec.date_column
+    if column is None or shards <= 1:
+        return []
+    days = sorted(row[column] for row in ResultRowReader(json_file))
+    boundaries: List[str] = []
+    for i in range(1, shards):
+        day = days[i * len(days) // shards] if days else None
+        if day is not None and (not boundaries or day > boundaries[-1]) and day > days[0]:
+            boundaries.append(day)
+    return boundaries
+
+
+class ShardRouter:
+    """
+    行をシャードに振り分ける
+
+    generate_all のワーカープロセスに渡すため、pickle ではテーブル名と境界値だけを渡し、
+    ワーカー側でテーブル定義から組み立て直す。
+    """
+
+    def __init__(self, table: str, shards: int, strategy: str = "key",
+                 boundaries: Optional[Sequence[str]] = None):
+        """
+        Args:
+            table: テーブル名（TABLE_SPECS のキー）
+            shards: シャード数
+            strategy: "key"（主キーのハッシュ）または "date"（日付の範囲）
+            boundaries: strategy="date" の場合の境界値（date_boundaries の結果）
+        """
+        if strategy not in SHARD_STRATEGIES:
+            raise ValueError(f"未対応のシャード分割方法です: {strategy}")
+        self.table = table
+        self.shards = shards
+        self.strategy = strategy
+        self.boundaries = list(boundaries or [])
+
+        spec = TABLE_SPECS[table]
+        column = spec.date_column
+        if strategy == "date" and column is not None:
+            self.shard_of = lambda row: bisect_right(self.boundaries, row[column])
+        else:
+            conflict_columns = spec.conflict_columns
+            self.shard_of = lambda row: _key_hash(row, conflict_columns) % shards
+
+    def filter(self, shard: int):
+        """シャード shard の行だけを返す行フィルター（SQLGenerator の row_filter）"""
+        shard_of = self.shard_of
+
+        def rows_in_shard(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            return (row for row in rows if shard_of(row) == shard)
+        return rows_in_shard
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"table": self.table, "shards": self.shards, "strategy": self.strategy,
+                "boundaries": self.boundaries}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__init__(**state)
+
+
+def _key_hash(row: Dict[str, Any], columns: Sequence[str]) -> int:
+    """主キーの値のハッシュ（プロセスをまたいで同じ値になるよう crc32 を使う）"""
+    return zlib.crc32("\x00".join(str(row[column]) for column in columns).encode("utf-8"))
+
+
+def shard_filename(filename: str, shard: int) -> str:
+    """05_insert_earn.sql → 05_insert_earn_shard03.sql"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_shard{shard:02d}{ext}"
+
+
+def schema_indexes(schema_sql: str, tables: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    スキーマ作成SQLから、指定したテーブルの主キー以外のインデックスを取り出す
+
+    Returns:
+        (インデックス名, CREATE INDEX 文) のリスト
+    """
+    tables = set(tables)
+    return [(match.group(1), match.group(0)) for match in _INDEX_PATTERN.finditer(schema_sql)
+            if match.group(2) in tables]
+
+
+def write_loader_files(output_dir: str, schema_sql: str, tables: Iterable[str], shard_files: Sequence[str],
+                       jobs: int):
+    """
+    並行インポート用のファイルを書き出す
+
+    output_dir/shards/drop_indexes.sql:   インポート前に削除するインデックス
+    output_dir/shards/create_indexes.sql: インポート後に作り直すインデックスと ANALYZE
+    output_dir/load_shards.sh:            スキーマ作成 → インデックス削除 → シャードの並行インポート → インデックス作成
+
+    Args:
+        output_dir: 出力ディレクトリ
+        schema_sql: スキーマ作成SQL（01_create_schema.sql の内容）
+        tables: インポートするテーブル
+        shard_files: シャードのファイル（output_dir からの相対パス）
+        jobs: 並列接続数のデフォルト値
+    """
+    tables = list(tables)
+    indexes = schema_indexes(schema_sql, tables)
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    with open(os.path.join(shard_dir, DROP_INDEXES_FILE), 'w', encoding='utf-8') as f:
+        f.write("-- シャードのインポート前に主キー以外のインデックスを削除\n")
+        f.write("".join(f"DROP INDEX IF EXISTS {name};\n" for name, _ in indexes))
+
+    with open(os.path.join(shard_dir, CREATE_INDEXES_FILE), 'w', encoding='utf-8') as f:
+        f.write("-- 全シャードのインポート後にインデックスを作り直し、統計情報を更新\n")
+        f.write("".join(f"{statement}\n" for _, statement in indexes))
+        f.write("".join(f"ANALYZE {table};\n" for table in tables))
+
+    script = """#!/bin/sh
+# シャード分割したSQLファイルを複数の接続から並行してインポート
+# 使い方: ./{script} [並列接続数]
+# 接続先は PGHOST / PGPORT / PGDATABASE / PGUSER などの環境変数で指定する
+set -eu
+cd "$(dirname "$0")"
+JOBS="${{1:-{jobs}}}"
+PSQL="psql -X -q -v ON_ERROR_STOP=1"
+
+$PSQL -f 01_create_schema.sql
+$PSQL -f {shard_dir}/{drop_indexes}
+
+# 各シャードは1トランザクション（-1）で実行する。失敗した場合は再実行すればよい（ON CONFLICT でマージするため）
+if ! printf '%s\\n' \\
+{shard_list}
+    | xargs -P "$JOBS" -n 1 $PSQL -1 -f; then
+    echo "✗ エラー: インポートに失敗したシャードがあります（{shard_dir}/{create_indexes} は未実行）" >&2
+    exit 1
+fi
+
+$PSQL -f {shard_dir}/{create_indexes}
+echo "✓ {count} ファイルをインポートしました"
+""".format(script=LOADER_SCRIPT, jobs=jobs, shard_dir=SHARD_DIR, drop_indexes=DROP_INDEXES_FILE,
+           create_indexes=CREATE_INDEXES_FILE, count=len(shard_files),
+           shard_list="".join(f"    {path} \\\n" for path in shard_files).rstrip("\n"))
+
+    path = os.path.join(output_dir, LOADER_SCRIPT)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(script)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
@@ -0,0 +1,395 @@
+"""
+移行対象テーブルの定義
+Dune結果ファイルとテーブルの対応、カラムと型、ON CONFLICTのキーと更新カラムを宣言的に定義し、
+テーブルごとの行エンコーダーを一度だけ組み立てる
+
+新しいテーブル（Duneクエリ）を追加する場合は TABLE_DEFINITIONS に1項目追加するだけでよい。
+"""
+
+import math
+from itertools import chain
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# カラムの型
+#   timestamp / date / text: SQLでは文字列リテラルとして出力
+#   numeric / integer: SQLでは数値リテラルとして出力
+COLUMN_TYPES = ("timestamp", "date", "text", "numeric", "integer")
+
+# INSERT文のカラム一覧を1行に並べる数
+COLUMNS_PER_LINE = 5
+
+TABLE_DEFINITIONS: Dict[str, Dict[str, Any]] = {
+    "morpho_collateral_history": {
+        "title": "Morpho Collateral History",
+        "result_file": "Result_Collateral.json",
+        "output_file": "02_{format}_collateral.sql",
+        "columns": [
+            ("day", "timestamp"),
+            ("collateral_token", "text"),
+            ("collateral_symbol", "text"),
+            ("collateral_amount", "numeric"),
+            ("collateral_amount_usd", "numeric"),
+        ],
+        "conflict_columns": ["day", "collateral_token"],
+        "update_columns": ["collateral_amount", "collateral_amount_usd"],
+        "optional_columns": ["collateral_amount_usd"],
+        "nonnegative_columns": ["collateral_amount", "collateral_amount_usd"],
+        "change_columns": ["collateral_amount"],
+    },
+    "morpho_borrow_history": {
+        "title": "Morpho Borrow History",
+        "result_file": "Result_Borrow.json",
+        "output_file": "03_{format}_borrow.sql",
+        "columns": [
+            ("day", "timestamp"),
+            ("loan_token", "text"),
+            ("loan_symbol", "text"),
+            ("borrow_amount", "numeric"),
+            ("borrow_amount_usd", "numeric"),
+        ],
+        "conflict_columns": ["day", "loan_token"],
+        "update_columns": ["borrow_amount", "borrow_amount_usd"],
+        "optional_columns": ["borrow_amount_usd"],
+        "nonnegative_columns": ["borrow_amount", "borrow_amount_usd"],
+        "change_columns": ["borrow_amount"],
+    },
+    "dex_volume_history": {
+        "title": "DEX Volume History",
+        "result_file": "Result_DEX.json",
+        "output_file": "04_{format}_dex.sql",
+        "columns": [
+            ("date", "timestamp"),
+            ("blockchain", "text"),
+            ("chain_volume_wld", "numeric"),
+            ("chain_volume_usd", "numeric"),
+            ("chain_num_swaps", "integer"),
+            ("total_volume_wld", "numeric"),
+            ("total_volume_usd", "numeric"),
+            ("total_num_swaps", "integer"),
+        ],
+        "conflict_columns": ["date", "blockchain"],
+        "update_columns": ["chain_volume_wld", "chain_volume_usd", "chain_num_swaps",
+                           "total_volume_wld", "total_volume_usd", "total_num_swaps"],
+        "optional_columns": [],
+        "nonnegative_columns": ["chain_volume_wld", "chain_volume_usd", "chain_num_swaps",
+                                "total_volume_wld", "total_volume_usd", "total_num_swaps"],
+        "change_columns": [],
+    },
+    "morpho_earn_history": {
+        "title": "Morpho Earn History",
+        "result_file": "Result_Earn.json",
+        "output_file": "05_{format}_earn.sql",
+        "columns": [
+            ("day", "timestamp"),
+            ("vault_address", "text"),
+            ("vault_symbol", "text"),
+            ("vault_asset", "text"),
+            ("vault_asset_symbol", "text"),
+            ("conversion_rate", "numeric"),
+            ("delta_assets", "numeric"),
+            ("delta_shares", "numeric"),
+            ("total_shares", "numeric"),
+            ("tvl_usd", "numeric"),
+        ],
+        "conflict_columns": ["day", "vault_address"],
+        "update_columns": ["conversion_rate", "delta_assets", "delta_shares", "total_shares", "tvl_usd"],
+        "optional_columns": ["tvl_usd"],
+        "nonnegative_columns": ["conversion_rate", "total_shares", "tvl_usd"],
+        "change_columns": ["conversion_rate", "total_shares", "tvl_usd"],
+    },
+    "wld_price_history": {
+        # テーブルは 01_create_schema.sql ではなく schema_file で作成するため、その後に実行する
+        "title": "WLD Price History",
+        "schema_file": "06_create_wld_price_history.sql",
+        "result_file": "Result_WLDPrice.json",
+        "output_file": "07_{format}_wld_price.sql",
+        "columns": [
+            ("date", "date"),
+            ("symbol", "text"),
+            ("close_price", "numeric"),
+        ],
+        "conflict_columns": ["date"],
+        "update_columns": ["symbol", "close_price"],
+        "optional_columns": [],
+        "nonnegative_columns": ["close_price"],
+        "change_columns": ["close_price"],
+    },
+}
+
+
+def _encode_float(value: float) -> str:
+    """浮動小数点数のエンコード（repr で往復可能な桁数、NaN / Infinity は文字列リテラル）"""
+    if value - value == 0:
+        return repr(value)
+    if value != value:
+        return "'NaN'"
+    return "'Infinity'" if value > 0 else "'-Infinity'"
+
+
+def escape_sql_value(value: Any) -> str:
+    """SQL文字列のエスケープ処理"""
+    if value is None:
+        return "NULL"
+    elif isinstance(value, float):
+        return _encode_float(value)
+    elif isinstance(value, int):
+        return str(value)
+    else:
+        # 文字列のエスケープ（シングルクォートを二重に）
+        escaped = str(value).replace("'", "''")
+        return f"'{escaped}'"
+
+
+def _encode_text(value: Any) -> str:
+    """文字列カラムのエンコード（想定外の型は escape_sql_value に任せる）"""
+    if value.__class__ is str:
+        return "'" + value.replace("'", "''") + "'"
+    return escape_sql_value(value)
+
+
+def _encode_number(value: Any) -> str:
+    """数値カラムのエンコード（想定外の型は escape_sql_value に任せる）"""
+    cls = value.__class__
+    if cls is int:
+        return str(value)
+    if cls is float:
+        return _encode_float(value)
+    return escape_sql_value(value)
+
+
+# 列単位のエンコードで値を区切る文字（PostgreSQLの文字列に含められないため値と衝突しない）
+_SEPARATOR = "\x00"
+
+_NUMBER_TYPES = frozenset((int, float))
+
+
+def _encode_text_column(values: Sequence[Any]) -> List[str]:
+    """
+    文字列カラムを1列まとめてエンコード
+
+    全ての値が str の場合は区切り文字で連結した1つの文字列に対して置換・分割を行い、
+    値ごとの関数呼び出しを省く。それ以外は値ごとに _encode_text を呼ぶ。
+    """
+    if not values:
+        return []
+    if set(map(type, values)) == {str}:
+        joined = _SEPARATOR.join(values)
+        if joined.count(_SEPARATOR) == len(values) - 1:
+            if "'" in joined:
+                joined = joined.replace("'", "''")
+            return ("'" + joined.replace(_SEPARATOR, "'" + _SEPARATOR + "'") + "'").split(_SEPARATOR)
+    return list(map(_encode_text, values))
+
+
+def _encode_number_column(values: Sequence[Any]) -> List[str]:
+    """
+    数値カラムを1列まとめてエンコード
+
+    全ての値が int / float で NaN / Infinity を含まない場合（合計が有限）は str をまとめて適用する
+    （float の str は repr と同じで、読み戻すと元の値になる）。それ以外は値ごとに _encode_number を呼ぶ。
+    """
+    if not values:
+        return []
+    types = set(map(type, values))
+    if types <= _NUMBER_TYPES:
+        try:
+            finite = float not in types or math.isfinite(sum(values))
+        except OverflowError:
+            finite = False
+        if finite:
+            return list(map(str, values))
+    return list(map(_encode_number, values))
+
+
+def encode_sql_column(values: Sequence[Any]) -> List[str]:
+    """
+    型が決まっていないカラムを1列まとめてエンコード（escape_sql_value と同じ結果）
+
+    Args:
+        values: 1列分の値
+
+    Returns:
+        値ごとのSQLリテラル
+    """
+    if not values:
+        return []
+    types = set(map(type, values))
+    if types == {str}:
+        return _encode_text_column(values)
+    if types <= _NUMBER_TYPES:
+        return _encode_number_column(values)
+    return list(map(escape_sql_value, values))
+
+
+_TYPE_ENCODERS: Dict[str, Callable[[Any], str]] = {
+    "timestamp": _encode_text,
+    "date": _encode_text,
+    "text": _encode_text,
+    "numeric": _encode_number,
+    "integer": _encode_number,
+}
+
+_TYPE_COLUMN_ENCODERS: Dict[str, Callable[[Sequence[Any]], List[str]]] = {
+    "timestamp": _encode_text_column,
+    "date": _encode_text_column,
+    "text": _encode_text_column,
+    "numeric": _encode_number_column,
+    "integer": _encode_number_column,
+}
+
+
+def _compile(name: str, body: str, namespace: Dict[str, Any]) -> Callable:
+    """関数のソースを組み立てて一度だけコンパイルする"""
+    exec(compile(body, f"<table_specs:{name}>", "exec"), namespace)
+    return namespace[name]
+
+
+class TableSpec:
+    """1テーブル分の移行定義と、定義から組み立てた行エンコーダー"""
+
+    def __init__(self, table: str, title: str, result_file: str, output_file: str,
+                 columns: Sequence[Tuple[str, str]], conflict_columns: Sequence[str],
+                 update_columns: Sequence[str], optional_columns: Sequence[str] = (),
+                 nonnegative_columns: Sequence[str] = (), change_columns: Sequence[str] = (),
+                 schema_file: Optional[str] = None):
+        for column, column_type in columns:
+            if column_type not in COLUMN_TYPES:
+                raise ValueError(f"{table}.{column}: 未対応の型です: {column_type}")
+
+        self.table = table
+        self.title = title
+        self.result_file = result_file
+        self.output_file = output_file
+        self.columns = list(columns)
+        self.column_names: List[str] = [column for column, _ in columns]
+        self.column_types: List[str] = [column_type for _, column_type in columns]
+        self.conflict_columns = list(conflict_columns)
+        # 主キーのうち日付型のカラム（ウォーターマーク・日付範囲のシャード分割・前日比の比較などに使う。無い場合は None）
+        types = dict(self.columns)
+        self.date_column: Optional[str] = next(
+            (column for column in self.conflict_columns if types[column] in ("timestamp", "date")), None)
+        self.update_columns = list(update_columns)
+        self.optional_columns = list(optional_columns)
+        # データ品質チェック（data_quality.py）の対象: 負の値を許さないカラムと、前日比の外れ値を調べるカラム
+        self.nonnegative_columns = list(nonnegative_columns)
+        self.change_columns = list(change_columns)
+        # 01_create_schema.sql に含まれないテーブルの作成SQL（migration_sql/ 内のファイル名）
+        self.schema_file = schema_file
+
+        accessors = [
+            f"row.get({column!r})" if column in self.optional_columns else f"row[{column!r}]"
+            for column in self.column_names
+        ]
+        # 行（dict）→ カラム順の値タプル
+        self.row_values: Callable[[Dict[str, Any]], tuple] = _compile(
+            "row_values",
+            f"def row_values(row):\n    return ({', '.join(accessors)},)\n",
+            {},
+        )
+        # 行（dict）→ VALUES句の1行（"    (..., ...)"）
+        namespace = {f"_e{i}": _TYPE_ENCODERS[column_type] for i, column_type in enumerate(self.column_types)}
+        encoded = " + ', ' + ".join(f"_e{i}({accessor})" for i, accessor in enumerate(accessors))
+        self.encode_row: Callable[[Dict[str, Any]], str] = _compile(
+            "encode_row",
+            f"def encode_row(row):\n    return '    (' + {encoded} + ')'\n",
+            namespace,
+        )
+        # 複数行 → VALUES句の本体（encode_values で使用）
+        self._column_encoders = [_TYPE_COLUMN_ENCODERS[column_type] for column_type in self.column_types]
+        self._required_values = (
+            itemgetter(*self.column_names) if len(self.column_names) > 1
+            else lambda row, _column=self.column_names[0]: (row[_column],)
+        )
+        # 行オブジェクト（row_model.TableRow）→ カラム順の値タプル
+        self.row_attributes: Callable[[Any], tuple] = (
+            attrgetter(*self.column_names) if len(self.column_names) > 1
+            else lambda row, _column=self.column_names[0]: (getattr(row, _column),)
+        )
+
+        self.insert_lines = self._build_insert_lines()
+        self.conflict_lines = self._build_conflict_lines()
+        # 値が変わらない行を更新しない ON CONFLICT 句（末尾のセミコロンなし。RETURNING を続けるため）
+        self.changed_conflict_lines = self._build_conflict_lines(skip_unchanged=True)
+
+    def row_getter(self, row: Any) -> Callable[[Any], tuple]:
+        """行の種類に応じたカラム順の値タプルの取り出し方（dict は row_values、行オブジェクトは row_attributes）"""
+        return self.row_values if isinstance(row, dict) else self.row_attributes
+
+    def iter_row_values(self, rows: Iterable[Any]) -> Iterator[tuple]:
+        """
+        行（dict または行オブジェクト）をカラム順の値タプルにして返す
+
+        取り出し方は最初の行で決める（1つの読み込み元の行は全て同じ種類のため）。
+        """
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return iter(())
+        return map(self.row_getter(first), chain((first,), rows))
+
+    def encode_values(self, rows: Sequence[Dict[str, Any]]) -> str:
+        """
+        複数行を列単位でまとめてエンコードし、VALUES句の本体を返す
+        （行ごとに encode_row を呼んだ結果を ",\n" で連結したものと同じ）
+
+        行をカラム順の値に分けて列ごとにエンコードし、行の組み立てと連結も join でまとめて行う。
+
+        Args:
+            rows: Dune結果の行（dict または行オブジェクト）
+
+        Returns:
+            "    (..., ...),\n    (..., ...)" 形式の文字列
+        """
+        if not rows:
+            return ""
+        if not isinstance(rows[0], dict):
+            values = list(map(self.row_attributes, rows))
+        else:
+            try:
+                # 省略可能なカラムも含めて全てのキーがある場合は itemgetter でまとめて取り出す
+                values = list(map(self._required_values, rows))
+            except KeyError:
+                values = list(map(self.row_values, rows))
+        columns = [encode(list(column)) for encode, column in zip(self._column_encoders, zip(*values))]
+        return "    (" + "),\n    (".join(map(", ".join, zip(*columns))) + ")"
+
+    def _build_insert_lines(self) -> List[str]:
+        """INSERT INTO とカラム一覧の行（COLUMNS_PER_LINE 個ずつ折り返す）"""
+        chunks = [
+            ", ".join(self.column_names[i:i + COLUMNS_PER_LINE])
+            for i in range(0, len(self.column_names), COLUMNS_PER_LINE)
+        ]
+        lines = [f"INSERT INTO {self.table}"]
+        for i, chunk in enumerate(chunks):
+            prefix = "    (" if i == 0 else "     "
+            suffix = ")" if i == len(chunks) - 1 else ","
+            lines.append(prefix + chunk + suffix)
+        return lines
+
+    def _build_conflict_lines(self, skip_unchanged: bool = False) -> List[str]:
+        """ON CONFLICT ... DO UPDATE SET の行"""
+        lines = [f"ON CONFLICT ({', '.join(self.conflict_columns)})", "DO UPDATE SET"]
+        lines.extend(f"    {column} = EXCLUDED.{column}," for column in self.update_columns)
+        if not skip_unchanged:
+            lines.append("    updated_at = CURRENT_TIMESTAMP;")
+            return lines
+        lines.append("    updated_at = CURRENT_TIMESTAMP")
+        lines.append(f"WHERE {self.changed_condition()}")
+        return lines
+
+    def changed_condition(self) -> str:
+        """既存の行と EXCLUDED の更新カラムのどれかが異なる（NULL同士は等しい）場合に真になるPostgreSQLの条件"""
+        existing = ", ".join(f"{self.table}.{column}" for column in self.update_columns)
+        excluded = ", ".join(f"EXCLUDED.{column}" for column in self.update_columns)
+        return f"({existing}) IS DISTINCT FROM ({excluded})"
+
+    def output_filename(self, output_format: str) -> str:
+        """出力形式に応じたSQLファイル名"""
+        return self.output_file.format(format=output_format)
+
+
+TABLE_SPECS: Dict[str, TableSpec] = {
+    table: TableSpec(table, **definition) for table, definition in TABLE_DEFINITIONS.items()
+}
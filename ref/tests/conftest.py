@@ -0,0 +1,107 @@
+"""
+ref/ のモジュールをテストから import できるようにし、テスト間で使う合成データの関数とフィクスチャを定義する
+"""
+
+import json
+import os
+import random
+import shutil
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import pytest
+
+REF_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REF_DIR, "Results")
+if REF_DIR not in sys.path:
+    sys.path.insert(0, REF_DIR)
+
+from table_specs import TableSpec  # noqa: E402
+
+
+def generate_earn_rows(row_count: int, vault_count: int = 100, seed: int = 0) -> List[Dict[str, Any]]:
+    """Result_Earn.json と同じ形式の合成行を生成（Vaultごとに1日1行、新しい日付から）"""
+    rng = random.Random(seed)
+    vaults = [
+        (f"0x{rng.getrandbits(160):040x}", f"V{i}USDC", f"0x{rng.getrandbits(160):040x}", "USDC.e")
+        for i in range(vault_count)
+    ]
+    start = datetime(2025, 10, 15)
+    rows = []
+    for i in range(row_count):
+        vault_address, vault_symbol, vault_asset, vault_asset_symbol = vaults[i % vault_count]
+        day = start - timedelta(days=i // vault_count)
+        rows.append({
+            "conversion_rate": 1 + rng.random() / 100,
+            "day": day.strftime("%Y-%m-%d 00:00:00.000 UTC"),
+            "delta_assets": rng.uniform(-1e5, 1e5),
+            "delta_shares": rng.uniform(-1e5, 1e5),
+            "total_shares": rng.uniform(0, 1e8),
+            "tvl_usd": rng.uniform(0, 1e8),
+            "vault_address": vault_address,
+            "vault_asset": vault_asset,
+            "vault_asset_symbol": vault_asset_symbol,
+            "vault_symbol": vault_symbol,
+        })
+    return rows
+
+
+def generate_spec_rows(spec: TableSpec, row_count: int, key_count: int = 100,
+                       seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    テーブル定義の型に従って合成行を生成
+
+    主キーのうち日付以外のカラムは key_count 種類の値を巡回し、日付は key_count 行ごとに1日ずつ遡る。
+    """
+    rng = random.Random(seed)
+    keys = [f"0x{rng.getrandbits(160):040x}" for _ in range(key_count)]
+    start = datetime(2025, 10, 15)
+    rows = []
+    for i in range(row_count):
+        day = (start - timedelta(days=i // key_count)).strftime("%Y-%m-%d 00:00:00.000 UTC")
+        key = keys[i % key_count]
+        row: Dict[str, Any] = {}
+        for column, column_type in spec.columns:
+            if column_type == "date":
+                row[column] = day[:10]
+            elif column_type == "timestamp":
+                row[column] = day
+            elif column_type == "text":
+                row[column] = key if column in spec.conflict_columns else f"SYM{i % key_count}"
+            elif column_type == "integer":
+                row[column] = rng.randrange(0, 1000000)
+            else:
+                row[column] = rng.uniform(0, 1e8)
+        rows.append(row)
+    return rows
+
+
+def write_result_file(path: str, rows: List[Dict[str, Any]], execution_id: str = "TEST"):
+    """Dune実行結果と同じ構造のJSONファイルを書き出す"""
+    data = {
+        "execution_id": execution_id,
+        "query_id": 0,
+        "state": "QUERY_STATE_COMPLETED",
+        "result": {
+            "rows": rows,
+            "metadata": {"column_names": list(rows[0]) if rows else [],
+                         "row_count": len(rows), "total_row_count": len(rows)},
+        },
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def strip_generated_comments(sql: str) -> str:
+    """生成時刻・読み込み元のコメント行を除く（出力の比較用）"""
+    return "\n".join(line for line in sql.splitlines()
+                     if not line.startswith(("-- Generated at:", "-- Source:")))
+
+
+@pytest.fixture
+def results_dir(tmp_path):
+    """コミット済みの Results/ の結果JSONを一時ディレクトリに複製（.npz は複製しない）"""
+    path = tmp_path / "Results"
+    shutil.copytree(RESULTS_DIR, path, ignore=shutil.ignore_patterns("*.npz"))
+    return str(path)
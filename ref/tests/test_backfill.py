@@ -0,0 +1,60 @@
+"""
+backfill.py: 同時実行数・失敗からの再実行に関係なく、期間内の全行を1つの結果に結合すること
+"""
+
+import contextlib
+import io
+import json
+import os
+from datetime import date
+
+import pytest
+
+from backfill import date_windows, run_backfill
+from conftest import generate_spec_rows
+from dune_query_executor import DuneAPIClient
+from fake_dune_server import FakeDuneServer
+from table_specs import TABLE_SPECS
+
+TABLE = "morpho_borrow_history"
+CONFIG = {"query_id": 1, "query_name": "Backfill Test", "table_name": TABLE,
+          "result_file": "Result_Backfill.json", "date_filter": "day"}
+START, END = date(2025, 10, 6), date(2025, 10, 16)
+
+
+def backfill(tmp_path, rows, max_in_flight, failure_rate=0.0, retries=3):
+    run_dir = str(tmp_path / f"run_{max_in_flight}_{failure_rate}")
+    with FakeDuneServer({1: rows}, execution_seconds=0, date_column_by_query={1: "day"},
+                        date_filter_by_query={1: "day"}, failure_rate=failure_rate, seed=3) as server, \
+            DuneAPIClient("test", base_url=server.base_url, pool_size=max_in_flight) as client, \
+            contextlib.redirect_stdout(io.StringIO()):
+        succeeded = run_backfill(client, [CONFIG], START, END, run_dir, os.path.join(run_dir, "work"),
+                                 max_in_flight=max_in_flight, retries=retries, backoff=0.01, seed=0)
+    return succeeded, os.path.join(run_dir, CONFIG["result_file"])
+
+
+def test_date_windows_cover_range():
+    windows = date_windows(START, END, 3)
+    assert windows[0][0] == START and windows[-1][1] == END
+    assert all(a[1] == b[0] for a, b in zip(windows, windows[1:]))
+
+
+@pytest.mark.parametrize("max_in_flight,failure_rate", [(1, 0.0), (4, 0.0), (4, 0.3)])
+def test_stitched_rows_match_source(tmp_path, max_in_flight, failure_rate):
+    # 期間の前後の日も含めて生成する（結合結果は期間内の行だけ）
+    rows = generate_spec_rows(TABLE_SPECS[TABLE], 14 * 5, key_count=5)
+    succeeded, result_file = backfill(tmp_path, rows, max_in_flight, failure_rate)
+    assert succeeded
+    with open(result_file, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+
+    expected = [row for row in rows if START.isoformat() <= row["day"][:10] < END.isoformat()]
+    assert result["result"]["rows"] == expected
+    assert result["backfill"]["windows"] == (END - START).days
+
+
+def test_failed_window_keeps_table_unsaved(tmp_path):
+    rows = generate_spec_rows(TABLE_SPECS[TABLE], 14 * 5, key_count=5)
+    succeeded, result_file = backfill(tmp_path, rows, 2, failure_rate=1.0, retries=1)
+    assert not succeeded
+    assert not os.path.exists(result_file)
@@ -0,0 +1,43 @@
+"""
+列指向キャッシュ（.npz）の保存・削除と、結果JSONとの対応の確認
+"""
+
+import json
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from columnar_cache import columnar_path, convert_result_file, is_columnar_fresh, load_columnar  # noqa: E402
+from conftest import generate_earn_rows, write_result_file  # noqa: E402
+from dune_query_executor import remove_columnar, save_columnar  # noqa: E402
+
+
+def write_results(path: str, execution_id: str):
+    write_result_file(path, generate_earn_rows(20, vault_count=4), execution_id=execution_id)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_save_and_remove_use_columnar_path(tmp_path):
+    result_file = str(tmp_path / "Result_Earn.json")
+    results = write_results(result_file, "EXEC1")
+
+    path = save_columnar(results, result_file)
+    assert path == columnar_path(result_file)
+    assert load_columnar(path).execution_id == "EXEC1"
+
+    assert remove_columnar(result_file) == path
+    assert not os.path.exists(path)
+    assert remove_columnar(result_file) is None
+
+
+def test_cache_is_stale_after_result_is_rewritten(tmp_path):
+    result_file = str(tmp_path / "Result_Earn.json")
+    write_results(result_file, "EXEC1")
+    convert_result_file(result_file)
+    assert is_columnar_fresh(result_file)
+
+    write_results(result_file, "EXEC2")
+    assert not is_columnar_fresh(result_file)
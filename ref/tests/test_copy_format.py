@@ -0,0 +1,71 @@
+"""
+COPY形式（--format copy）の値のエスケープとマージ文を確認する
+"""
+
+import io
+import re
+
+import pytest
+
+from conftest import generate_earn_rows, write_result_file
+from generate_migration_sql import SQLGenerator
+from table_specs import TABLE_SPECS
+
+TABLE = "morpho_earn_history"
+
+COPY_UNESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+
+
+def unescape_copy_value(field: str):
+    """COPY（text形式）の1フィールドを PostgreSQL と同じ規則で値に戻す"""
+    if field == "\\N":
+        return None
+    return re.sub(r"\\(.)", lambda match: COPY_UNESCAPES[match.group(1)], field)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, "\\N"),
+    ("\\N", "\\\\N"),
+    ("a\tb", "a\\tb"),
+    ("a\nb\r", "a\\nb\\r"),
+    ("C:\\path", "C:\\\\path"),
+    (1.5, "1.5"),
+    (0, "0"),
+])
+def test_escape_copy_value(value, expected):
+    assert SQLGenerator().escape_copy_value(value) == expected
+
+
+def test_copy_rows_round_trip_and_merge_sql(tmp_path):
+    rows = generate_earn_rows(6, vault_count=6)
+    rows[0]["vault_symbol"] = "\\N"
+    rows[1]["vault_symbol"] = "tab\there"
+    rows[2]["vault_symbol"] = "line\nbreak\r"
+    rows[3]["vault_symbol"] = "back\\slash"
+    rows[4]["vault_asset_symbol"] = None
+    path = str(tmp_path / "Result_Earn.json")
+    write_result_file(path, rows)
+
+    buffer = io.StringIO()
+    row_count = SQLGenerator(str(tmp_path)).write_table_copy(buffer, TABLE, path)
+    sql = buffer.getvalue()
+    assert row_count == len(rows)
+
+    spec = TABLE_SPECS[TABLE]
+    column_list = ", ".join(spec.column_names)
+    header = f"COPY staging_{TABLE} ({column_list}) FROM stdin;\n"
+    data = sql[sql.index(header) + len(header):sql.index("\\.\n")]
+    lines = data.split("\n")[:-1]
+    assert len(lines) == len(rows)
+    for line, row in zip(lines, rows):
+        fields = line.split("\t")
+        assert len(fields) == len(spec.columns)
+        expected = [None if value is None else str(value) for value in spec.row_values(row)]
+        assert [unescape_copy_value(field) for field in fields] == expected
+
+    merge = "\n".join([f"INSERT INTO {TABLE} ({column_list})",
+                       f"SELECT {column_list} FROM staging_{TABLE}",
+                       *spec.conflict_lines])
+    assert merge in sql
+    assert sql.index(merge) > sql.index("\\.\n")
+    assert sql.rstrip().endswith(f"DROP TABLE staging_{TABLE};")
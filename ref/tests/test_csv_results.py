@@ -0,0 +1,71 @@
+"""
+result_stream.py: CSV形式の結果が JSON形式と同じ行・同じSQLになること、
+型が分からないカラムはJSONの数値の文法に一致する値だけを数値にし、数値カラムの不正な値は行とカラムを示してエラーにすること
+"""
+
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+from conftest import generate_earn_rows, strip_generated_comments
+from dune_query_executor import DuneAPIClient
+from fake_dune_server import FakeDuneServer
+from generate_migration_sql import SQLGenerator
+from result_stream import CSVRowReader
+from table_specs import TABLE_SPECS
+
+
+def test_csv_results_match_json(tmp_path):
+    table = "morpho_earn_history"
+    rows = generate_earn_rows(2500)
+    generator = SQLGenerator()
+    json_file = os.path.join(tmp_path, "Result_Earn.json")
+    outputs = {name: os.path.join(tmp_path, f"{name}.sql") for name in ("json", "csv")}
+
+    with FakeDuneServer({1: rows}, execution_seconds=0) as server, \
+            DuneAPIClient("test", base_url=server.base_url) as client, \
+            contextlib.redirect_stdout(io.StringIO()):
+        execution_id = client.execute_query(1)
+        client.wait_for_execution(execution_id)
+
+        url = f"{server.base_url}/execution/{execution_id}/results/csv"
+        payload = client.session.get(url, params={"limit": len(rows)}).content
+        column_types = dict(TABLE_SPECS[table].columns)
+        assert list(CSVRowReader([io.StringIO(payload.decode("utf-8"))], column_types)) == rows
+
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(client.download_execution_results(execution_id), f, ensure_ascii=False)
+        with open(outputs["json"], 'w', encoding='utf-8') as f:
+            generator.write_table_sql(f, table, json_file)
+        with open(outputs["csv"], 'w', encoding='utf-8') as f:
+            generator.write_table_sql(f, table, client.stream_execution_results_csv(execution_id, table))
+
+    sql = {}
+    for name, path in outputs.items():
+        with open(path, 'r', encoding='utf-8') as f:
+            sql[name] = strip_generated_comments(f.read())
+    assert sql["json"] == sql["csv"]
+    assert sql["json"].count("INSERT INTO morpho_earn_history") > 1
+
+
+def read_csv(pages, column_types=None, batch_size=2):
+    return list(CSVRowReader([io.StringIO(page) for page in pages], column_types, batch_size=batch_size))
+
+
+def test_auto_columns_follow_json_number_grammar():
+    values = ["1", "-0", "1.5", "2e3", "-1.5E-7", "nan", "NaN", "inf", "-Infinity", "infinity",
+              "+1", "01", "1.", ".5", "0x10", "1_000", " 1", "N/A"]
+    rows = read_csv(["value\n" + "\n".join(values) + "\n"])
+    assert [row["value"] for row in rows] == [1, 0, 1.5, 2000.0, -1.5e-7] + values[5:]
+
+
+def test_invalid_number_names_row_and_column():
+    pages = ["day,tvl_usd\n2025-10-01,1.5\n2025-10-02,\n", "day,tvl_usd\n2025-10-03,2\n2025-10-04,N/A\n"]
+    with pytest.raises(ValueError, match=r"4行目のカラム tvl_usd の値 'N/A'"):
+        read_csv(pages, {"day": "date", "tvl_usd": "numeric"})
+
+    # 数値として解釈できる値は JSON より緩く受け付ける（先頭の + など）
+    assert read_csv(["n\n+1\n2\n"], {"n": "integer"}) == [{"n": 1}, {"n": 2}]
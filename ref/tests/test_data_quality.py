@@ -0,0 +1,110 @@
+"""
+data_quality.py: 入れた問題を全て検出すること、古い列指向キャッシュを読まないこと
+"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from columnar_cache import convert_result_file  # noqa: E402
+from conftest import RESULTS_DIR, write_result_file  # noqa: E402
+from data_quality import TableArrays, check_table, validate_results  # noqa: E402
+from table_specs import TABLE_SPECS  # noqa: E402
+
+EARN = TABLE_SPECS["morpho_earn_history"]
+
+
+def synthetic_quality_arrays(row_count: int, vaults: int, issues: int, seed: int = 0):
+    """
+    Earn履歴と同じ形の配列（vaults × days 行、値は対数正規の乱歩）に、主キーの重複・負の total_shares・
+    欠けた日・tvl_usd の一時的な急増をそれぞれ issues 件ずつ入れた TableArrays を作成
+    （benchmark.py の bench_quality と同じデータ）
+
+    Returns:
+        (TableArrays, チェックごとの期待される検出件数)
+    """
+    rng = np.random.default_rng(seed)
+    days = row_count // vaults
+    codes = np.repeat(np.arange(vaults), days)
+    day_ordinals = np.tile(np.arange(20000, 20000 + days), vaults)
+    numbers = {column: np.exp(np.cumsum(rng.normal(0, 0.01, len(codes))))
+               for column in ("conversion_rate", "total_shares", "tvl_usd")}
+
+    # 問題を入れる行（Vaultごとに40日おきに、種類ごとに日をずらす）
+    slots = [(j % vaults) * days + 100 + 40 * (j // vaults) for j in range(issues)]
+    if slots and max(slots) % days + 40 >= days:
+        raise ValueError("issues が多すぎます（vaults × days に収まりません）")
+    slots = np.array(slots, dtype=np.int64)
+    numbers["total_shares"][slots + 10] *= -1
+    numbers["tvl_usd"][slots + 20] *= 100
+    keep = np.ones(len(codes), dtype=bool)
+    keep[slots] = False
+    rows = np.concatenate([np.flatnonzero(keep), slots + 30])
+    rows = rows[rng.permutation(len(rows))]
+    arrays = TableArrays(EARN, "synthetic", {"vault_address": codes[rows]},
+                         {"vault_address": np.array([f"0x{i:040x}" for i in range(vaults)])},
+                         day_ordinals[rows], {column: values[rows] for column, values in numbers.items()})
+    # 急増した日は、急増と翌日の戻りの2件を検出する
+    expected = {"duplicate_keys": issues, "null_keys": 0, "negative_values": issues,
+                "date_gaps": issues, "change_outliers": 2 * issues}
+    return arrays, expected
+
+
+@pytest.mark.parametrize("issues", [0, 1, 12])
+def test_detects_injected_issues(issues):
+    arrays, expected = synthetic_quality_arrays(20000, vaults=20, issues=issues)
+    report = check_table(arrays)
+    assert {check["name"]: check["count"] for check in report["checks"]} == expected
+
+
+def test_detects_issues_in_result_file(tmp_path):
+    rows = [
+        {"day": "2025-10-03 00:00:00.000 UTC", "vault_address": "0xa", "total_shares": 1.0, "tvl_usd": 1.0,
+         "conversion_rate": 1.0, "delta_assets": 0.0, "delta_shares": 0.0},
+        {"day": "2025-10-01 00:00:00.000 UTC", "vault_address": "0xa", "total_shares": -1.0, "tvl_usd": 1.0,
+         "conversion_rate": 1.0, "delta_assets": 0.0, "delta_shares": 0.0},
+        {"day": "2025-10-01 00:00:00.000 UTC", "vault_address": "0xa", "total_shares": 1.0, "tvl_usd": 1.0,
+         "conversion_rate": 1.0, "delta_assets": 0.0, "delta_shares": 0.0},
+        {"day": "2025-10-01 00:00:00.000 UTC", "vault_address": None, "total_shares": 1.0, "tvl_usd": None,
+         "conversion_rate": 1.0, "delta_assets": 0.0, "delta_shares": 0.0},
+    ]
+    json_file = str(tmp_path / EARN.result_file)
+    write_result_file(json_file, rows)
+    counts = {check["name"]: check["count"] for check in check_table(TableArrays.from_rows(EARN, json_file))["checks"]}
+    assert counts["duplicate_keys"] == 1
+    assert counts["null_keys"] == 1
+    assert counts["negative_values"] == 1
+    assert counts["date_gaps"] == 1
+
+
+def test_committed_results_pass():
+    report = validate_results(RESULTS_DIR)
+    assert report["passed"]
+    assert set(report["tables"]) >= {"morpho_earn_history", "morpho_borrow_history"}
+
+
+def test_stale_columnar_cache_is_not_used(tmp_path):
+    results_dir = tmp_path / "Results"
+    results_dir.mkdir()
+    json_file = str(results_dir / EARN.result_file)
+    shutil.copy(os.path.join(RESULTS_DIR, EARN.result_file), json_file)
+    convert_result_file(json_file)
+    assert validate_results(str(results_dir))["passed"]
+
+    # 別の実行の結果JSON（主キーの重複あり）で上書きする
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data["execution_id"] = "01NEWEXECUTION"
+    data["result"]["rows"].append(dict(data["result"]["rows"][0]))
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.utime(os.path.join(results_dir, "Result_Earn.npz"))
+
+    report = validate_results(str(results_dir))
+    assert not report["passed"]
+    checks = {check["name"]: check["count"] for check in report["tables"]["morpho_earn_history"]["checks"]}
+    assert checks["duplicate_keys"] == 1
@@ -0,0 +1,94 @@
+"""
+db_loader.py: SQLiteへのロード結果と、--create-schema で TABLE_SPECS の全テーブルを作成すること、
+--skip-unchanged で値が同じ行を書き込まないこと
+"""
+
+import contextlib
+import io
+import json
+import os
+import re
+import sqlite3
+
+import db_loader
+from db_loader import ConnectionPool, run_load
+from table_specs import TABLE_SPECS
+
+REF_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RecordingConnection:
+    """実行したSQLを記録するだけのDB-API接続"""
+
+    def __init__(self, executed):
+        self.executed = executed
+
+    @contextlib.contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_create_schema_creates_every_loadable_table(monkeypatch, tmp_path):
+    executed = []
+    monkeypatch.setattr(db_loader, "create_postgres_pool",
+                        lambda dsn, size: ConnectionPool(lambda: RecordingConnection(executed), size))
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_load(str(tmp_path), dsn="postgresql://test", create_schema=True)
+
+    created = [set(re.findall(r"CREATE TABLE IF NOT EXISTS (\w+)", sql)) for sql in executed]
+    assert set().union(*created) >= set(TABLE_SPECS)
+    # wld_price_history は 01_create_schema.sql の関数（update_updated_at_column）を使うため後に作成する
+    assert "wld_price_history" not in created[0] and "wld_price_history" in created[-1]
+
+
+def test_sqlite_load(tmp_path):
+    sqlite_path = str(tmp_path / "load.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = run_load(os.path.join(REF_DIR, "Results"), sqlite_path=sqlite_path)
+
+    conn = sqlite3.connect(sqlite_path)
+    for result in results:
+        assert conn.execute(f"SELECT COUNT(*) FROM {result['table']}").fetchone()[0] == result["rows"]
+    conn.close()
+
+
+def load_quietly(results_dir, sqlite_path, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {result["table"]: result for result in run_load(results_dir, sqlite_path=sqlite_path, **kwargs)}
+
+
+def test_sqlite_reload_skips_unchanged_rows(results_dir, tmp_path):
+    sqlite_path = str(tmp_path / "load.db")
+    first = load_quietly(results_dir, sqlite_path, skip_unchanged=True)
+    assert all(result["written"] == result["rows"] and result["skipped"] == 0 for result in first.values())
+
+    second = load_quietly(results_dir, sqlite_path, skip_unchanged=True)
+    assert all(result["written"] == 0 and result["skipped"] == result["rows"] for result in second.values())
+
+    path = os.path.join(results_dir, "Result_Earn.json")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data["result"]["rows"][0]["tvl_usd"] += 1
+    data["result"]["rows"][1]["tvl_usd"] = None
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+    third = load_quietly(results_dir, sqlite_path, skip_unchanged=True)
+    earn = third["morpho_earn_history"]
+    assert (earn["written"], earn["skipped"]) == (2, earn["rows"] - 2)
+    assert all(result["written"] == 0 for table, result in third.items() if table != "morpho_earn_history")
+
+    conn = sqlite3.connect(sqlite_path)
+    row = data["result"]["rows"][0]
+    assert conn.execute("SELECT tvl_usd FROM morpho_earn_history WHERE day = ? AND vault_address = ?",
+                        (row["day"], row["vault_address"])).fetchone()[0] == row["tvl_usd"]
+    conn.close()
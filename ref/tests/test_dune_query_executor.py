@@ -0,0 +1,127 @@
+"""
+DuneAPIClient.run_query の中断からの再開を確認する（代替のDune APIサーバーを使用）
+"""
+
+import os
+
+import pytest
+import requests
+
+from dune_query_executor import DEFAULT_PAGE_SIZE, DuneAPIClient, ResultPageCheckpoint
+from fake_dune_server import FakeDuneServer
+
+QUERY_ID = 1
+# 3ページに分かれる行数
+ROWS = [{"day": f"2025-10-{i % 28 + 1:02d} 00:00:00.000 UTC", "value": i}
+        for i in range(2 * DEFAULT_PAGE_SIZE + 5)]
+
+
+@pytest.fixture
+def server():
+    with FakeDuneServer({QUERY_ID: ROWS}, execution_seconds=0.0) as server:
+        yield server
+
+
+def run_query(server: FakeDuneServer, checkpoint_dir: str):
+    with DuneAPIClient("test", base_url=server.base_url) as client:
+        return client.run_query(QUERY_ID, timeout=10, checkpoint_dir=checkpoint_dir)
+
+
+def test_interrupted_download_resumes_same_execution(server, tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    server.interrupt_results("FAKE00000001", after_pages=1)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        run_query(server, checkpoint_dir)
+    assert ResultPageCheckpoint.find_in_flight(checkpoint_dir, QUERY_ID) == "FAKE00000001"
+
+    execution_id, results, _ = run_query(server, checkpoint_dir)
+    assert execution_id == "FAKE00000001"
+    assert results["result"]["rows"] == ROWS
+    assert server.request_counts["execute"] == 1
+    # 1ページ目 + 失敗 + 再開後の2ページ（保存済みの1ページ目は取得し直さない）
+    assert server.request_counts["results"] == 4
+
+
+def test_expired_execution_is_discarded_and_executed_again(server, tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    server.interrupt_results("FAKE00000001", after_pages=1)
+    with pytest.raises(requests.exceptions.HTTPError):
+        run_query(server, checkpoint_dir)
+
+    # 再開時は COMPLETED のまま、続きのページの取得で期限切れ（410）になる
+    server.interrupt_results("FAKE00000001", after_pages=0, expire=True)
+    execution_id, results, _ = run_query(server, checkpoint_dir)
+    assert execution_id == "FAKE00000002"
+    assert results["result"]["rows"] == ROWS
+    assert server.request_counts["execute"] == 2
+    assert not os.path.exists(os.path.join(checkpoint_dir, "FAKE00000001"))
+    assert ResultPageCheckpoint.find_in_flight(checkpoint_dir, QUERY_ID) == "FAKE00000002"
+
+
+def test_expired_fresh_execution_discards_in_flight_record(server, tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    server.interrupt_results("FAKE00000001", after_pages=1, expire=True)
+
+    with pytest.raises(requests.exceptions.HTTPError) as excinfo:
+        run_query(server, checkpoint_dir)
+    assert excinfo.value.response.status_code == 410
+    assert ResultPageCheckpoint.find_in_flight(checkpoint_dir, QUERY_ID) is None
+    assert not os.path.exists(os.path.join(checkpoint_dir, "FAKE00000001"))
+
+
+def test_expired_state_stops_polling(server):
+    execution_id = server.execute(QUERY_ID)["execution_id"]
+    server.executions[execution_id].expired = True
+
+    with DuneAPIClient("test", base_url=server.base_url) as client:
+        assert not client.wait_for_execution(execution_id, timeout=10)
+        assert client.poll_stats[execution_id]["status_calls"] == 1
+        assert client.poll_stats[execution_id]["state"] == "QUERY_STATE_EXPIRED"
+
+
+def run_with_max_age(server: FakeDuneServer, max_age: float, params=None):
+    with DuneAPIClient("test", base_url=server.base_url) as client:
+        execution_id, results, _ = client.run_query(QUERY_ID, params, timeout=10, max_age=max_age)
+        return execution_id, results, client.reused_executions
+
+
+def test_fresh_latest_result_is_used_without_executing(server):
+    latest_id = server.add_completed_execution(QUERY_ID, age_seconds=60)
+
+    execution_id, results, reused = run_with_max_age(server, max_age=600)
+    assert execution_id == latest_id
+    assert results["result"]["rows"] == ROWS
+    assert server.request_counts["execute"] == 0
+    # 最初のページは query/{id}/results、続きは同じ実行の execution/{id}/results から取得する
+    assert server.request_counts["latest"] == 1 and server.request_counts["results"] == 2
+    assert 60 <= reused[latest_id] < 120
+
+
+def test_stale_latest_result_falls_back_to_execution(server):
+    stale_id = server.add_completed_execution(QUERY_ID, age_seconds=3600)
+
+    execution_id, results, reused = run_with_max_age(server, max_age=600)
+    assert execution_id != stale_id
+    assert results["result"]["rows"] == ROWS
+    assert server.request_counts["execute"] == 1
+    # 古い結果は最初のページだけで判断し、続きは取得しない
+    assert server.request_counts["latest"] == 1
+    assert reused == {}
+
+
+def test_missing_latest_result_falls_back_to_execution(server):
+    execution_id, results, reused = run_with_max_age(server, max_age=600)
+    assert execution_id is not None
+    assert results["result"]["rows"] == ROWS
+    assert server.request_counts["latest"] == 1 and server.request_counts["execute"] == 1
+    assert reused == {}
+
+
+def test_latest_result_is_not_checked_with_params(server):
+    server.add_completed_execution(QUERY_ID, age_seconds=60)
+
+    execution_id, _, reused = run_with_max_age(server, max_age=600, params={"p_date": "2025-10-01"})
+    assert server.executions[execution_id].parameters == {"p_date": "2025-10-01"}
+    assert server.request_counts["latest"] == 0 and server.request_counts["execute"] == 1
+    assert reused == {}
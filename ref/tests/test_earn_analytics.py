@@ -0,0 +1,109 @@
+"""
+earn_analytics.py: ベクトル化した指標が行ごとのループ（naive_earn_metrics）と一致すること、
+古い列指向キャッシュを読まないこと
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from columnar_cache import convert_result_file  # noqa: E402
+from conftest import RESULTS_DIR, generate_earn_rows, write_result_file  # noqa: E402
+from earn_analytics import EarnHistory  # noqa: E402
+
+
+def naive_earn_metrics(rows: List[Dict[str, Any]], windows=(1, 7, 30)) -> Dict[str, List[float]]:
+    """
+    earn_analytics.EarnHistory.metrics と同じ指標を行ごとのループで計算（テストの期待値）
+
+    結果は EarnHistory と同じ (Vault, 日付) 順に並べて返す。
+    """
+    vault_order: Dict[str, int] = {}
+    by_vault: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        vault_order.setdefault(row["vault_address"], len(vault_order))
+        by_vault.setdefault(row["vault_address"], []).append(row)
+
+    metrics: Dict[str, List[float]] = {"tvl_change": []}
+    for window in windows:
+        for name in ("apy", "net_flow", "rolling_tvl"):
+            metrics[f"{name}_{window}d"] = []
+
+    nan = float("nan")
+    for vault in sorted(by_vault, key=vault_order.get):
+        series = sorted(by_vault[vault], key=lambda row: row["day"])
+        ordinals = [datetime.strptime(row["day"][:10], "%Y-%m-%d").toordinal() for row in series]
+        for i, row in enumerate(series):
+            previous = series[i - 1] if i > 0 else None
+            metrics["tvl_change"].append(row["tvl_usd"] - previous["tvl_usd"] if previous else nan)
+            for window in windows:
+                # window 日以上前の最新の行
+                j = i - 1
+                while j >= 0 and ordinals[j] > ordinals[i] - window:
+                    j -= 1
+                if j >= 0:
+                    ratio = row["conversion_rate"] / series[j]["conversion_rate"]
+                    apy = ratio ** (365 / (ordinals[i] - ordinals[j])) - 1
+                else:
+                    apy = nan
+                metrics[f"apy_{window}d"].append(apy)
+
+                # 当日を含む直近 window 日間
+                flow = 0.0
+                tvl_total = 0.0
+                k = i
+                while k >= 0 and ordinals[k] > ordinals[i] - window:
+                    flow += series[k]["delta_assets"]
+                    tvl_total += series[k]["tvl_usd"]
+                    k -= 1
+                metrics[f"net_flow_{window}d"].append(flow)
+                metrics[f"rolling_tvl_{window}d"].append(tvl_total / (i - k))
+    return metrics
+
+
+
+@pytest.mark.parametrize("vaults", [1, 7])
+def test_metrics_match_naive_loop(vaults):
+    rows = generate_earn_rows(vaults * 120, vault_count=vaults)
+    # 日付の欠けもウィンドウの計算に含める
+    rows = [row for i, row in enumerate(rows) if i % 11 != 5]
+    expected = naive_earn_metrics(rows)
+    actual = EarnHistory.from_rows(rows).metrics()
+
+    assert set(actual) == set(expected)
+    for name, values in expected.items():
+        np.testing.assert_allclose(actual[name], values, rtol=1e-9, err_msg=name)
+
+
+def test_json_and_columnar_agree(tmp_path):
+    json_file = str(tmp_path / "Result_Earn.json")
+    shutil.copy(os.path.join(RESULTS_DIR, "Result_Earn.json"), json_file)
+    npz_file = convert_result_file(json_file)
+
+    from_json = EarnHistory.from_json(json_file).metrics()
+    from_columnar = EarnHistory.load(npz_file).metrics()
+    for name in from_json:
+        np.testing.assert_allclose(from_columnar[name], from_json[name], rtol=0, err_msg=name)
+
+
+def test_stale_columnar_cache_is_not_used(tmp_path):
+    json_file = str(tmp_path / "Result_Earn.json")
+    write_result_file(json_file, generate_earn_rows(30, vault_count=3))
+    convert_result_file(json_file)
+
+    rows = generate_earn_rows(60, vault_count=3, seed=1)
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data["execution_id"] = "NEWER"
+    data["result"]["rows"] = rows
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.utime(str(tmp_path / "Result_Earn.npz"))
+
+    assert len(EarnHistory.load(json_file)) == 60
@@ -0,0 +1,220 @@
+"""
+earn_replay.py: fixtures/earn・Result_Earn.json から作ったイベントの再計算結果が Result_Earn.json と一致すること、
+合成イベントで行ごとのループ（naive_earn_replay）と一致すること
+"""
+
+import json
+import math
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from conftest import REF_DIR, RESULTS_DIR
+from earn_replay import OUTPUT_COLUMNS, EarnReplay, replay_fixture
+
+FIXTURE_DIR = os.path.join(REF_DIR, "fixtures", "earn")
+RESULT_FILE = os.path.join(RESULTS_DIR, "Result_Earn.json")
+
+# fixtures/earn が対象とする期間（2025-10-08 は期首残高のイベントのみ）
+P_DATE = "2025-10-09"
+NUMERIC_COLUMNS = ["delta_assets", "delta_shares", "conversion_rate", "total_shares", "tvl_usd"]
+# 合成イベント・Result_Earn.json から作るイベントで使う資産の桁数
+FIXTURE_ASSET_DECIMALS = {"USDC.e": 6, "WBTC": 8, "WETH": 18, "WLD": 18}
+
+
+def expected_rows():
+    """Result_Earn.json のうち、fixtures/earn のVaultと期間に該当する行"""
+    with open(os.path.join(FIXTURE_DIR, "vaults.json"), 'r', encoding='utf-8') as f:
+        vaults = {vault["vault_address"] for vault in json.load(f)["result"]["rows"]}
+    with open(RESULT_FILE, 'r', encoding='utf-8') as f:
+        rows = json.load(f)["result"]["rows"]
+    return [row for row in rows if row["vault_address"] in vaults and row["day"] >= P_DATE]
+
+
+def test_replay_matches_result_earn():
+    expected = expected_rows()
+    actual = replay_fixture(FIXTURE_DIR, P_DATE)
+
+    assert len(expected) == 28
+    # 日付の降順・vault_symbol の昇順（クエリの order by と同じ）
+    assert [(row["day"], row["vault_address"]) for row in actual] == \
+        [(row["day"], row["vault_address"]) for row in expected]
+    for got, want in zip(actual, expected):
+        assert list(got) == OUTPUT_COLUMNS
+        for column in ("vault_symbol", "vault_asset", "vault_asset_symbol"):
+            assert got[column] == want[column]
+        for column in NUMERIC_COLUMNS:
+            # 生の値（整数）と double の変換による差だけを許容する
+            assert math.isclose(got[column], want[column], rel_tol=1e-9), (got["day"], got["vault_symbol"], column)
+
+
+def test_p_date_excludes_earlier_days():
+    rows = replay_fixture(FIXTURE_DIR)
+    assert min(row["day"] for row in rows) == "2025-10-08 00:00:00.000 UTC"
+    # 期首残高の日は前日の価格が無いため tvl_usd は NULL（Dune の left join と同じ）
+    assert all(row["tvl_usd"] is None for row in rows if row["day"].startswith("2025-10-08"))
+
+    assert len(replay_fixture(FIXTURE_DIR, "2025-10-15")) == 4
+    assert replay_fixture(FIXTURE_DIR, "2025-10-16") == []
+
+
+
+def generate_replay_events(vault_count: int, days: int, events_per_day: int,
+                           seed: int = 0) -> Dict[str, List[Dict[str, Any]]]:
+    """earn_replay 用の合成イベント（Vaultごとに毎日 events_per_day 件の入金・出金）"""
+    rng = random.Random(seed)
+    symbols = list(FIXTURE_ASSET_DECIMALS)
+    assets = {symbol: f"0x{rng.getrandbits(160):040x}" for symbol in symbols}
+    vaults = []
+    for i in range(vault_count):
+        symbol = symbols[i % len(symbols)]
+        vaults.append({
+            "vault_address": f"0x{rng.getrandbits(160):040x}",
+            "vault_asset": assets[symbol],
+            "vault_symbol": f"V{i}{symbol}",
+            "vault_asset_symbol": symbol,
+            "vault_asset_decimals": FIXTURE_ASSET_DECIMALS[symbol],
+        })
+
+    start = datetime(2025, 10, 15) - timedelta(days=days)
+    deposits: List[Dict[str, Any]] = []
+    withdraws: List[Dict[str, Any]] = []
+    prices = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        for symbol, asset in assets.items():
+            prices.append({"day": day.strftime("%Y-%m-%d 00:00:00.000 UTC"),
+                           "contract_address": asset, "price": rng.uniform(0.5, 5000)})
+        for vault in vaults:
+            rate = 1 + d / 10000
+            for e in range(events_per_day):
+                shares = rng.randrange(10 ** 15, 10 ** 21)
+                event = {
+                    "evt_block_time": day.strftime(f"%Y-%m-%d {e % 24:02d}:00:00.000 UTC"),
+                    "contract_address": vault["vault_address"],
+                    "assets": str(int(shares * rate) // 10 ** (18 - vault["vault_asset_decimals"])),
+                    "shares": str(shares),
+                }
+                # 4件に1件は出金（入金の方が多いため残高は正のまま）
+                (withdraws if e % 4 == 3 else deposits).append(event)
+    return {"vaults": vaults, "deposits": deposits, "withdraws": withdraws, "prices": prices}
+
+
+def naive_earn_replay(fixture: Dict[str, List[Dict[str, Any]]]) -> Dict[tuple, Dict[str, Any]]:
+    """Query_Earn のCTEを行ごとのループでそのまま計算（テストの期待値）"""
+    vaults = {vault["vault_address"]: vault for vault in fixture["vaults"]}
+    prices = {(price["contract_address"], price["day"][:10]): price["price"] for price in fixture["prices"]}
+
+    daily: Dict[tuple, List[float]] = {}
+    for events, sign in ((fixture["deposits"], 1), (fixture["withdraws"], -1)):
+        for event in events:
+            vault = vaults[event["contract_address"]]
+            sums = daily.setdefault((event["contract_address"], event["evt_block_time"][:10]), [0.0, 0.0])
+            sums[0] += sign * float(int(event["assets"])) / 10.0 ** vault["vault_asset_decimals"]
+            sums[1] += sign * float(int(event["shares"])) / 1e18
+
+    result: Dict[tuple, Dict[str, Any]] = {}
+    total_shares: Dict[str, float] = {}
+    for (address, day), (delta_assets, delta_shares) in sorted(daily.items()):
+        total_shares[address] = total_shares.get(address, 0.0) + delta_shares
+        conversion_rate = delta_assets / delta_shares
+        previous_day = (datetime.strptime(day, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        price = prices.get((vaults[address]["vault_asset"], previous_day))
+        result[(address, day)] = {
+            "delta_assets": delta_assets,
+            "delta_shares": delta_shares,
+            "conversion_rate": conversion_rate,
+            "total_shares": total_shares[address],
+            "tvl_usd": None if price is None else price * total_shares[address] * conversion_rate,
+        }
+    return result
+
+
+def build_replay_fixture(result_rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Result_Earn.json の行から、同じ結果になる入金・出金イベントと価格を作成（earn_replay の検証用）
+
+    各Vaultの日次の delta_assets / delta_shares を1件のイベントにし、最初の日の前日に
+    それ以前の残高分のイベントを置く。価格は tvl_usd / (total_shares × conversion_rate) から逆算する。
+    """
+    vaults: Dict[str, Dict[str, Any]] = {}
+    deposits: List[Dict[str, Any]] = []
+    withdraws: List[Dict[str, Any]] = []
+    prices: List[Dict[str, Any]] = []
+    by_vault: Dict[str, List[Dict[str, Any]]] = {}
+    for row in result_rows:
+        by_vault.setdefault(row["vault_address"], []).append(row)
+
+    def add_event(vault: Dict[str, Any], day: datetime, assets: float, shares: float):
+        event = {
+            "evt_block_time": day.strftime("%Y-%m-%d 12:00:00.000 UTC"),
+            "contract_address": vault["vault_address"],
+            "assets": str(round(abs(assets) * 10 ** vault["vault_asset_decimals"])),
+            "shares": str(round(abs(shares) * 10 ** 18)),
+        }
+        (deposits if shares >= 0 else withdraws).append(event)
+
+    for address, rows in by_vault.items():
+        rows.sort(key=lambda row: row["day"])
+        first = rows[0]
+        vault = vaults[address] = {
+            "vault_address": address,
+            "vault_asset": first["vault_asset"],
+            "vault_symbol": first["vault_symbol"],
+            "vault_asset_symbol": first["vault_asset_symbol"],
+            "vault_asset_decimals": FIXTURE_ASSET_DECIMALS[first["vault_asset_symbol"]],
+        }
+        opening_day = datetime.strptime(first["day"][:10], "%Y-%m-%d") - timedelta(days=1)
+        opening_shares = first["total_shares"] - first["delta_shares"]
+        if opening_shares > 0:
+            add_event(vault, opening_day, opening_shares * first["conversion_rate"], opening_shares)
+        for row in rows:
+            day = datetime.strptime(row["day"][:10], "%Y-%m-%d")
+            add_event(vault, day, row["delta_assets"], row["delta_shares"])
+            if row["tvl_usd"] is not None:
+                prices.append({
+                    "day": (day - timedelta(days=1)).strftime("%Y-%m-%d 00:00:00.000 UTC"),
+                    "contract_address": row["vault_asset"],
+                    "price": row["tvl_usd"] / (row["total_shares"] * row["conversion_rate"]),
+                })
+
+    # 資産ごと・日ごとに1件にする（同じ資産の Vault は同じ価格になる前提）
+    unique_prices = {(price["contract_address"], price["day"]): price for price in prices}
+    return {"vaults": list(vaults.values()), "deposits": deposits, "withdraws": withdraws,
+            "prices": list(unique_prices.values())}
+
+
+def assert_rows_close(expected: List[Dict[str, Any]], actual: List[Dict[str, Any]], rel_tol: float):
+    """(Vault, 日付) ごとに対応する行の数値列が rel_tol 以内で一致すること（NULL は両方 NULL）"""
+    actual_by_key = {(row["vault_address"], row["day"][:10]): row for row in actual}
+    assert len(actual_by_key) == len(expected)
+    for row in expected:
+        other = actual_by_key[(row["vault_address"], row["day"][:10])]
+        for column in NUMERIC_COLUMNS:
+            if row[column] is None or other[column] is None:
+                assert row[column] is other[column], column
+            else:
+                assert math.isclose(row[column], other[column], rel_tol=rel_tol), (row["day"], column)
+
+
+def test_replay_reproduces_all_result_earn_rows():
+    with open(RESULT_FILE, 'r', encoding='utf-8') as f:
+        expected = json.load(f)["result"]["rows"]
+    fixture = build_replay_fixture(expected)
+    p_date = min(row["day"] for row in expected)[:10]
+    actual = EarnReplay(fixture["vaults"], fixture["prices"]).replay(fixture["deposits"], fixture["withdraws"], p_date)
+
+    assert [(row["day"], row["vault_address"]) for row in actual] == \
+        [(row["day"], row["vault_address"]) for row in expected]
+    assert_rows_close(expected, actual, rel_tol=1e-9)
+
+
+def test_replay_matches_naive_loop():
+    fixture = generate_replay_events(vault_count=6, days=90, events_per_day=4)
+    actual = EarnReplay(fixture["vaults"], fixture["prices"]).replay(fixture["deposits"], fixture["withdraws"])
+    expected = [dict(values, vault_address=address, day=day)
+                for (address, day), values in naive_earn_replay(fixture).items()]
+
+    assert len(actual) == 6 * 90
+    assert_rows_close(expected, actual, rel_tol=1e-12)
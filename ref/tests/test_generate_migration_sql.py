@@ -0,0 +1,80 @@
+"""
+SQLGenerator の出力がコミット済みの migration_sql/ と一致することを確認する
+"""
+
+import io
+import os
+import re
+
+import pytest
+
+from conftest import REF_DIR, RESULTS_DIR, strip_generated_comments
+from generate_migration_sql import BATCH_SIZE, SQLGenerator
+from table_specs import TABLE_SPECS
+
+MIGRATION_DIR = os.path.join(REF_DIR, "migration_sql")
+
+
+@pytest.mark.parametrize("method, json_file, sql_file", [
+    ("generate_collateral_sql", "Result_Collateral.json", "02_insert_collateral.sql"),
+    ("generate_borrow_sql", "Result_Borrow.json", "03_insert_borrow.sql"),
+    ("generate_dex_sql", "Result_DEX.json", "04_insert_dex.sql"),
+    ("generate_earn_sql", "Result_Earn.json", "05_insert_earn.sql"),
+])
+def test_table_sql_wrappers_match_committed_sql(method, json_file, sql_file):
+    generator = SQLGenerator(RESULTS_DIR)
+    sql = getattr(generator, method)(os.path.join(RESULTS_DIR, json_file))
+    with open(os.path.join(MIGRATION_DIR, sql_file), 'r', encoding='utf-8') as f:
+        expected = f.read()
+    assert strip_generated_comments(sql) == strip_generated_comments(expected)
+
+
+def read_tree(directory: str) -> dict:
+    """ディレクトリ以下のファイルの内容（生成時刻・読み込み元のコメント行を除く）"""
+    contents = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, 'r', encoding='utf-8') as f:
+                contents[os.path.relpath(path, directory)] = strip_generated_comments(f.read())
+    return contents
+
+
+@pytest.mark.parametrize("output_format", ["insert", "copy"])
+def test_parallel_generation_matches_sequential(tmp_path, output_format):
+    generator = SQLGenerator(RESULTS_DIR)
+    sequential = str(tmp_path / "jobs1")
+    parallel = str(tmp_path / "jobs3")
+    generator.generate_all(output_format, jobs=1, output_dir=sequential)
+    generator.generate_all(output_format, jobs=3, output_dir=parallel)
+
+    expected = read_tree(sequential)
+    assert len(expected) > 1
+    assert read_tree(parallel) == expected
+
+
+@pytest.mark.parametrize("output_format", ["insert", "copy"])
+def test_skip_unchanged_sql(tmp_path, output_format):
+    table = "morpho_earn_history"
+    json_file = os.path.join(RESULTS_DIR, "Result_Earn.json")
+    generator = SQLGenerator(RESULTS_DIR, skip_unchanged=True)
+    buffer = io.StringIO()
+    write = generator.write_table_copy if output_format == "copy" else generator.write_table_sql
+    row_count = write(buffer, table, json_file)
+    sql = buffer.getvalue()
+
+    spec = TABLE_SPECS[table]
+    statements = sql.count("WITH upserted AS (")
+    assert statements == (1 if output_format == "copy" else -(-row_count // BATCH_SIZE))
+    assert sql.count("\n".join(spec.changed_conflict_lines) + "\nRETURNING 1\n)\n") == statements
+    assert "IS DISTINCT FROM" in spec.changed_conflict_lines[-1]
+    # バッチごとの行数から、書き込み行数とスキップ行数を返す
+    counts = re.findall(rf"SELECT '{table}' AS table_name, (\d+) AS source_rows, count\(\*\) AS written_rows, "
+                        r"(\d+) - count\(\*\) AS skipped_rows FROM upserted;", sql)
+    assert len(counts) == statements
+    assert sum(int(source) for source, _ in counts) == row_count
+    assert all(source == skipped for source, skipped in counts)
+
+    plain = io.StringIO()
+    getattr(SQLGenerator(RESULTS_DIR), write.__name__)(plain, table, json_file)
+    assert "IS DISTINCT FROM" not in plain.getvalue() and "upserted" not in plain.getvalue()
@@ -0,0 +1,98 @@
+"""
+RecordingTracer のスパンの親子関係と属性（run_query・SQL生成の計測を含む）
+"""
+
+import io
+import threading
+
+import pytest
+
+from conftest import generate_earn_rows, write_result_file
+from dune_query_executor import DuneAPIClient
+from fake_dune_server import FakeDuneServer
+from generate_migration_sql import BATCH_SIZE, SQLGenerator
+from instrumentation import RecordingTracer
+
+
+def by_name(records):
+    spans = {}
+    for record in records:
+        spans.setdefault(record["name"], []).append(record)
+    return spans
+
+
+def test_nested_spans_record_parent_attributes_and_error():
+    records = []
+    tracer = RecordingTracer(records.append)
+    with tracer.span("outer", table="t") as outer:
+        with tracer.span("inner") as inner:
+            inner.set(rows=3)
+        with pytest.raises(ValueError):
+            with tracer.span("failing"):
+                raise ValueError("bad row")
+        outer.set(done=True)
+
+    spans = {record["name"]: record for record in records}
+    assert [record["name"] for record in records] == ["inner", "failing", "outer"]
+    assert spans["outer"]["parent_id"] is None
+    assert spans["inner"]["parent_id"] == spans["failing"]["parent_id"] == spans["outer"]["span_id"]
+    assert spans["outer"]["attributes"] == {"table": "t", "done": True}
+    assert spans["inner"]["attributes"] == {"rows": 3}
+    assert spans["failing"]["error"] == "ValueError: bad row"
+    assert spans["outer"]["error"] is None
+    assert all(record["duration_seconds"] >= 0 and record["completed_at"] >= record["started_at"]
+               for record in records)
+
+
+def test_spans_in_other_threads_are_not_children():
+    records = []
+    tracer = RecordingTracer(records.append)
+
+    def worker():
+        with tracer.span("worker"):
+            pass
+
+    with tracer.span("main"):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+    assert by_name(records)["worker"][0]["parent_id"] is None
+
+
+def test_run_query_span_tree():
+    rows = [{"day": "2025-10-15 00:00:00.000 UTC", "value": i} for i in range(5)]
+    records = []
+    with FakeDuneServer({1: rows}, execution_seconds=0.0) as server, \
+            DuneAPIClient("test", base_url=server.base_url, tracer=RecordingTracer(records.append)) as client:
+        execution_id, _, _ = client.run_query(1, {"p_date": "2025-10-15"}, timeout=10, query_name="test")
+
+    spans = by_name(records)
+    query = spans["dune.query"][0]
+    assert query["parent_id"] is None
+    assert query["attributes"] == {
+        "query_id": 1, "query_name": "test", "execution_date": "2025-10-15", "execution_id": execution_id,
+        "cache_hit": False, "reused_latest": False, "status": "COMPLETED", "row_count": 5, "error_message": None,
+    }
+    for name in ("dune.execute", "dune.wait", "dune.download"):
+        assert spans[name][0]["parent_id"] == query["span_id"], name
+    assert spans["dune.poll"][0]["parent_id"] == spans["dune.wait"][0]["span_id"]
+    assert spans["dune.poll"][0]["attributes"]["state"] == "QUERY_STATE_COMPLETED"
+    page = spans["dune.results_page"][0]
+    assert page["parent_id"] == spans["dune.download"][0]["span_id"]
+    assert page["attributes"]["rows"] == 5 and page["attributes"]["bytes"] > 0
+    assert spans["dune.download"][0]["attributes"]["rows"] == 5
+
+
+def test_sql_generation_spans(tmp_path):
+    json_file = str(tmp_path / "Result_Earn.json")
+    write_result_file(json_file, generate_earn_rows(BATCH_SIZE + 1, vault_count=10))
+    records = []
+    SQLGenerator(str(tmp_path), tracer=RecordingTracer(records.append)).write_table_sql(
+        io.StringIO(), "morpho_earn_history", json_file)
+
+    spans = by_name(records)
+    table = spans["sql.table"][0]
+    assert table["attributes"]["rows"] == BATCH_SIZE + 1
+    assert [batch["attributes"]["rows"] for batch in spans["sql.batch"]] == [BATCH_SIZE, 1]
+    assert all(batch["parent_id"] == table["span_id"] for batch in spans["sql.batch"])
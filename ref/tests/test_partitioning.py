@@ -0,0 +1,47 @@
+"""
+partitioning.py: パーティション化したスキーマの DEFAULT パーティション・BRINインデックスと、必要な PostgreSQL のバージョンの記載
+"""
+
+import os
+import re
+
+from conftest import REF_DIR, RESULTS_DIR, strip_generated_comments
+from generate_migration_sql import SQLGenerator
+from partitioning import (HISTORY_TABLES, MIN_POSTGRES_VERSION, date_index_sql, default_partition_sql,
+                          partition_clause)
+
+
+def test_partition_parts_are_separate():
+    for table in HISTORY_TABLES:
+        assert "PARTITION" not in date_index_sql(table, "month")
+        assert "USING BRIN" in date_index_sql(table, "month")
+        assert default_partition_sql(table, "month") == \
+            f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;"
+        assert default_partition_sql(table, None) == partition_clause(table, None) == ""
+
+
+def test_partitioned_schema():
+    schema = SQLGenerator(RESULTS_DIR).generate_schema_sql("month", {"morpho_earn_history": "2025-04-30"})
+
+    assert schema.splitlines()[2] == \
+        f"-- Requires PostgreSQL {MIN_POSTGRES_VERSION} or later (row-level BEFORE UPDATE triggers on partitioned tables)"
+    for table, (column, _) in HISTORY_TABLES.items():
+        # DEFAULT パーティションは親テーブルの直後、インデックスより前に作成する
+        match = re.search(rf"CREATE TABLE IF NOT EXISTS {table} \(.*?\) PARTITION BY RANGE \({column}\);\n"
+                          rf"{re.escape(default_partition_sql(table, 'month'))}\n\n"
+                          rf"{re.escape(date_index_sql(table, 'month'))}\n", schema, re.DOTALL)
+        assert match, table
+    assert "SELECT create_history_partitions('morpho_earn_history', DATE '2025-04-30'" in schema
+
+
+def test_unpartitioned_schema_is_unchanged():
+    schema = SQLGenerator(RESULTS_DIR).generate_schema_sql()
+    with open(os.path.join(REF_DIR, "migration_sql", "01_create_schema.sql"), 'r', encoding='utf-8') as f:
+        assert strip_generated_comments(schema) == strip_generated_comments(f.read())
+    assert "PostgreSQL 13" not in schema
+
+
+def test_generated_readme_mentions_minimum_version(tmp_path):
+    SQLGenerator(RESULTS_DIR).generate_all(output_dir=str(tmp_path), partition_by="year")
+    with open(tmp_path / "README.md", 'r', encoding='utf-8') as f:
+        assert f"PostgreSQL {MIN_POSTGRES_VERSION} 以上が必要です" in f.read()
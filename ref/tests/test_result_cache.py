@@ -0,0 +1,95 @@
+"""
+ResultCache のヒット・ミス・有効期限・サイズ上限による削除（時刻は差し替えた clock で進める）
+"""
+
+from datetime import datetime, timezone
+
+from result_cache import ResultCache
+
+QUERY_ID = 1
+# 2025-10-15 12:00:00 UTC
+NOON = datetime(2025, 10, 15, 12, tzinfo=timezone.utc).timestamp()
+
+
+class Clock:
+    def __init__(self, now: float = NOON):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def results(execution_id: str, size: int = 10):
+    return {"execution_id": execution_id, "result": {"rows": [{"value": "x" * size}]}}
+
+
+def test_hit_and_miss(tmp_path):
+    cache = ResultCache(str(tmp_path), ttl=3600, clock=Clock())
+    params = {"p_date": "2025-10-14"}
+    assert cache.get(QUERY_ID, params) is None
+    cache.put(QUERY_ID, params, results("A"))
+
+    assert cache.get(QUERY_ID, {"p_date": "2025-10-14"})["execution_id"] == "A"
+    assert cache.get(QUERY_ID, {"p_date": "2025-10-13"}) is None
+    assert cache.get(QUERY_ID + 1, params) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 3
+
+    # インデックスはディスクに保存され、別のインスタンスからも使える
+    assert ResultCache(str(tmp_path), clock=Clock()).get(QUERY_ID, params)["execution_id"] == "A"
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    clock = Clock()
+    cache = ResultCache(str(tmp_path), ttl=600, clock=clock)
+    cache.put(QUERY_ID, {"p_date": "2025-10-14"}, results("A"))
+
+    clock.now += 600
+    assert cache.get(QUERY_ID, {"p_date": "2025-10-14"}) is not None
+    clock.now += 1
+    assert cache.get(QUERY_ID, {"p_date": "2025-10-14"}) is None
+    assert cache.stats["expired"] == 1
+    assert cache.index == {}
+
+
+def test_implicit_today_is_part_of_key(tmp_path):
+    clock = Clock()
+    cache = ResultCache(str(tmp_path), ttl=24 * 3600, clock=clock)
+    cache.put(QUERY_ID, None, results("TODAY"))
+    cache.put(QUERY_ID, {"p_date": "2025-10-15"}, results("P_DATE"))
+    assert cache.get(QUERY_ID, None)["execution_id"] == "TODAY"
+
+    # 有効期限内でも、UTCの日付が変わると p_date を指定しない実行のキャッシュは使わない
+    clock.now += 12 * 3600
+    assert cache.get(QUERY_ID, None) is None
+    assert cache.get(QUERY_ID, {"p_date": "2025-10-15"})["execution_id"] == "P_DATE"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    clock = Clock()
+    cache = ResultCache(str(tmp_path), ttl=3600, max_bytes=10 ** 6, clock=clock)
+    for name in ("A", "B", "C"):
+        cache.put(QUERY_ID, {"p_date": name}, results(name, size=1000))
+        clock.now += 1
+    entry_bytes = cache.index[next(iter(cache.index))]["bytes"]
+
+    cache.get(QUERY_ID, {"p_date": "A"})
+    clock.now += 1
+    cache.max_bytes = 3 * entry_bytes
+    cache.put(QUERY_ID, {"p_date": "D"}, results("D", size=1000))
+
+    # 最後に参照された時刻が最も古い B が削除される
+    assert cache.stats["evictions"] == 1
+    assert cache.get(QUERY_ID, {"p_date": "B"}) is None
+    assert all(cache.get(QUERY_ID, {"p_date": name}) is not None for name in ("A", "C", "D"))
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_expired_entries_are_evicted_on_put(tmp_path):
+    clock = Clock()
+    cache = ResultCache(str(tmp_path), ttl=60, clock=clock)
+    cache.put(QUERY_ID, {"p_date": "A"}, results("A"))
+    clock.now += 61
+    cache.put(QUERY_ID, {"p_date": "B"}, results("B"))
+
+    assert cache.stats["evictions"] == 1
+    assert [entry["params"] for entry in cache.index.values()] == [{"p_date": "B"}]
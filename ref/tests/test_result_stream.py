@@ -0,0 +1,60 @@
+"""
+result_stream.py: チャンクの境界に関係なく json.load と同じ行を返すこと、
+SQLGenerator の出力もチャンクの大きさに依存しないこと
+"""
+
+import io
+import json
+
+import pytest
+
+from conftest import generate_earn_rows, strip_generated_comments, write_result_file
+from generate_migration_sql import SQLGenerator
+from result_stream import ResultRowReader, iter_result_rows
+
+TRICKY_ROWS = [
+    {"symbol": "a\"b\\c", "note": "改行\nタブ\t", "escaped": "éあ", "value": -1.5e-7, "flag": True},
+    {"symbol": "}]{[,:", "note": None, "escaped": "\\u0041", "value": 12345678901234567890, "flag": False},
+    {"symbol": "", "note": {"nested": [1, {"x": "]"}]}, "escaped": "😀", "value": 0, "flag": None},
+]
+
+
+@pytest.fixture
+def tricky_file(tmp_path):
+    path = tmp_path / "Result.json"
+    # rows より前に入れ子のオブジェクト・配列を置き、読み飛ばしも確認する
+    data = {"execution_id": "01TEST", "extra": {"rows": [1, 2], "s": "\"result\""},
+            "result": {"metadata": {"column_names": list(TRICKY_ROWS[0])}, "rows": TRICKY_ROWS}}
+    path.write_text(json.dumps(data, indent=1), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 64, 4096])
+def test_rows_do_not_depend_on_chunk_size(tricky_file, chunk_size):
+    assert list(ResultRowReader(tricky_file, chunk_size)) == TRICKY_ROWS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 4096])
+def test_result_file_matches_json_load(tmp_path, chunk_size):
+    json_file = str(tmp_path / "Result_Earn.json")
+    write_result_file(json_file, generate_earn_rows(300))
+    with open(json_file, 'r', encoding='utf-8') as f:
+        expected = json.load(f)["result"]["rows"]
+    assert list(iter_result_rows(json_file, chunk_size)) == expected
+
+
+def test_empty_rows(tmp_path):
+    json_file = str(tmp_path / "Result.json")
+    write_result_file(json_file, [])
+    assert list(ResultRowReader(json_file, 1)) == []
+
+
+def test_sql_does_not_depend_on_chunk_size(tmp_path):
+    json_file = str(tmp_path / "Result_Earn.json")
+    write_result_file(json_file, generate_earn_rows(2500))
+
+    default, small = io.StringIO(), io.StringIO()
+    SQLGenerator().write_table_sql(default, "morpho_earn_history", json_file)
+    SQLGenerator().write_table_sql(small, "morpho_earn_history", ResultRowReader(json_file, 7))
+    assert strip_generated_comments(default.getvalue()) == strip_generated_comments(small.getvalue())
+    assert default.getvalue().count("INSERT INTO morpho_earn_history") == 3
@@ -0,0 +1,45 @@
+"""
+row_model.py: 行オブジェクトから生成したSQLが dict の行からのSQLと同じになり、
+day_ordinal がテーブル定義の日付カラム（TableSpec.date_column）から求まること
+"""
+
+import io
+from datetime import date
+
+import pytest
+
+from conftest import generate_spec_rows, strip_generated_comments, write_result_file
+from generate_migration_sql import SQLGenerator
+from result_stream import ResultRowReader
+from row_model import TableRowSet, load_row_set
+from table_specs import TABLE_SPECS
+
+
+@pytest.fixture(params=list(TABLE_SPECS))
+def table_file(request, tmp_path):
+    spec = TABLE_SPECS[request.param]
+    json_file = str(tmp_path / spec.result_file)
+    write_result_file(json_file, generate_spec_rows(spec, 1200, key_count=1 if len(spec.conflict_columns) == 1 else 40))
+    return request.param, json_file
+
+
+def test_row_objects_generate_same_sql(table_file):
+    table, json_file = table_file
+
+    outputs = []
+    for rows in (TableRowSet(table, list(ResultRowReader(json_file))), load_row_set(table, json_file)):
+        buffer = io.StringIO()
+        SQLGenerator().write_table_sql(buffer, table, rows)
+        outputs.append(strip_generated_comments(buffer.getvalue()))
+    assert outputs[0] == outputs[1]
+
+
+def test_day_ordinal_uses_spec_date_column(table_file):
+    table, json_file = table_file
+    spec = TABLE_SPECS[table]
+    assert spec.date_column in spec.conflict_columns
+    assert dict(spec.columns)[spec.date_column] in ("timestamp", "date")
+
+    row_set = load_row_set(table, json_file)
+    assert row_set.day_ordinals() == [date.fromisoformat(row[spec.date_column][:10]).toordinal()
+                                      for row in ResultRowReader(json_file)]
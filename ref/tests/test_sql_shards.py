@@ -0,0 +1,69 @@
+"""
+sql_shards.py: シャードの行を合わせると分割しない場合の行と一致し、同じ主キーの行が複数のシャードに分かれないこと
+"""
+
+import os
+
+import pytest
+
+from conftest import RESULTS_DIR
+from generate_migration_sql import SQLGenerator
+from result_stream import ResultRowReader
+from sql_shards import LOADER_SCRIPT, SHARD_DIR, ShardRouter, date_boundaries, shard_filename
+from table_specs import TABLE_SPECS
+
+SHARDS = 4
+TABLES = [table for table, spec in TABLE_SPECS.items()
+          if os.path.exists(os.path.join(RESULTS_DIR, spec.result_file))]
+
+
+@pytest.mark.parametrize("strategy", ["key", "date"])
+@pytest.mark.parametrize("table", TABLES)
+def test_shards_partition_rows_by_primary_key(table, strategy):
+    spec = TABLE_SPECS[table]
+    json_file = os.path.join(RESULTS_DIR, spec.result_file)
+    boundaries = date_boundaries(spec, json_file, SHARDS) if strategy == "date" else []
+    router = ShardRouter(table, SHARDS, strategy, boundaries)
+    rows = list(ResultRowReader(json_file))
+
+    shard_of_key = {}
+    sharded = []
+    for shard in range(SHARDS):
+        for row in router.filter(shard)(rows):
+            key = tuple(row[column] for column in spec.conflict_columns)
+            assert shard_of_key.setdefault(key, shard) == shard, key
+            sharded.append(row)
+
+    assert len(sharded) == len(rows)
+    assert sorted(map(spec.row_values, sharded), key=repr) == sorted(map(spec.row_values, rows), key=repr)
+
+
+def values_lines(path: str):
+    """SQLファイルの各INSERT文の VALUES の行（末尾のカンマを除く）"""
+    lines = []
+    in_values = False
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f.read().splitlines():
+            if line == "VALUES":
+                in_values = True
+            elif line.startswith("ON CONFLICT"):
+                in_values = False
+            elif in_values:
+                lines.append(line.rstrip(","))
+    return lines
+
+
+@pytest.mark.parametrize("strategy", ["key", "date"])
+def test_sharded_files_contain_unsharded_rows(tmp_path, strategy):
+    generator = SQLGenerator(RESULTS_DIR)
+    generator.generate_all(output_dir=str(tmp_path / "single"))
+    generator.generate_all(output_dir=str(tmp_path / "sharded"), shards=SHARDS, shard_by=strategy)
+    assert os.path.exists(tmp_path / "sharded" / LOADER_SCRIPT)
+
+    for table in TABLES:
+        filename = TABLE_SPECS[table].output_filename("insert")
+        shard_paths = [tmp_path / "sharded" / SHARD_DIR / shard_filename(filename, shard) for shard in range(SHARDS)]
+        sharded = [line for path in shard_paths if os.path.exists(path) for line in values_lines(str(path))]
+        expected = values_lines(str(tmp_path / "single" / filename))
+        assert len(expected) == len(list(ResultRowReader(os.path.join(RESULTS_DIR, TABLE_SPECS[table].result_file))))
+        assert sorted(sharded) == sorted(expected), table
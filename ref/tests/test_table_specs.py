@@ -0,0 +1,70 @@
+"""
+table_specs.py: 行エンコーダー・バッチエンコーダーの出力が、テーブル定義導入前の escape_sql_string による
+f-string 方式と同じバイト列になること（NaN / Infinity は意図的に異なる）
+"""
+
+import math
+
+import pytest
+
+from conftest import generate_earn_rows
+from generate_migration_sql import BATCH_SIZE
+from table_specs import TABLE_SPECS, escape_sql_value
+
+EARN = TABLE_SPECS["morpho_earn_history"]
+
+
+def baseline_escape_sql_string(value):
+    """ベースライン（0ed2dd0）の SQLGenerator.escape_sql_string をそのまま写したもの（比較の基準）"""
+    if value is None:
+        return "NULL"
+    elif isinstance(value, (int, float)):
+        return str(value)
+    else:
+        # 文字列のエスケープ（シングルクォートを二重に）
+        escaped = str(value).replace("'", "''")
+        return f"'{escaped}'"
+
+
+def baseline_encode_earn_row(row):
+    """ベースラインの generate_earn_sql と同じ、1行分の VALUES"""
+    e = baseline_escape_sql_string
+    return f"    ({e(row['day'])}, {e(row['vault_address'])}, {e(row['vault_symbol'])}, " \
+           f"{e(row['vault_asset'])}, {e(row['vault_asset_symbol'])}, {e(row['conversion_rate'])}, " \
+           f"{e(row['delta_assets'])}, {e(row['delta_shares'])}, {e(row['total_shares'])}, " \
+           f"{e(row.get('tvl_usd'))})"
+
+
+@pytest.fixture
+def earn_rows():
+    rows = generate_earn_rows(2 * BATCH_SIZE + 17)
+    # NULL・引用符・整数値・指数表記になる値の行も含める
+    rows[0] = dict(rows[0], tvl_usd=None, vault_symbol="O'Brien")
+    rows[1] = dict(rows[1], delta_assets=0, total_shares=10 ** 20)
+    rows[2] = dict(rows[2], delta_shares=-1.5e-7, conversion_rate=1e22)
+    return rows
+
+
+def test_encode_row_matches_baseline(earn_rows):
+    assert [EARN.encode_row(row) for row in earn_rows] == [baseline_encode_earn_row(row) for row in earn_rows]
+
+
+def test_encode_values_matches_baseline(earn_rows):
+    baseline = [baseline_encode_earn_row(row) for row in earn_rows]
+    for i in range(0, len(earn_rows), BATCH_SIZE):
+        assert EARN.encode_values(earn_rows[i:i + BATCH_SIZE]) == ",\n".join(baseline[i:i + BATCH_SIZE])
+
+
+@pytest.mark.parametrize("value, baseline, current", [
+    (math.nan, "nan", "'NaN'"),
+    (math.inf, "inf", "'Infinity'"),
+    (-math.inf, "-inf", "'-Infinity'"),
+])
+def test_non_finite_floats_differ_from_baseline(earn_rows, value, baseline, current):
+    # ベースラインは引用符なしの nan / inf（PostgreSQL では列名として解釈されエラー）を出力していた
+    assert baseline_escape_sql_string(value) == baseline
+    assert escape_sql_value(value) == current
+
+    rows = [dict(earn_rows[0], tvl_usd=value), earn_rows[1]]
+    assert EARN.encode_row(rows[0]).endswith(f", {current})")
+    assert EARN.encode_values(rows) == ",\n".join(EARN.encode_row(row) for row in rows)
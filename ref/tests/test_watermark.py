@@ -0,0 +1,117 @@
+"""
+watermark.py / generate_migration_sql.py --incremental: 新規・変更行だけを出力すること
+"""
+
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+
+import generate_migration_sql
+from conftest import REF_DIR
+from generate_migration_sql import SQLGenerator
+from watermark import WatermarkManifest
+
+EARN_TABLE = "morpho_earn_history"
+
+
+def run(results_dir, output_dir, now="20251016_000000", **kwargs):
+    """同じ生成日時（now）で generate_incremental を実行"""
+    with mock.patch.object(generate_migration_sql, "datetime") as clock, \
+            contextlib.redirect_stdout(io.StringIO()):
+        clock.now.return_value.strftime.return_value = now
+        return SQLGenerator(results_dir).generate_incremental(output_dir=output_dir, **kwargs)
+
+
+def edit_earn_rows(results_dir, edit):
+    path = os.path.join(results_dir, "Result_Earn.json")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    edit(data["result"]["rows"])
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def test_second_run_emits_nothing(results_dir, tmp_path):
+    output_dir = str(tmp_path / "migration_sql")
+    first = run(results_dir, output_dir)
+    second = run(results_dir, output_dir)
+
+    assert first[EARN_TABLE] == {"emitted": 680, "skipped": 0}
+    assert all(counts["emitted"] == 0 for counts in second.values())
+    # 差分の無い実行はディレクトリを残さず、前回の出力も変更しない
+    assert os.listdir(os.path.join(output_dir, "incremental")) == ["20251016_000000"]
+    assert len(os.listdir(os.path.join(output_dir, "incremental", "20251016_000000"))) == len(first)
+
+
+def test_only_changes_within_lookback_are_emitted(results_dir, tmp_path):
+    output_dir = str(tmp_path / "migration_sql")
+    run(results_dir, output_dir, lookback_days=7)
+
+    def edit(rows):
+        rows[0]["tvl_usd"] += 1      # 最新日（2025-10-15）の行
+        rows[-1]["tvl_usd"] += 1     # ウォーターマークより前の行（出力済みとみなす）
+        rows.insert(0, dict(rows[0], day="2025-10-16 00:00:00.000 UTC"))
+
+    edit_earn_rows(results_dir, edit)
+    summary = run(results_dir, output_dir, now="20251017_000000", lookback_days=7)
+    assert summary[EARN_TABLE]["emitted"] == 2
+
+    with open(os.path.join(output_dir, "incremental", "20251017_000000", "05_insert_earn.sql"), 'r',
+              encoding='utf-8') as f:
+        sql = f.read()
+    assert "'2025-10-16 00:00:00.000 UTC'" in sql and "'2025-10-15 00:00:00.000 UTC'" in sql
+    assert "'2025-04-30 00:00:00.000 UTC'" not in sql
+
+
+def test_manifest_keeps_recent_hashes_only(results_dir, tmp_path):
+    output_dir = str(tmp_path / "migration_sql")
+    run(results_dir, output_dir, lookback_days=3)
+    manifest = WatermarkManifest(os.path.join(output_dir, "watermarks.json"))
+    state = manifest.data["tables"][EARN_TABLE]
+
+    assert manifest.watermark(EARN_TABLE, "0x348831b46876d3df2db98bdec5e3b4083329ab9f") == "2025-10-15"
+    # キーごとに、ウォーターマークとその3日前までの4日分だけを残す
+    for key, hashes in state["row_hashes"].items():
+        watermark = state["watermarks"][key]
+        assert max(hashes) == watermark
+        assert len(hashes) <= 4
+
+
+def test_same_second_runs_use_separate_directories(results_dir, tmp_path):
+    output_dir = str(tmp_path / "migration_sql")
+    run(results_dir, output_dir)
+    os.remove(os.path.join(output_dir, "watermarks.json"))
+    run(results_dir, output_dir)
+
+    assert sorted(os.listdir(os.path.join(output_dir, "incremental"))) == ["20251016_000000", "20251016_000000_2"]
+
+
+def test_old_manifest_is_ignored(results_dir, tmp_path):
+    output_dir = str(tmp_path / "migration_sql")
+    os.makedirs(output_dir)
+    with open(os.path.join(output_dir, "watermarks.json"), 'w', encoding='utf-8') as f:
+        json.dump({"version": 1, "tables": {EARN_TABLE: {"row_hashes": {}, "watermarks": {}}}}, f)
+
+    assert run(results_dir, output_dir)[EARN_TABLE]["emitted"] == 680
+
+
+@pytest.mark.parametrize("options", [
+    ["--jobs", "2"],
+    ["--shards", "4"],
+    ["--shard-by", "date"],
+    ["--partition-by", "month"],
+    ["load", "--sqlite", "test.db"],
+])
+def test_unsupported_options_are_rejected(tmp_path, options):
+    result = subprocess.run([sys.executable, os.path.join(REF_DIR, "generate_migration_sql.py"),
+                             "--incremental", *options],
+                            cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--incremental" in result.stderr
+    assert not os.path.exists(tmp_path / "migration_sql")
@@ -0,0 +1,153 @@
+"""
+差分移行用のウォーターマーク管理
+テーブルごとに、日付以外の主キー（トークン・Vaultなど）ごとの最終出力日（ウォーターマーク）と、
+直近 lookback_days 日分の出力済みの行の内容ハッシュを記録し、次回の生成では新規または内容が変わった行だけを出力する
+
+    - ウォーターマークから lookback_days 日より前の行は出力済みとみなし、ハッシュを計算せずに除外する
+      （Duneが過去の日を再集計しても、その範囲の変更は出力しない）
+    - それ以降の行は内容ハッシュを比較し、新規・変更行だけを出力する
+    - ハッシュは直近 lookback_days 日分だけを残すため、マニフェストの大きさは履歴の長さに比例しない
+"""
+
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from table_specs import TableSpec
+
+
+MANIFEST_VERSION = 2
+
+# ウォーターマークより前で、内容ハッシュを比較し直す日数
+DEFAULT_LOOKBACK_DAYS = 7
+
+
+def _row_hash(values: tuple) -> str:
+    """行の値から内容ハッシュを計算（repr は浮動小数点数を往復可能な形で表す）"""
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _cutoff(watermark: str, lookback_days: int) -> str:
+    """ウォーターマーク（YYYY-MM-DD）から lookback_days 日前の日付（これより前の行は出力済みとみなす）"""
+    return (date.fromisoformat(watermark) - timedelta(days=lookback_days)).isoformat()
+
+
+class TableDelta:
+    """
+    1テーブル分の差分判定
+
+    filter に行を通すと、出力済みで内容が同じ行を除外し、新規・変更行だけを返す。
+    判定結果は commit を呼ぶまでマニフェストに反映されない。
+    """
+
+    def __init__(self, spec: TableSpec, state: Dict[str, Any], lookback_days: int = DEFAULT_LOOKBACK_DAYS):
+        """
+        Args:
+            spec: テーブル定義
+            state: マニフェスト内のこのテーブルの状態
+            lookback_days: ウォーターマークより前で内容ハッシュを比較し直す日数
+        """
+        self.spec = spec
+        self.state = state
+        self.lookback_days = lookback_days
+        # キー → {日付: 内容ハッシュ}（直近 lookback_days 日分）
+        self.row_hashes: Dict[str, Dict[str, str]] = state.setdefault("row_hashes", {})
+        # キー → 出力済みの最新の日付（YYYY-MM-DD）
+        self.watermarks: Dict[str, str] = state.setdefault("watermarks", {})
+        self._pending_hashes: Dict[str, Dict[str, str]] = {}
+        self._pending_watermarks: Dict[str, str] = {}
+        self.emitted = 0
+        self.skipped = 0
+        # skipped のうち、ウォーターマークより前のためハッシュを比較せずに除外した行数
+        self.skipped_before_watermark = 0
+
+        # 主キーのうち日付型のカラムをウォーターマークに、残りをキーに使う
+        self.date_column = spec.date_column
+        self.key_columns: List[str] = [column for column in spec.conflict_columns if column != self.date_column]
+        self._cutoffs = {key: _cutoff(day, lookback_days) for key, day in self.watermarks.items()}
+
+    def _row_day(self, row: Dict[str, Any]) -> str:
+        """行の日付（YYYY-MM-DD。日付カラムが無い・NULLの場合は空文字列）"""
+        value = row[self.date_column] if self.date_column else None
+        return value[:10] if value else ""
+
+    def filter(self, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """新規または内容が変わった行だけを返す"""
+        row_values = self.spec.row_values
+        key_columns = self.key_columns
+        for row in rows:
+            key = "|".join(str(row[column]) for column in key_columns) or "*"
+            day = self._row_day(row)
+            cutoff = self._cutoffs.get(key)
+            if cutoff is not None and day and day < cutoff:
+                self.skipped += 1
+                self.skipped_before_watermark += 1
+                continue
+
+            digest = _row_hash(row_values(row))
+            if self.row_hashes.get(key, {}).get(day) == digest:
+                self.skipped += 1
+                continue
+
+            self._pending_hashes.setdefault(key, {})[day] = digest
+            if day:
+                latest = self._pending_watermarks.get(key) or self.watermarks.get(key)
+                if latest is None or day > latest:
+                    self._pending_watermarks[key] = day
+            self.emitted += 1
+            yield row
+
+    def commit(self):
+        """出力した行をマニフェストの状態に反映し、ウォーターマークより前の日のハッシュを削除"""
+        for key, hashes in self._pending_hashes.items():
+            self.row_hashes.setdefault(key, {}).update(hashes)
+        self.watermarks.update(self._pending_watermarks)
+        for key, hashes in self.row_hashes.items():
+            watermark = self.watermarks.get(key)
+            if watermark:
+                cutoff = _cutoff(watermark, self.lookback_days)
+                for day in [day for day in hashes if day and day < cutoff]:
+                    del hashes[day]
+        self._cutoffs = {key: _cutoff(day, self.lookback_days) for key, day in self.watermarks.items()}
+        self._pending_hashes = {}
+        self._pending_watermarks = {}
+
+
+class WatermarkManifest:
+    """テーブルごとの出力済み状態を保存するマニフェスト（JSONファイル）"""
+
+    def __init__(self, path: str, lookback_days: int = DEFAULT_LOOKBACK_DAYS):
+        """
+        Args:
+            path: マニフェストファイルのパス
+            lookback_days: ウォーターマークより前で内容ハッシュを比較し直す日数
+        """
+        self.path = path
+        self.lookback_days = lookback_days
+        self.data: Dict[str, Any] = {"version": MANIFEST_VERSION, "tables": {}}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.data = data
+            else:
+                # 形式の異なる古いマニフェストは使わない（全行を出力し直す。UPSERTのため結果は変わらない）
+                print(f"[WARN] {path} の形式が古いため、全ての行を新規として出力します")
+
+    def table(self, spec: TableSpec) -> TableDelta:
+        """テーブルの差分判定を取得"""
+        state = self.data["tables"].setdefault(spec.table, {})
+        return TableDelta(spec, state, self.lookback_days)
+
+    def watermark(self, table: str, key: str) -> Optional[str]:
+        """キーの出力済みの最新の日付（YYYY-MM-DD、無い場合はNone）"""
+        return self.data["tables"].get(table, {}).get("watermarks", {}).get(key)
+
+    def save(self):
+        """マニフェストを保存（一時ファイルに書いてから置き換える）"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, self.path)